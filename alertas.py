@@ -0,0 +1,265 @@
+"""
+Alertas do estado das salas, avaliados amostra a amostra e publicados em
+datacenter/fuzzy/alert.
+
+MotorAlertas confere cada amostra contra as regras de REGRAS_ALERTA:
+
+- faixa: a variável sai de [minimo, maximo] (temperatura fora de 18–26 °C);
+- taxa: a variação da variável entre duas amostras passa de ``taxa_max``
+  (em unidades por amostra; no ciclo de 24h, por passo de 5 min).
+
+Para não oscilar na borda, cada regra tem histerese (o alerta abre ao passar
+do limite e só fecha ``histerese`` para dentro dele) e debounce (a condição
+precisa se manter ``ativar_apos`` amostras seguidas para abrir e
+``desativar_apos`` para fechar). Só as transições viram eventos
+("evento": "aberto" ou "encerrado"): um alerta que continua ativo não é
+republicado.
+
+O estado de todas as salas fica em arrays NumPy, uma posição por sala, e
+uma amostra da frota inteira é avaliada de uma vez (frota.py). Com
+``agregar``, as salas que abriram (ou fecharam) o mesmo alerta no mesmo
+passo saem num único evento, com a contagem, a pior sala e as primeiras
+SALAS_POR_EVENTO salas, em vez de uma mensagem por sala.
+
+    python alertas.py --salas 10000 --dias 1
+"""
+import argparse
+import time
+
+import numpy as np
+
+TOPIC_ALERTA = "datacenter/fuzzy/alert"
+
+# Faixa segura de temperatura (°C)
+TEMP_MIN_SEGURA = 18.0
+TEMP_MAX_SEGURA = 26.0
+
+# tipo -> regra. "variavel" é uma chave do estado publicado; "minimo"/"maximo"
+# definem a faixa e "taxa_max" o limite da variação por amostra
+REGRAS_ALERTA = {
+    "ALTA_TEMPERATURA": {
+        "variavel": "temperatura", "maximo": TEMP_MAX_SEGURA, "histerese": 0.5,
+        "ativar_apos": 3, "desativar_apos": 3,
+        "mensagem": "Temperatura acima da faixa segura",
+    },
+    "BAIXA_TEMPERATURA": {
+        "variavel": "temperatura", "minimo": TEMP_MIN_SEGURA, "histerese": 0.5,
+        "ativar_apos": 3, "desativar_apos": 3,
+        "mensagem": "Temperatura abaixo da faixa segura",
+    },
+    "VARIACAO_RAPIDA": {
+        "variavel": "temperatura", "taxa_max": 2.5, "histerese": 0.5,
+        "ativar_apos": 2, "desativar_apos": 5,
+        "mensagem": "Temperatura variando rápido demais",
+    },
+}
+
+# Salas listadas por extenso em um evento agregado
+SALAS_POR_EVENTO = 20
+
+
+class MotorAlertas:
+    """
+    Estado dos alertas de ``n`` salas. avaliar() recebe uma amostra de
+    todas as salas ({variavel: array (n,)}) e devolve os eventos das
+    transições; processar() faz o mesmo para o estado de uma sala só, no
+    formato de TOPIC_ESTADO. Cada evento também vai para ``ao_evento``.
+    """
+
+    def __init__(self, n=1, ids=None, regras=None, agregar=None, ao_evento=None, metricas=None):
+        self.n = n
+        self.ids = list(ids) if ids is not None else None
+        self.regras = dict(REGRAS_ALERTA if regras is None else regras)
+        self.agregar = n > 1 if agregar is None else agregar
+        self.ao_evento = ao_evento
+        for tipo, regra in self.regras.items():
+            if not any(k in regra for k in ("minimo", "maximo", "taxa_max")):
+                raise ValueError(f"Regra de alerta {tipo!r} sem minimo, maximo nem taxa_max")
+
+        self.ativo = {tipo: np.zeros(n, dtype=bool) for tipo in self.regras}
+        # Amostras seguidas em que a condição contraria o estado atual (debounce)
+        self._contagem = {tipo: np.zeros(n, dtype=np.int32) for tipo in self.regras}
+        self._anterior = {}
+        self.eventos = 0
+
+        self._abertos = None
+        if metricas is not None:
+            self._abertos = {tipo: metricas.contador("c213_alertas_total", "Alertas abertos", alerta=tipo)
+                             for tipo in self.regras}
+            for tipo in self.regras:
+                metricas.medidor("c213_alertas_ativos", lambda t=tipo: int(self.ativo[t].sum()),
+                                 "Salas com o alerta ativo", alerta=tipo)
+
+    # =================================================================
+    # AVALIAÇÃO
+    # =================================================================
+    def _medida(self, regra, amostra):
+        variavel = regra["variavel"]
+        valor = np.asarray(amostra[variavel], dtype=np.float64)
+        if "taxa_max" not in regra:
+            return valor
+        anterior = self._anterior.get(variavel)
+        # Primeira amostra: sem variação (NaN não viola nem normaliza)
+        return valor - anterior if anterior is not None else np.full(self.n, np.nan)
+
+    def _condicoes(self, regra, medida):
+        """(violando, normalizado) por sala, com a histerese aplicada ao fechar."""
+        h = regra.get("histerese", 0.0)
+        if "taxa_max" in regra:
+            modulo = np.abs(medida)
+            return modulo > regra["taxa_max"], modulo <= regra["taxa_max"] - h
+        violando = np.zeros(self.n, dtype=bool)
+        normalizado = ~np.isnan(medida)
+        if "maximo" in regra:
+            violando |= medida > regra["maximo"]
+            normalizado &= medida <= regra["maximo"] - h
+        if "minimo" in regra:
+            violando |= medida < regra["minimo"]
+            normalizado &= medida >= regra["minimo"] + h
+        return violando, normalizado
+
+    def avaliar(self, amostra, contexto=None):
+        """
+        Avalia uma amostra de todas as salas ({variavel: array (n,)}) e
+        devolve os eventos das salas que abriram ou fecharam um alerta.
+        ``contexto`` ({chave: array (n,)}, ex. setpoint) entra nos eventos.
+        """
+        eventos = []
+        for tipo, regra in self.regras.items():
+            medida = self._medida(regra, amostra)
+            violando, normalizado = self._condicoes(regra, medida)
+            ativo, contagem = self.ativo[tipo], self._contagem[tipo]
+
+            contraria = np.where(ativo, normalizado, violando)
+            contagem[:] = np.where(contraria, contagem + 1, 0)
+            abrir = ~ativo & (contagem >= regra.get("ativar_apos", 1))
+            fechar = ativo & (contagem >= regra.get("desativar_apos", 1))
+            mudou = abrir | fechar
+            if not mudou.any():
+                continue
+            ativo ^= mudou
+            contagem[mudou] = 0
+            for salas, aberto in ((np.flatnonzero(abrir), True), (np.flatnonzero(fechar), False)):
+                if len(salas):
+                    eventos.extend(self._eventos(tipo, regra, salas, aberto, medida, amostra, contexto))
+
+        for regra in self.regras.values():
+            if "taxa_max" in regra:
+                self._anterior[regra["variavel"]] = np.array(amostra[regra["variavel"]], dtype=np.float64)
+        self._emitir(eventos)
+        return eventos
+
+    def processar(self, estado):
+        """Avalia o estado de uma sala (dict publicado em TOPIC_ESTADO)."""
+        amostra = {regra["variavel"]: (estado[regra["variavel"]],) for regra in self.regras.values()}
+        contexto = {"setpoint": (estado["setpoint"],)} if "setpoint" in estado else None
+        return self.avaliar(amostra, contexto)
+
+    def reiniciar(self):
+        """Fecha os alertas ativos (com evento) e esquece o histórico, como após um reset da simulação."""
+        eventos = []
+        for tipo, regra in self.regras.items():
+            salas = np.flatnonzero(self.ativo[tipo])
+            self.ativo[tipo][:] = False
+            self._contagem[tipo][:] = 0
+            if len(salas):
+                eventos.extend(self._eventos(tipo, regra, salas, False, None, None, None))
+        self._anterior.clear()
+        self._emitir(eventos)
+        return eventos
+
+    # =================================================================
+    # EVENTOS
+    # =================================================================
+    def _eventos(self, tipo, regra, salas, aberto, medida, amostra, contexto):
+        mensagem = regra["mensagem"] if aberto else f"{regra['mensagem']}: normalizado"
+        base = {"tipo": tipo, "evento": "aberto" if aberto else "encerrado", "ativo": aberto,
+                "mensagem": mensagem, "t": round(time.time(), 3)}
+        if "maximo" in regra:
+            base["limite_superior"] = regra["maximo"]
+        if "minimo" in regra:
+            base["limite_inferior"] = regra["minimo"]
+        if "taxa_max" in regra:
+            base["limite_taxa"] = regra["taxa_max"]
+
+        def detalhes(i):
+            item = {}
+            if self.ids is not None:
+                item["sala"] = self.ids[i]
+            if amostra is not None:
+                if "temperatura" in amostra:
+                    item["temperatura"] = round(float(np.asarray(amostra["temperatura"])[i]), 2)
+                item["valor"] = round(float(medida[i]), 2)
+            for chave, valores in (contexto or {}).items():
+                item[chave] = np.asarray(valores)[i].item()
+            return item
+
+        if not self.agregar:
+            return [{**base, **detalhes(i)} for i in salas]
+
+        # Um evento por tipo e transição: pior sala (maior |valor| fora do limite) e as primeiras salas.
+        # "ativo" diz se o alerta segue aberto em alguma sala da frota
+        total = int(self.ativo[tipo].sum())
+        evento = dict(base, ativo=total > 0, agregado=True, n_salas=len(salas), total_ativas=total)
+        if self.ids is not None:
+            evento["salas"] = [self.ids[i] for i in salas[:SALAS_POR_EVENTO]]
+        evento["mensagem"] = f"{mensagem} ({len(salas)} sala{'s' if len(salas) > 1 else ''})"
+        if medida is not None:
+            excesso = np.abs(medida[salas] - _centro(regra))
+            evento.update(detalhes(salas[int(np.nanargmax(excesso))]) if aberto else {})
+        return [evento]
+
+    def _emitir(self, eventos):
+        self.eventos += len(eventos)
+        for evento in eventos:
+            if evento["evento"] == "aberto" and self._abertos is not None:
+                self._abertos[evento["tipo"]].incrementar(evento.get("n_salas", 1))
+            if self.ao_evento is not None:
+                self.ao_evento(evento)
+
+    def ativos(self):
+        """Alertas ativos agora: [{"tipo", "sala"}], uma entrada por sala."""
+        return [{"tipo": tipo, "sala": self.ids[i] if self.ids is not None else None}
+                for tipo, ativo in self.ativo.items() for i in np.flatnonzero(ativo)]
+
+    def resumo(self):
+        """Salas com cada alerta ativo: {tipo: n}."""
+        return {tipo: int(ativo.sum()) for tipo, ativo in self.ativo.items()}
+
+
+def _centro(regra):
+    """Referência para medir o quanto uma sala está fora do limite."""
+    if "taxa_max" in regra:
+        return 0.0
+    if "maximo" in regra and "minimo" in regra:
+        return (regra["maximo"] + regra["minimo"]) / 2
+    return regra.get("maximo", regra.get("minimo"))
+
+
+def main():
+    from frota import Frota
+    from controlador import PASSOS_DIA
+
+    parser = argparse.ArgumentParser(description="Avalia os alertas de uma frota simulada passo a passo.")
+    parser.add_argument("--salas", type=int, default=1000)
+    parser.add_argument("--dias", type=float, default=1, help="dias simulados (288 passos por dia)")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    frota = Frota.aleatoria(args.salas, args.semente)
+    motor = MotorAlertas(frota.n, frota.ids)
+    passos = int(round(args.dias * PASSOS_DIA))
+    duracao = 0.0
+    for _ in range(passos):
+        frota.passo()
+        inicio = time.perf_counter()
+        motor.avaliar({"temperatura": frota.temperatura}, {"setpoint": frota.sp})
+        duracao += time.perf_counter() - inicio
+
+    print(f"{args.salas} salas x {passos} passos: {motor.eventos} eventos | "
+          f"{duracao / passos * 1e3:.3f} ms por passo ({args.salas * passos / duracao:,.0f} amostras-sala/s)")
+    print("Ativos no fim: " + ", ".join(f"{tipo} {n}" for tipo, n in motor.resumo().items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Avaliação em lote de vetores de teste (erro, deltaErro, text, carga) pelo
+controle fuzzy, como a injeção manual, mas sem broker e sem tocar na
+simulação: P_base, Delta_P e P_crac_final de todas as entradas de uma vez,
+pelo motor_vetorizado. Serve a rota POST /avaliar do dashboard.
+
+As entradas chegam como (ver entradas()):
+
+- "entradas": lista de [erro, deltaErro, text, carga];
+- colunas: "erro", "deltaErro", "text" e "carga" como listas do mesmo
+  tamanho (ou valores únicos, repetidos para todas as linhas);
+- "grade": {campo: {"de", "ate", "n"} | lista | valor} por campo; o
+  resultado cobre o produto cartesiano, achatado em ordem C com
+  "forma" = [n_erro, n_deltaErro, n_text, n_carga].
+
+Como no laço, erro e deltaErro são saturados em ERRO_MAX/VARERRO_MAX e
+P_crac_final = clip(P_base * Kp + Delta_P, 0, 100), com Kp do mapa do
+modo contínuo (o da injeção) para o setpoint, ou ``kp`` explícito. O
+núcleo só depende de (erro, deltaErro) e a compensação de (text, carga):
+cada estágio é avaliado uma vez por par distinto (numa grade, só nas duas
+grades 2-D) e o resultado é expandido para as linhas.
+
+codificar() gera o formato binário de /avaliar?formato=bin: cabeçalho
+_CABECALHO (MAGICO_AVALIACAO, n, número de colunas) seguido das colunas
+P_base, Delta_P e P_crac_final em float32 little-endian.
+
+    python avaliacao_lote.py vetores.csv --sp 22 --saida resultado.csv
+"""
+import argparse
+import struct
+import time
+
+import numpy as np
+
+import sistema_fuzzy
+from controlador import ERRO_MAX, VARERRO_MAX, carregar_ganhos, ganho_kp
+from motor_vetorizado import subsistema
+
+CAMPOS_ENTRADA = ("erro", "deltaErro", "text", "carga")
+CAMPOS_SAIDA = ("P_base", "Delta_P", "P_crac_final")
+
+MAGICO_AVALIACAO = b"C213AVL1"
+# magico, linhas, colunas (16 bytes, múltiplo de 4 para o Float32Array)
+_CABECALHO = struct.Struct("<8sII")
+
+# Linhas por requisição (entrada e grade expandida)
+LIMITE_AMOSTRAS = 250_000
+# Pontos por eixo de uma grade
+LIMITE_EIXO = 10_000
+
+
+# =====================================================================
+# 1. ENTRADAS
+# =====================================================================
+
+def _valores(valor, campo, ndim=1):
+    try:
+        array = np.asarray(valor, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError(f"{campo}: valores não numéricos") from None
+    if array.ndim > ndim:
+        raise ValueError(f"{campo}: esperava um valor ou uma lista de valores")
+    if not np.all(np.isfinite(array)):
+        raise ValueError(f"{campo}: valores não finitos")
+    return array
+
+
+def _eixo(espec, campo):
+    """Pontos de um eixo da grade: {"de", "ate", "n"}, lista ou valor único."""
+    if isinstance(espec, dict):
+        try:
+            de, ate, n = float(espec["de"]), float(espec["ate"]), int(espec["n"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"grade.{campo}: esperava {{\"de\", \"ate\", \"n\"}}") from None
+        if not 1 <= n <= LIMITE_EIXO:
+            raise ValueError(f"grade.{campo}: n fora de [1, {LIMITE_EIXO}]")
+        espec = np.linspace(de, ate, n)
+    pontos = np.atleast_1d(_valores(espec, f"grade.{campo}"))
+    if not 1 <= len(pontos) <= LIMITE_EIXO:
+        raise ValueError(f"grade.{campo}: entre 1 e {LIMITE_EIXO} pontos")
+    return pontos
+
+
+def entradas(payload):
+    """
+    Interpreta um payload de avaliação. Retorna (colunas, eixos): colunas
+    {campo: array (n,)} para linhas avulsas (eixos None) ou eixos
+    {campo: array} de uma grade (colunas None). ValueError se inválido.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("payload deve ser um objeto JSON")
+
+    if "grade" in payload:
+        grade = payload["grade"]
+        if not isinstance(grade, dict) or set(grade) != set(CAMPOS_ENTRADA):
+            raise ValueError(f"grade deve ter os campos {', '.join(CAMPOS_ENTRADA)}")
+        eixos = {campo: _eixo(grade[campo], campo) for campo in CAMPOS_ENTRADA}
+        if np.prod([len(p) for p in eixos.values()], dtype=np.int64) > LIMITE_AMOSTRAS:
+            raise ValueError(f"grade com mais de {LIMITE_AMOSTRAS} pontos")
+        return None, eixos
+
+    if "entradas" in payload:
+        linhas = _valores(payload["entradas"], "entradas", ndim=2) if payload["entradas"] else np.empty((0, 4))
+        if linhas.ndim != 2 or linhas.shape[1] != len(CAMPOS_ENTRADA):
+            raise ValueError("entradas: esperava uma lista de [erro, deltaErro, text, carga]")
+        colunas = dict(zip(CAMPOS_ENTRADA, linhas.T))
+    else:
+        faltam = [campo for campo in CAMPOS_ENTRADA if campo not in payload]
+        if faltam:
+            raise ValueError(f"faltam os campos {', '.join(faltam)} (ou \"entradas\", ou \"grade\")")
+        valores = [np.atleast_1d(_valores(payload[campo], campo)) for campo in CAMPOS_ENTRADA]
+        try:
+            colunas = dict(zip(CAMPOS_ENTRADA, np.broadcast_arrays(*valores)))
+        except ValueError:
+            raise ValueError("erro, deltaErro, text e carga com tamanhos diferentes") from None
+    if len(colunas["erro"]) > LIMITE_AMOSTRAS:
+        raise ValueError(f"mais de {LIMITE_AMOSTRAS} entradas")
+    return colunas, None
+
+
+# =====================================================================
+# 2. AVALIAÇÃO
+# =====================================================================
+
+def _subsistemas():
+    """Núcleo e compensação compilados com a mesma base de regras."""
+    with sistema_fuzzy.TRAVA_BASE:
+        return subsistema("nucleo"), subsistema("compensacao")
+
+
+def _estagio(sub, x, y):
+    """Um estágio avaliado uma vez por par (x, y) distinto."""
+    if len(x) < 2:
+        return sub.avaliar(x, y, sub.padrao)
+    pares, inverso = np.unique(np.column_stack((x, y)), axis=0, return_inverse=True)
+    return sub.avaliar(pares[:, 0], pares[:, 1], sub.padrao)[inverso.ravel()]
+
+
+def _kp(sp, kp, mapa):
+    if kp is not None:
+        return float(kp)
+    if mapa is None:
+        _, mapa = carregar_ganhos()
+    return ganho_kp(sp, mapa)
+
+
+def avaliar(erro, deltaErro, text, carga, sp=25, kp=None, mapa=None):
+    """
+    {P_base, Delta_P, P_crac_final} (arrays) para as linhas dadas. Kp vem
+    de ``kp`` ou do mapa (``mapa``, padrão o contínuo de carregar_ganhos())
+    para ``sp``.
+    """
+    erro = np.clip(np.asarray(erro, dtype=np.float64), -ERRO_MAX, ERRO_MAX)
+    deltaErro = np.clip(np.asarray(deltaErro, dtype=np.float64), -VARERRO_MAX, VARERRO_MAX)
+    nucleo, compensacao = _subsistemas()
+    P_base = _estagio(nucleo, erro, deltaErro)
+    Delta_P = _estagio(compensacao, np.asarray(text, dtype=np.float64), np.asarray(carga, dtype=np.float64))
+    P_crac_final = np.clip(P_base * _kp(sp, kp, mapa) + Delta_P, 0, 100)
+    return {"P_base": P_base, "Delta_P": Delta_P, "P_crac_final": P_crac_final}
+
+
+def avaliar_grade(eixos, sp=25, kp=None, mapa=None):
+    """
+    Como avaliar() para o produto cartesiano de ``eixos`` ({campo: pontos});
+    arrays com forma (n_erro, n_deltaErro, n_text, n_carga).
+    """
+    erro = np.clip(eixos["erro"], -ERRO_MAX, ERRO_MAX)
+    deltaErro = np.clip(eixos["deltaErro"], -VARERRO_MAX, VARERRO_MAX)
+    nucleo, compensacao = _subsistemas()
+    P_base = nucleo.avaliar(erro[:, None], deltaErro[None, :], nucleo.padrao)
+    Delta_P = compensacao.avaliar(eixos["text"][:, None], eixos["carga"][None, :], compensacao.padrao)
+    forma = tuple(len(eixos[campo]) for campo in CAMPOS_ENTRADA)
+    P_base = np.broadcast_to(P_base[:, :, None, None], forma)
+    Delta_P = np.broadcast_to(Delta_P[None, None, :, :], forma)
+    P_crac_final = np.clip(P_base * _kp(sp, kp, mapa) + Delta_P, 0, 100)
+    return {"P_base": P_base, "Delta_P": Delta_P, "P_crac_final": P_crac_final}
+
+
+def avaliar_payload(payload, mapa=None):
+    """
+    Avalia um payload de /avaliar ("sp" e "kp" opcionais). Retorna
+    (saidas, forma): saidas {campo: array (n,)} e forma da grade (ou None).
+    """
+    colunas, eixos = entradas(payload)
+    try:
+        sp = int(payload.get("sp", 25))
+        kp = None if payload.get("kp") is None else float(payload["kp"])
+    except (TypeError, ValueError):
+        raise ValueError("sp deve ser inteiro e kp numérico") from None
+    if eixos is not None:
+        saidas = avaliar_grade(eixos, sp, kp, mapa)
+        return {campo: v.ravel() for campo, v in saidas.items()}, list(saidas["P_base"].shape)
+    return avaliar(*(colunas[campo] for campo in CAMPOS_ENTRADA), sp=sp, kp=kp, mapa=mapa), None
+
+
+def codificar(saidas):
+    """Saídas no formato binário de /avaliar?formato=bin."""
+    n = len(saidas[CAMPOS_SAIDA[0]])
+    partes = [_CABECALHO.pack(MAGICO_AVALIACAO, n, len(CAMPOS_SAIDA))]
+    partes += [np.ascontiguousarray(saidas[campo], dtype="<f4").tobytes() for campo in CAMPOS_SAIDA]
+    return b"".join(partes)
+
+
+def decodificar(payload):
+    """Inverso de codificar(): {campo: array float32}."""
+    magico, n, ncolunas = _CABECALHO.unpack_from(payload)
+    if magico != MAGICO_AVALIACAO or ncolunas != len(CAMPOS_SAIDA):
+        raise ValueError("Resultado de avaliação em formato desconhecido")
+    colunas = np.frombuffer(payload, dtype="<f4", count=n * ncolunas, offset=_CABECALHO.size)
+    return dict(zip(CAMPOS_SAIDA, colunas.reshape(ncolunas, n)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Avalia vetores de teste (CSV erro,deltaErro,text,carga) em lote.")
+    parser.add_argument("entrada", help="CSV com cabeçalho erro,deltaErro,text,carga")
+    parser.add_argument("--sp", type=int, default=25, help="setpoint para o Kp do mapa contínuo")
+    parser.add_argument("--kp", type=float, help="sobrepõe o Kp do mapa")
+    parser.add_argument("--saida", help="CSV com as entradas e P_base, Delta_P, P_crac_final")
+    args = parser.parse_args()
+
+    tabela = np.genfromtxt(args.entrada, delimiter=",", names=True, dtype=np.float64)
+    colunas = [np.atleast_1d(tabela[campo]) for campo in CAMPOS_ENTRADA]
+    inicio = time.perf_counter()
+    saidas = avaliar(*colunas, sp=args.sp, kp=args.kp)
+    duracao = time.perf_counter() - inicio
+    n = len(colunas[0])
+    print(f"{n} vetores em {duracao * 1e3:.1f} ms ({n / duracao:,.0f} vetores/s) | "
+          f"P_crac_final: min {saidas['P_crac_final'].min():.2f} | máx {saidas['P_crac_final'].max():.2f}")
+
+    if args.saida:
+        dados = np.column_stack(colunas + [saidas[campo] for campo in CAMPOS_SAIDA])
+        np.savetxt(args.saida, dados, delimiter=",", header=",".join(CAMPOS_ENTRADA + CAMPOS_SAIDA),
+                   comments="", fmt="%.6g")
+        print(f"Resultados gravados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Base de regras e funções de pertinência lidas de um arquivo declarativo
+(JSON, ou YAML se o PyYAML estiver instalado), validadas e trocadas com o
+controlador rodando.
+
+    python base_regras.py exportar base_regras.json   # base atual de sistema_fuzzy.py
+    python base_regras.py validar base_regras.json
+
+O arquivo tem a forma de sistema_fuzzy.VARIAVEIS/SUBSISTEMAS:
+
+    {"variaveis": {"errotemp": {"universo": [-16, 16.5, 0.5],
+                                "termos": {"MN": ["trapmf", [-16, -16, -5, -2]], ...}}, ...},
+     "subsistemas": {"nucleo": {"entradas": ["errotemp", "varerrotemp"], "saida": "potencia_base",
+                                "padrao": 100.0, "regras": [["MN", "MN", "MB"], ...]}, ...}}
+
+Sem o arquivo, vale a base escrita em sistema_fuzzy.py.
+
+MotorRecarregavel é o inferir() do laço de controle com a base trocável.
+recarregar() lê e valida o arquivo inteiro antes de mudar qualquer coisa;
+só os subsistemas cuja impressão digital mudou são recompilados, na thread
+do vigia e não na do laço, e os estágios novos entram de uma vez, entre
+duas inferências. Um arquivo rejeitado (lista de problemas no log) deixa a
+base anterior valendo. A recarga é pedida por mudança no arquivo (vigiar(),
+que compara mtime e tamanho) ou pelo comando MQTT "recarregar_regras".
+"""
+import argparse
+import copy
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+import sistema_fuzzy
+from controlador import ESTAGIOS, MOTORES, criar_estagio
+
+ARQUIVO_REGRAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "base_regras.json")
+
+# Intervalo (s) entre verificações do arquivo pelo vigia
+INTERVALO_VIGIA = 1.0
+
+# Parâmetros por tipo de FP e pontos máximos de um universo
+PARAMETROS = {"trimf": 3, "trapmf": 4}
+PONTOS_MAX_UNIVERSO = 100_000
+
+# Serializa aplicar() e as recompilações (vigia, dashboard, CLI) com quem
+# lê a base em outra thread (ver sistema_fuzzy.TRAVA_BASE)
+_lock = sistema_fuzzy.TRAVA_BASE
+
+
+# =====================================================================
+# 1. LEITURA E VALIDAÇÃO
+# =====================================================================
+
+def ler(caminho):
+    """Conteúdo do arquivo (JSON, ou YAML pela extensão .yaml/.yml)."""
+    with open(caminho, encoding="utf-8") as f:
+        texto = f.read()
+    if caminho.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("Arquivo YAML requer o PyYAML (pip install pyyaml); use JSON") from None
+        try:
+            return yaml.safe_load(texto)
+        except yaml.YAMLError as e:
+            raise ValueError(f"YAML inválido: {e}") from None
+    return json.loads(texto)
+
+
+def _numero(valor):
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+
+def validar(dados):
+    """
+    Confere uma base de regras lida de arquivo e a devolve como
+    (variaveis, subsistemas), no formato de sistema_fuzzy. Levanta
+    ValueError com todos os problemas encontrados.
+    """
+    if not (isinstance(dados, dict) and isinstance(dados.get("variaveis"), dict)
+            and isinstance(dados.get("subsistemas"), dict)):
+        raise ValueError('Base de regras inválida: esperado {"variaveis": {...}, "subsistemas": {...}}')
+    problemas = []
+
+    variaveis = {}
+    for nome, var in dados["variaveis"].items():
+        universo = var.get("universo") if isinstance(var, dict) else None
+        termos = var.get("termos") if isinstance(var, dict) else None
+        if not (isinstance(universo, list) and len(universo) == 3 and all(map(_numero, universo))):
+            problemas.append(f"{nome}: universo deve ser [início, fim, passo]")
+            continue
+        ini, fim, passo = universo
+        if passo <= 0 or fim <= ini or (fim - ini) / passo > PONTOS_MAX_UNIVERSO:
+            problemas.append(f"{nome}: universo {universo} vazio ou com mais de {PONTOS_MAX_UNIVERSO} pontos")
+            continue
+        if not isinstance(termos, dict) or not termos:
+            problemas.append(f"{nome}: sem termos")
+            continue
+        u = np.arange(ini, fim, passo)
+        validos = {}
+        for termo, fp in termos.items():
+            if not (isinstance(fp, list) and len(fp) == 2 and isinstance(fp[1], list)):
+                problemas.append(f"{nome}.{termo}: esperado [tipo, [parâmetros]]")
+                continue
+            tipo, params = fp
+            if tipo not in PARAMETROS:
+                problemas.append(f"{nome}.{termo}: tipo {tipo!r} (opções: {', '.join(PARAMETROS)})")
+            elif len(params) != PARAMETROS[tipo] or not all(map(_numero, params)):
+                problemas.append(f"{nome}.{termo}: {tipo} tem {PARAMETROS[tipo]} parâmetros numéricos")
+            elif any(a > b for a, b in zip(params, params[1:])):
+                problemas.append(f"{nome}.{termo}: parâmetros fora de ordem {params}")
+            elif not sistema_fuzzy.FUNCOES[tipo](u, params).any():
+                problemas.append(f"{nome}.{termo}: pertinência nula em todo o universo")
+            else:
+                validos[termo] = (tipo, params)
+        variaveis[nome] = {"universo": tuple(universo), "termos": validos}
+
+    subsistemas = {}
+    if set(dados["subsistemas"]) != set(ESTAGIOS):
+        problemas.append(f"subsistemas devem ser exatamente: {', '.join(ESTAGIOS)}")
+    todas_entradas = {v for sub in dados["subsistemas"].values() if isinstance(sub, dict)
+                      for v in (sub.get("entradas") or ()) if isinstance(v, str)}
+    for nome, sub in dados["subsistemas"].items():
+        if not isinstance(sub, dict):
+            problemas.append(f"{nome}: esperado um objeto")
+            continue
+        entradas, saida, padrao, regras = (sub.get(c) for c in ("entradas", "saida", "padrao", "regras"))
+        if not (isinstance(entradas, list) and len(entradas) == 2):
+            problemas.append(f"{nome}: entradas deve ter duas variáveis")
+            continue
+        faltando = [v for v in entradas + [saida] if not isinstance(v, str) or v not in variaveis]
+        if faltando:
+            problemas.append(f"{nome}: variáveis não definidas: {', '.join(map(str, faltando))}")
+            continue
+        if saida in todas_entradas:
+            problemas.append(f"{nome}: {saida} não pode ser saída e entrada")
+        if not _numero(padrao):
+            problemas.append(f"{nome}: padrao deve ser numérico")
+        if not isinstance(regras, list) or not regras:
+            problemas.append(f"{nome}: sem regras")
+            continue
+        termos = [variaveis[v]["termos"] for v in entradas + [saida]]
+        antecedentes = set()
+        for regra in regras:
+            if not (isinstance(regra, list) and len(regra) == 3):
+                problemas.append(f"{nome}: regra {regra!r} deve ser [termo de {entradas[0]}, termo de {entradas[1]}, termo de {saida}]")
+                continue
+            desconhecidos = [t for t, validos in zip(regra, termos) if not isinstance(t, str) or t not in validos]
+            if desconhecidos:
+                problemas.append(f"{nome}: regra {regra} usa termos não definidos: {', '.join(map(str, desconhecidos))}")
+            elif tuple(regra[:2]) in antecedentes:
+                problemas.append(f"{nome}: antecedente {regra[:2]} repetido")
+            else:
+                antecedentes.add(tuple(regra[:2]))
+        subsistemas[nome] = {"entradas": tuple(entradas), "saida": saida, "padrao": padrao,
+                             "regras": [tuple(r) for r in regras]}
+
+    if problemas:
+        raise ValueError("Base de regras inválida:\n" + "\n".join(f"  - {p}" for p in problemas))
+    return variaveis, subsistemas
+
+
+def carregar(caminho):
+    """ler() + validar()."""
+    return validar(ler(caminho))
+
+
+# =====================================================================
+# 2. APLICAÇÃO E EXPORTAÇÃO
+# =====================================================================
+
+def aplicar(variaveis, subsistemas):
+    """
+    Instala a base em sistema_fuzzy (os dicionários são alterados no lugar:
+    quem importou VARIAVEIS/SUBSISTEMAS vê a base nova) e descarta o que foi
+    compilado com a anterior. Retorna os subsistemas cuja impressão digital mudou.
+    """
+    import motor_vetorizado
+
+    with _lock:
+        antes = {n: sistema_fuzzy.impressao_digital(n) for n in sistema_fuzzy.SUBSISTEMAS}
+        sistema_fuzzy.VARIAVEIS.clear()
+        sistema_fuzzy.VARIAVEIS.update(variaveis)
+        sistema_fuzzy.SUBSISTEMAS.clear()
+        sistema_fuzzy.SUBSISTEMAS.update(subsistemas)
+        motor_vetorizado.descartar()
+        return [n for n in sistema_fuzzy.SUBSISTEMAS if sistema_fuzzy.impressao_digital(n) != antes.get(n)]
+
+
+def base_atual():
+    """Cópia da base em uso, no formato do arquivo."""
+    with _lock:
+        return copy.deepcopy({"variaveis": sistema_fuzzy.VARIAVEIS, "subsistemas": sistema_fuzzy.SUBSISTEMAS})
+
+
+def exportar(caminho):
+    """Grava a base em uso em JSON (listas de números e regras em uma linha só)."""
+    texto = json.dumps(base_atual(), indent=2, ensure_ascii=False, default=list)
+    texto = re.sub(r"\[\s+([^\[\]{}]*?)\s+\]", lambda m: "[" + ", ".join(p.strip() for p in m.group(1).split(",")) + "]",
+                   texto)
+    # FP: ["tipo", [parâmetros]] também em uma linha
+    texto = re.sub(r'\[\s+("\w+"),\s+(\[[^\[\]]*\])\s+\]', r"[\1, \2]", texto)
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write(texto + "\n")
+    os.replace(temporario, caminho)
+
+
+def _assinatura(caminho):
+    try:
+        st = os.stat(caminho)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+_sincronizados = {}
+
+
+def sincronizar(caminho=ARQUIVO_REGRAS, log=print):
+    """
+    Aplica o arquivo se ele mudou desde a última chamada (para processos que
+    só leem a base, como o dashboard). Um arquivo rejeitado deixa a base
+    anterior. Retorna os subsistemas que mudaram.
+    """
+    assinatura = _assinatura(caminho)
+    with _lock:
+        if assinatura is None or _sincronizados.get(caminho) == assinatura:
+            return []
+        _sincronizados[caminho] = assinatura
+        try:
+            mudaram = aplicar(*carregar(caminho))
+        except (OSError, ValueError) as e:
+            log(f"[Regras] {caminho} rejeitado, mantida a base anterior: {e}")
+            return []
+    if mudaram:
+        log(f"[Regras] Base de {caminho} aplicada ({', '.join(mudaram)})")
+    return mudaram
+
+
+# =====================================================================
+# 3. MOTOR COM RECARGA
+# =====================================================================
+
+class MotorRecarregavel:
+    """
+    inferir(erro, varerro, text, carga) -> (P_base, Delta_P) do motor
+    ``motor`` (controlador.criar_estagio) com a base de ``caminho``, se o
+    arquivo existir, trocável com o laço rodando. ``memoria`` vai para
+    criar_estagio: um estágio recompilado começa com a memória vazia.
+    ``ao_recarregar(motor)``, se definido, é chamado após cada recarga aceita.
+    """
+
+    def __init__(self, motor="vetorizado", caminho=ARQUIVO_REGRAS, tolerancia_tabela=1.0, ao_padrao=None,
+                 log=print, memoria=None):
+        self.motor = motor
+        self.caminho = caminho
+        self.tolerancia_tabela = tolerancia_tabela
+        self.ao_padrao = ao_padrao
+        self.memoria = memoria
+        self.log = log
+        self.ao_recarregar = None
+        self.recargas = 0
+        self.falhas = 0
+        self._pedido = threading.Event()
+        self._vigia = None
+
+        with _lock:
+            self._assinatura = _assinatura(caminho) if caminho else None
+            if self._assinatura is not None:
+                # Na partida, um arquivo inválido é erro (levanta ValueError)
+                aplicar(*carregar(caminho))
+                self.log(f"Base de regras lida de {caminho}")
+            self._impressoes = {n: sistema_fuzzy.impressao_digital(n) for n in ESTAGIOS}
+            self._estagios = tuple(criar_estagio(motor, n, tolerancia_tabela, ao_padrao, memoria) for n in ESTAGIOS)
+
+    def __call__(self, erro, varerro, text, carga):
+        nucleo, compensacao = self._estagios
+        return nucleo(erro, varerro), compensacao(text, carga)
+
+    def configuracao(self):
+        """
+        Motor, tolerância da tabela, opções da memória (sem as não
+        serializáveis) e impressões digitais dos estágios em uso: o que
+        gravacao.py precisa para reproduzir as mesmas inferências.
+        """
+        memoria = None
+        if self.memoria is not None:
+            memoria = {k: v for k, v in self.memoria.items() if k not in ("metricas", "relogio")}
+        with _lock:
+            impressoes = dict(self._impressoes)
+        return {"motor": self.motor, "tolerancia_tabela": self.tolerancia_tabela, "memoria": memoria,
+                "impressoes": impressoes}
+
+    def recarregar(self):
+        """
+        Lê, valida e aplica o arquivo, recompilando só os estágios que
+        mudaram. Retorna os subsistemas recompilados. Levanta OSError ou
+        ValueError se o arquivo for rejeitado; a base anterior continua valendo.
+        """
+        variaveis, subsistemas = carregar(self.caminho)
+        with _lock:
+            anterior = base_atual()
+            impressoes = {n: sistema_fuzzy.impressao_digital(n, variaveis, subsistemas) for n in ESTAGIOS}
+            mudaram = [n for n in ESTAGIOS if impressoes[n] != self._impressoes[n]]
+            aplicar(variaveis, subsistemas)
+            try:
+                novos = {n: criar_estagio(self.motor, n, self.tolerancia_tabela, self.ao_padrao, self.memoria)
+                         for n in mudaram}
+            except Exception:
+                aplicar(anterior["variaveis"], anterior["subsistemas"])
+                raise
+            # Uma atribuição: o laço vê os dois estágios antigos ou os dois novos
+            self._estagios = tuple(novos.get(n, estagio) for n, estagio in zip(ESTAGIOS, self._estagios))
+            self._impressoes = impressoes
+        return mudaram
+
+    def pedir_recarga(self):
+        """Pede uma recarga fora do laço (pode ser chamado de qualquer thread, inclusive a do laço)."""
+        if self._vigia is not None:
+            self._pedido.set()
+        else:
+            threading.Thread(target=self._recarregar_registrando, daemon=True).start()
+
+    def vigiar(self, intervalo=INTERVALO_VIGIA):
+        """Inicia a thread que recarrega a base quando o arquivo muda ou uma recarga é pedida."""
+        if self._vigia is None:
+            self._vigia = threading.Thread(target=self._vigiar, args=(intervalo,), daemon=True)
+            self._vigia.start()
+
+    def _vigiar(self, intervalo):
+        while True:
+            pedido = self._pedido.wait(intervalo)
+            self._pedido.clear()
+            assinatura = _assinatura(self.caminho)
+            if pedido or assinatura != self._assinatura:
+                self._assinatura = assinatura
+                self._recarregar_registrando()
+
+    def _recarregar_registrando(self):
+        try:
+            mudaram = self.recarregar()
+        except Exception as e:
+            self.falhas += 1
+            self.log(f"[Regras] {self.caminho} rejeitado, mantida a base anterior: {e}")
+            return
+        self.recargas += 1
+        self.log(f"[Regras] Base de regras recarregada; recompilados: {', '.join(mudaram) or 'nenhum'}")
+        if self.ao_recarregar is not None:
+            self.ao_recarregar(self)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Base de regras fuzzy em arquivo declarativo (JSON/YAML).")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("exportar", help="grava a base de sistema_fuzzy.py em JSON")
+    p.add_argument("arquivo", nargs="?", default=ARQUIVO_REGRAS)
+    p = sub.add_parser("validar", help="confere um arquivo e compila os subsistemas")
+    p.add_argument("arquivo", nargs="?", default=ARQUIVO_REGRAS)
+    p.add_argument("--motor", choices=MOTORES, default="vetorizado")
+    args = parser.parse_args()
+
+    if args.comando == "exportar":
+        exportar(args.arquivo)
+        print(f"Base de regras gravada em {args.arquivo}")
+        return
+
+    try:
+        variaveis, subsistemas = carregar(args.arquivo)
+    except (OSError, ValueError) as e:
+        raise SystemExit(str(e))
+    mudaram = aplicar(variaveis, subsistemas)
+    for nome in ESTAGIOS:
+        criar_estagio(args.motor, nome)
+    print(f"{args.arquivo}: válido ({sum(len(s['regras']) for s in subsistemas.values())} regras); "
+          f"diferente de sistema_fuzzy.py em: {', '.join(mudaram) or 'nada'}")
+
+
+if __name__ == "__main__":
+    main()
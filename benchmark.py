@@ -0,0 +1,322 @@
+"""
+Benchmark do laço de controle, com o tempo de cada estágio de um passo.
+
+    python benchmark.py                                  # todos os motores e cargas
+    python benchmark.py --motores vetorizado tabela --passos 5000
+    python benchmark.py --salvar-base                    # grava benchmark_base.json
+    python benchmark.py --comparar                       # código 1 se piorou além de --limite
+
+Cargas:
+
+- escalar: o passo do laço contínuo/24h, uma sala por vez, cronometrado
+  por estágio (saturação das entradas, inferência do núcleo, inferência da
+  compensação, modelo térmico, codificação do estado em JSON e bin1,
+  PublicadorEstado.publicar com um cliente MQTT que não envia nada) e o
+  ControladorCRAC.passo() completo, sem instrumentação.
+- lote: núcleo e compensação do motor vetorizado (avaliar_lote) em lotes
+  de entradas de vários tamanhos.
+- frota: Frota.passo() com várias quantidades de salas.
+- partida: partida a frio de cada motor (diagnostico.py partida); fora do
+  padrão por ser lenta.
+
+Cada estágio tem percentis de latência por chamada (µs) e vazão. A base
+gravada com --salvar-base é comparada com --comparar pela mediana das
+latências e pela vazão; as bases só são comparáveis na mesma máquina.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from controlador import (
+    ERRO_MAX, VARERRO_MAX, KP_24H, KP_CONTINUO, MOTORES, PASSOS_DIA, TOPIC_ESTADO,
+    ControladorCRAC, perturba_text_24h, perturba_carga_24h, ganho_kp, proxima_temperatura,
+    criar_subsistemas, criar_motor,
+)
+from publicador import PublicadorEstado
+import telemetria
+
+BASE_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_base.json")
+
+CARGAS = ("escalar", "lote", "frota", "partida")
+CARGAS_PADRAO = ("escalar", "lote", "frota")
+TAMANHOS_LOTE = (1, 64, 1024, 16384)
+TAMANHOS_FROTA = (10, 1000, 10000)
+PERCENTIS = (50, 90, 99)
+
+# Fator aceito sobre a base antes de acusar regressão (latência maior ou vazão menor)
+LIMITE_PADRAO = 1.5
+
+
+class _InfoNula:
+    rc = 0
+
+    def is_published(self):
+        return True
+
+
+class _ClienteNulo:
+    """Cliente MQTT que descarta tudo: mede a publicação sem rede."""
+
+    def publish(self, topico, payload=None, qos=0, retain=False):
+        return _InfoNula()
+
+
+def _estatisticas(tempos_ns, unidades=1):
+    """Percentis (µs por chamada) e vazão (unidades/s) de uma série de tempos em ns."""
+    us = np.asarray(tempos_ns, dtype=np.float64) / 1e3
+    saida = {f"p{p}": float(np.percentile(us, p)) for p in PERCENTIS}
+    saida["max"] = float(us.max())
+    saida["media"] = float(us.mean())
+    saida["vazao"] = unidades * 1e6 / saida["media"]
+    return saida
+
+
+# =====================================================================
+# 1. CARGAS
+# =====================================================================
+
+def escalar(motor, passos=2000, aquecimento=50, tempo_max=10.0):
+    """
+    Estágios do passo do ciclo de 24h, uma amostra por vez: {estágio: estatísticas}.
+    Para antes de ``passos`` se a medição (após o aquecimento) passar de ``tempo_max`` s:
+    o skfuzzy leva dezenas de ms por passo.
+    """
+    nucleo, compensacao = criar_subsistemas(motor)
+    publicador = PublicadorEstado(_ClienteNulo(), TOPIC_ESTADO, taxa_quadros=0,
+                                  intervalo_repeticao=0.0, fila_max=10**9)
+    sp = 22
+    kp = ganho_kp(sp, KP_24H)
+    estagios = ("saturacao", "nucleo", "compensacao", "modelo_termico", "json", "bin1", "publicacao")
+    tempos = np.zeros((passos, len(estagios)), dtype=np.int64)
+    relogio = time.perf_counter_ns
+
+    tempatual = 25.0
+    erroatual = erroanterior = tempatual - sp
+    limite = float("inf")
+    for k in range(aquecimento + passos):
+        if k == aquecimento:
+            limite = time.monotonic() + tempo_max
+        elif time.monotonic() > limite:
+            tempos = tempos[:k - aquecimento]
+            break
+        text_calc = perturba_text_24h(k % PASSOS_DIA)
+        carga_calc = perturba_carga_24h(k % PASSOS_DIA)
+        erro_calc = tempatual - sp
+        varerroTemp_calc = erroatual - erroanterior
+        erroanterior, erroatual = erroatual, erro_calc
+
+        t0 = relogio()
+        erro_input = np.clip(erro_calc, -ERRO_MAX, ERRO_MAX)
+        varerro_input = np.clip(varerroTemp_calc, -VARERRO_MAX, VARERRO_MAX)
+        t1 = relogio()
+        P_base = nucleo(erro_input, varerro_input)
+        t2 = relogio()
+        Delta_P = compensacao(text_calc, carga_calc)
+        t3 = relogio()
+        P_crac_final = np.clip(P_base * kp + Delta_P, 0, 100)
+        tempatual = proxima_temperatura(tempatual, P_crac_final, carga_calc, text_calc)
+        t4 = relogio()
+        estado = {
+            "temperatura": round(float(tempatual), 2),
+            "erro": round(float(erroatual), 2),
+            "varErro": round(float(varerroTemp_calc), 2),
+            "potencia": round(float(P_crac_final), 2),
+            "setpoint": sp,
+            "qest": round(float(carga_calc), 1),
+            "text": round(float(text_calc), 1),
+            "simulacao_rodando": True,
+            "injecao_ativa": False,
+            "tempo_horas": round((k % PASSOS_DIA) * (24 / PASSOS_DIA), 2),
+        }
+        t5 = relogio()
+        telemetria.codificar_json(estado)
+        t6 = relogio()
+        telemetria.codificar_binario(estado)
+        t7 = relogio()
+        publicador.publicar(estado)
+        t8 = relogio()
+        if k >= aquecimento:
+            tempos[k - aquecimento] = (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t6 - t5, t7 - t6, t8 - t7)
+
+    resultado = {nome: _estatisticas(tempos[:, i]) for i, nome in enumerate(estagios)}
+    resultado["passo"] = _passo_completo(motor, passos, aquecimento, tempo_max)
+    return resultado
+
+
+def _passo_completo(motor, passos, aquecimento, tempo_max):
+    """ControladorCRAC.passo() no laço contínuo, com o publicador real e um cliente nulo."""
+    publicador = PublicadorEstado(_ClienteNulo(), TOPIC_ESTADO, taxa_quadros=0,
+                                  intervalo_repeticao=0.0, fila_max=10**9)
+    controle = ControladorCRAC(criar_motor(motor), KP_24H, KP_CONTINUO, publicador, log=lambda *args: None)
+    controle.enviar("setpoint", 22)
+    controle.enviar("iniciar")
+    tempos = np.zeros(passos, dtype=np.int64)
+    limite = float("inf")
+    for k in range(aquecimento + passos):
+        if k == aquecimento:
+            limite = time.monotonic() + tempo_max
+        elif time.monotonic() > limite:
+            tempos = tempos[:k - aquecimento]
+            break
+        t0 = time.perf_counter_ns()
+        controle.passo()
+        if k >= aquecimento:
+            tempos[k - aquecimento] = time.perf_counter_ns() - t0
+    return _estatisticas(tempos)
+
+
+def lote(tamanhos=TAMANHOS_LOTE, repeticoes=50, semente=0):
+    """Núcleo e compensação vetorizados por tamanho de lote: {"nucleo/N": estatísticas}, vazão em avaliações/s."""
+    from motor_vetorizado import subsistema
+
+    rng = np.random.default_rng(semente)
+    resultado = {}
+    for nome, faixas in (("nucleo", ((-ERRO_MAX, ERRO_MAX), (-VARERRO_MAX, VARERRO_MAX))),
+                         ("compensacao", ((10.0, 40.0), (0.0, 100.0)))):
+        sub = subsistema(nome)
+        for n in tamanhos:
+            x = rng.uniform(*faixas[0], n)
+            y = rng.uniform(*faixas[1], n)
+            sub.avaliar(x, y, sub.padrao)
+            tempos = []
+            for _ in range(repeticoes):
+                t0 = time.perf_counter_ns()
+                sub.avaliar(x, y, sub.padrao)
+                tempos.append(time.perf_counter_ns() - t0)
+            resultado[f"{nome}/{n}"] = _estatisticas(tempos, n)
+    return resultado
+
+
+def frota(tamanhos=TAMANHOS_FROTA, passos=50, semente=0):
+    """Frota.passo() por número de salas: {"salas/N": estatísticas}, vazão em passos de sala/s."""
+    from frota import Frota
+
+    resultado = {}
+    for n in tamanhos:
+        salas = Frota.aleatoria(n, semente)
+        salas.passo()
+        tempos = []
+        for _ in range(passos):
+            t0 = time.perf_counter_ns()
+            salas.passo()
+            tempos.append(time.perf_counter_ns() - t0)
+        resultado[f"salas/{n}"] = _estatisticas(tempos, n)
+    return resultado
+
+
+def partida(motores, repeticoes=3):
+    """Partida a frio (import + motor montado) de cada motor, em processos novos."""
+    from diagnostico import medir_partida
+
+    tempos = medir_partida(repeticoes, list(motores))
+    return {nome: _estatisticas(np.asarray(t) * 1e9) for nome, t in tempos.items()}
+
+
+def executar(cargas=CARGAS_PADRAO, motores=MOTORES, passos=2000, tempo_max=10.0):
+    resultados = {}
+    for carga in cargas:
+        if carga == "escalar":
+            resultados["escalar"] = {}
+            for motor in motores:
+                for estagio, estat in escalar(motor, passos, tempo_max=tempo_max).items():
+                    resultados["escalar"][f"{motor}/{estagio}"] = estat
+        elif carga == "lote":
+            resultados["lote"] = lote()
+        elif carga == "frota":
+            resultados["frota"] = frota()
+        elif carga == "partida":
+            resultados["partida"] = partida(motores)
+    return resultados
+
+
+# =====================================================================
+# 2. BASE E RELATÓRIO
+# =====================================================================
+
+def _maquina():
+    return {"python": platform.python_version(), "numpy": np.__version__,
+            "plataforma": platform.platform(), "processador": platform.processor() or platform.machine()}
+
+
+def salvar_base(resultados, caminho=BASE_PADRAO):
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump({"maquina": _maquina(), "criado": time.time(), "resultados": resultados}, f, indent=2)
+
+
+def comparar(resultados, base, limite=LIMITE_PADRAO):
+    """
+    Linhas (carga, item, métrica, base, atual, razão, regrediu) para os itens
+    presentes nos dois: mediana da latência (pior se maior) e vazão (pior se menor).
+    """
+    linhas = []
+    for carga, itens in resultados.items():
+        for item, atual in itens.items():
+            anterior = base.get(carga, {}).get(item)
+            if not anterior:
+                continue
+            razao = atual["p50"] / anterior["p50"]
+            linhas.append((carga, item, "p50", anterior["p50"], atual["p50"], razao, razao > limite))
+            razao = anterior["vazao"] / atual["vazao"]
+            linhas.append((carga, item, "vazao", anterior["vazao"], atual["vazao"], razao, razao > limite))
+    return linhas
+
+
+def imprimir(resultados):
+    cabecalho = f"{'':<34}" + "".join(f"{f'p{p} (µs)':>12}" for p in PERCENTIS) + f"{'máx (µs)':>12}{'vazão (/s)':>14}"
+    for carga, itens in resultados.items():
+        print(f"\n[{carga}]\n{cabecalho}")
+        for item, e in itens.items():
+            print(f"{item:<34}" + "".join(f"{e[f'p{p}']:>12.1f}" for p in PERCENTIS)
+                  + f"{e['max']:>12.1f}{e['vazao']:>14,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do laço de controle por estágio.")
+    parser.add_argument("--cargas", nargs="+", default=list(CARGAS_PADRAO), help=f"opções: {', '.join(CARGAS)}")
+    parser.add_argument("--motores", nargs="+", default=list(MOTORES), help=f"opções: {', '.join(MOTORES)}")
+    parser.add_argument("--passos", type=int, default=2000, help="passos medidos por motor na carga escalar")
+    parser.add_argument("--tempo-max", type=float, default=10.0,
+                        help="limite (s) da medição de cada motor na carga escalar")
+    parser.add_argument("--base", default=BASE_PADRAO, help="arquivo da base")
+    parser.add_argument("--salvar-base", action="store_true", help="grava os resultados como nova base")
+    parser.add_argument("--comparar", action="store_true", help="compara com a base; código 1 se houver regressão")
+    parser.add_argument("--limite", type=float, default=LIMITE_PADRAO, help="fator aceito sobre a base")
+    parser.add_argument("--json", metavar="ARQUIVO", help="grava os resultados em JSON")
+    args = parser.parse_args()
+
+    for nome, escolhidos, opcoes in (("cargas", args.cargas, CARGAS), ("motores", args.motores, MOTORES)):
+        desconhecidos = set(escolhidos) - set(opcoes)
+        if desconhecidos:
+            parser.error(f"{nome} desconhecidos: {', '.join(sorted(desconhecidos))}")
+
+    resultados = executar(args.cargas, args.motores, args.passos, args.tempo_max)
+    imprimir(resultados)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+    if args.salvar_base:
+        salvar_base(resultados, args.base)
+        print(f"\nBase gravada em {args.base}")
+    if args.comparar:
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        if base.get("maquina") != _maquina():
+            print(f"\nAviso: base gerada em outra máquina/ambiente ({base.get('maquina')})")
+        linhas = comparar(resultados, base["resultados"], args.limite)
+        regressoes = [l for l in linhas if l[6]]
+        print(f"\nComparação com {args.base} (limite {args.limite:.2f}x): "
+              f"{len(linhas)} métricas, {len(regressoes)} regressões")
+        for carga, item, metrica, anterior, atual, razao, _ in regressoes:
+            print(f"  {carga}/{item} {metrica}: {anterior:,.1f} -> {atual:,.1f} ({razao:.2f}x pior)")
+        if regressoes:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Cache em disco dos artefatos compilados do controlador (superfícies das
+tabelas de controle, por exemplo).
+
+Cada entrada é um diretório com um .npy por array e um meta.json, aberta
+com memória mapeada (np.load(mmap_mode='r')): reiniciar muitos
+controladores com a mesma base de regras não recompila nada e as páginas
+ficam compartilhadas pelo cache do sistema operacional.
+
+- Chave: hash dos parâmetros do artefato e da impressão digital da base
+  de regras (sistema_fuzzy.impressao_digital). Mudou uma FP ou uma regra,
+  mudou a chave; a entrada antiga não é mais encontrada.
+- Invalidação: ao gravar, entradas do mesmo tipo compiladas para outra
+  base de regras são apagadas.
+- Despejo: o diretório é mantido abaixo de TAMANHO_MAXIMO apagando as
+  entradas usadas há mais tempo (mtime, atualizado a cada leitura).
+
+Falhas de leitura/escrita do cache nunca impedem a partida: o artefato é
+apenas recompilado.
+
+    python cache_compilado.py            # lista as entradas
+    python cache_compilado.py --limpar
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+DIRETORIO_CACHE = os.environ.get(
+    "C213_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_compilado"))
+TAMANHO_MAXIMO = int(float(os.environ.get("C213_CACHE_MAX_MB", 64)) * 2**20)
+
+# Incrementar quando o formato das entradas mudar
+VERSAO_FORMATO = 1
+
+
+def chave(*partes):
+    """Hash estável de parâmetros serializáveis em JSON."""
+    texto = json.dumps([VERSAO_FORMATO, *partes], sort_keys=True, default=list)
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def _caminho(tipo, chave_):
+    return os.path.join(DIRETORIO_CACHE, f"{tipo}-{chave_[:24]}")
+
+
+def carregar(tipo, chave_):
+    """Retorna (arrays mapeados, meta) da entrada, ou None se não existir ou estiver corrompida."""
+    caminho = _caminho(tipo, chave_)
+    try:
+        with open(os.path.join(caminho, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("chave") != chave_:
+            return None
+        arrays = {nome: np.load(os.path.join(caminho, f"{nome}.npy"), mmap_mode="r") for nome in meta["arrays"]}
+        os.utime(caminho)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Cache: entrada {caminho} ignorada ({e})")
+        return None
+    return arrays, meta.get("dados", {})
+
+
+def gravar(tipo, chave_, arrays, dados=None, impressao=None):
+    """
+    Grava uma entrada de forma atômica (diretório temporário + rename).
+
+    ``impressao`` identifica a base de regras: entradas do mesmo ``tipo``
+    com outra impressão são apagadas.
+    """
+    try:
+        os.makedirs(DIRETORIO_CACHE, exist_ok=True)
+        temporario = tempfile.mkdtemp(prefix=".tmp-", dir=DIRETORIO_CACHE)
+        for nome, array in arrays.items():
+            np.save(os.path.join(temporario, f"{nome}.npy"), np.ascontiguousarray(array))
+        meta = {"tipo": tipo, "chave": chave_, "impressao": impressao, "arrays": list(arrays),
+                "dados": dados or {}, "criado": time.time()}
+        with open(os.path.join(temporario, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        destino = _caminho(tipo, chave_)
+        try:
+            os.replace(temporario, destino)
+        except OSError:
+            # Outro processo gravou a mesma entrada antes
+            shutil.rmtree(temporario, ignore_errors=True)
+    except OSError as e:
+        print(f"Cache: não foi possível gravar {tipo} ({e})")
+        return
+
+    if impressao is not None:
+        for entrada in entradas():
+            if entrada["tipo"] == tipo and entrada.get("impressao") not in (None, impressao):
+                shutil.rmtree(entrada["caminho"], ignore_errors=True)
+    despejar()
+
+
+def entradas():
+    """Metadados das entradas do cache, com caminho, tamanho (bytes) e último uso."""
+    lista = []
+    if not os.path.isdir(DIRETORIO_CACHE):
+        return lista
+    for nome in os.listdir(DIRETORIO_CACHE):
+        caminho = os.path.join(DIRETORIO_CACHE, nome)
+        if nome.startswith(".tmp-"):
+            # Temporário órfão de uma gravação interrompida
+            if time.time() - os.path.getmtime(caminho) > 3600:
+                shutil.rmtree(caminho, ignore_errors=True)
+            continue
+        try:
+            with open(os.path.join(caminho, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            arquivos = [os.path.join(caminho, a) for a in os.listdir(caminho)]
+            meta["tamanho"] = sum(os.path.getsize(a) for a in arquivos)
+            meta["uso"] = os.path.getmtime(caminho)
+        except (OSError, ValueError):
+            continue
+        meta["caminho"] = caminho
+        lista.append(meta)
+    return lista
+
+
+def despejar(tamanho_maximo=None):
+    """Apaga as entradas usadas há mais tempo até o cache caber em ``tamanho_maximo`` bytes."""
+    tamanho_maximo = TAMANHO_MAXIMO if tamanho_maximo is None else tamanho_maximo
+    lista = sorted(entradas(), key=lambda e: e["uso"])
+    total = sum(e["tamanho"] for e in lista)
+    for entrada in lista:
+        if total <= tamanho_maximo:
+            break
+        shutil.rmtree(entrada["caminho"], ignore_errors=True)
+        total -= entrada["tamanho"]
+
+
+def limpar():
+    shutil.rmtree(DIRETORIO_CACHE, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache dos artefatos compilados do controlador.")
+    parser.add_argument("--limpar", action="store_true", help="apaga todas as entradas")
+    args = parser.parse_args()
+
+    if args.limpar:
+        limpar()
+        print(f"Cache {DIRETORIO_CACHE} apagado.")
+        return
+    lista = sorted(entradas(), key=lambda e: e["uso"], reverse=True)
+    print(f"{DIRETORIO_CACHE}: {len(lista)} entradas, "
+          f"{sum(e['tamanho'] for e in lista) / 2**20:.2f} de {TAMANHO_MAXIMO / 2**20:.0f} MB")
+    for e in lista:
+        print(f"  {os.path.basename(e['caminho']):<40}{e['tamanho'] / 1024:>10.1f} kB  "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(e['uso']))}")
+
+
+if __name__ == "__main__":
+    main()
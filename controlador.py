@@ -0,0 +1,616 @@
+"""
+Peças do laço de controle compartilhadas pelo simulador MQTT (test_def.py)
+e pelos modos offline: perturbações de 24h, saturação das entradas, mapa
+de ganho Kp por setpoint, modelo térmico da sala, a escolha do motor de
+inferência fuzzy e o próprio laço do simulador (ControladorCRAC), que pode
+ser dirigido pelo broker ou por mensagens gravadas.
+"""
+import collections
+import json
+import os
+import time
+
+import numpy as np
+
+import sistema_fuzzy
+
+# Passos de um ciclo de 24h (passo de 5 min)
+PASSOS_DIA = 288
+
+# Limites para saturação
+ERRO_MAX = 16.5
+VARERRO_MAX = 2.05
+
+# Ganho Kp condicional por setpoint (mapas otimizados à mão)
+KP_24H = {16: 0.75, 22: 0.45, 25: 0.45, 32: 0.3}
+KP_CONTINUO = {16: 0.56, 22: 0.28, 25: 0.09, 32: 0.01}
+KP_PADRAO = 0.35
+
+# Tabela de ganhos gerada por sintonia_kp.py (opcional)
+ARQUIVO_GANHOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ganhos_kp.json")
+
+MOTORES = ("skfuzzy", "vetorizado", "tabela", "exato")
+
+# Subsistemas na ordem em que o laço os avalia
+ESTAGIOS = ("nucleo", "compensacao")
+
+
+# =====================================================================
+# 1. PERTURBAÇÕES E MODELO TÉRMICO
+# =====================================================================
+
+def perturba_text_24h(iteracao):
+    # Simula uma onda senoidal (ciclo de 24 horas)
+    tempo_em_horas = iteracao * (24 / PASSOS_DIA)
+    # Modelo T_ext: Média de 25°C, Amplitude de 10°C.
+    return 25 + 10 * np.sin((tempo_em_horas - 8) * np.pi / 12)
+
+
+def perturba_carga_24h(iteracao):
+    # Simula a Carga Térmica com degraus (Alta durante o dia)
+    tempo_em_horas = iteracao * (24 / PASSOS_DIA)
+
+    if 8 <= tempo_em_horas < 18:
+        # Horário comercial/pico de uso: Carga Alta (90%)
+        return 90
+    else:
+        # Noite/Madrugada: Carga Baixa (30%)
+        return 30
+
+
+def ganho_kp(sp, mapa=KP_24H):
+    return mapa.get(sp, KP_PADRAO)
+
+
+def carregar_ganhos(caminho=ARQUIVO_GANHOS):
+    """
+    Retorna (mapa_24h, mapa_continuo) da tabela gerada por sintonia_kp.py.
+
+    Se o arquivo não existir ou estiver inválido, ou se faltar algum modo,
+    usa os mapas KP_24H / KP_CONTINUO.
+    """
+    mapas = {"24h": dict(KP_24H), "continuo": dict(KP_CONTINUO)}
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            tabela = json.load(f)
+        for modo in mapas:
+            if modo in tabela:
+                mapas[modo] = {int(sp): float(kp) for sp, kp in tabela[modo].items()}
+    except FileNotFoundError:
+        pass
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"Tabela de ganhos inválida em {caminho} ({e}); usando os mapas padrão.")
+    return mapas["24h"], mapas["continuo"]
+
+
+def validar_injecao(erro, deltaErro, text, carga):
+    """
+    Converte uma injeção manual para float e confere os limites: erro e
+    deltaErro dentro da saturação, text e carga dentro do universo de
+    text/cargatermica. ValueError se algum valor for inválido.
+    """
+    limites = {
+        "erro": (-ERRO_MAX, ERRO_MAX),
+        "deltaErro": (-VARERRO_MAX, VARERRO_MAX),
+        "text": tuple(sistema_fuzzy.universo("text")[[0, -1]]),
+        "carga": tuple(sistema_fuzzy.universo("cargatermica")[[0, -1]]),
+    }
+    valores = []
+    for campo, valor in zip(limites, (erro, deltaErro, text, carga)):
+        valor = float(valor)
+        minimo, maximo = limites[campo]
+        if not minimo <= valor <= maximo: # também falso para NaN
+            raise ValueError(f"{campo} = {valor} fora de [{minimo:g}, {maximo:g}]")
+        valores.append(valor)
+    return valores
+
+
+def proxima_temperatura(T_anterior, P_crac, carga, text):
+    """Modelo térmico discreto da sala (um passo)."""
+    return 0.9 * T_anterior - 0.08 * P_crac + 0.05 * carga + 0.02 * text + 0.35
+
+
+# =====================================================================
+# 2. MOTOR DE INFERÊNCIA
+# =====================================================================
+
+def criar_estagio(nome="skfuzzy", subsistema="nucleo", tolerancia_tabela=1.0, ao_padrao=None, memoria=None):
+    """
+    Retorna a função de um estágio do motor ``nome``: subsistema(x, y) ->
+    saída defuzzificada (nucleo(erro, varerro) -> P_base ou
+    compensacao(text, carga) -> Delta_P), compilada com a base de regras
+    atual de sistema_fuzzy.
+
+    Onde nenhuma regra dispara, usa o valor padrão do subsistema (potência
+    base 100.0 e ajuste 0.0), qualquer que seja o motor, e chama
+    ``ao_padrao(subsistema)``, se informado.
+
+    Com ``memoria`` (opções de memoria_inferencia.EstagioMemorizado, ex.:
+    {"capacidade": 4096, "validade": 300.0}; {} usa os padrões), o estágio
+    guarda as últimas saídas por entrada quantizada e não refaz a inferência
+    para entradas repetidas.
+    """
+    sub = sistema_fuzzy.SUBSISTEMAS[subsistema]
+    padrao = sub['padrao']
+    avisar = ao_padrao or (lambda subsistema: None)
+
+    if nome == "skfuzzy":
+        from skfuzzy import control as ctrl
+        from sistema_fuzzy import construir_controle
+
+        _, sistemas = construir_controle()
+        simulacao = ctrl.ControlSystemSimulation(sistemas[subsistema])
+        entrada_x, entrada_y = sub['entradas']
+        saida = sub['saida']
+
+        def estagio(x, y):
+            simulacao.input[entrada_x] = x
+            simulacao.input[entrada_y] = y
+            simulacao.compute()
+            z = simulacao.output.get(saida)
+            simulacao.reset()
+            if z is None:
+                avisar(subsistema)
+                return padrao
+            return z
+
+    elif nome == "vetorizado":
+        from motor_vetorizado import subsistema as compilar
+
+        compilado = compilar(subsistema)
+
+        # avaliar() devolve NaN onde nenhuma regra dispara
+        def estagio(x, y):
+            z = float(compilado.avaliar(x, y))
+            if z != z:
+                avisar(subsistema)
+                return padrao
+            return z
+
+    elif nome == "tabela":
+        from motor_tabela import TabelaControle
+
+        tabela = TabelaControle(subsistema, tolerancia_tabela)
+
+        def estagio(x, y):
+            z = tabela(x, y)
+            if z is None:
+                avisar(subsistema)
+                return padrao
+            return z
+
+    elif nome == "exato":
+        from motor_exato import SubsistemaExato
+
+        exato = SubsistemaExato(subsistema)
+
+        # Só as regras ativas e o centróide em forma fechada; None se nenhuma dispara
+        def estagio(x, y):
+            z = exato(x, y)
+            if z is None:
+                avisar(subsistema)
+                return padrao
+            return z
+
+    else:
+        raise ValueError(f"Motor de inferência desconhecido: {nome!r} (opções: {', '.join(MOTORES)})")
+
+    if memoria is not None:
+        from memoria_inferencia import EstagioMemorizado
+
+        return EstagioMemorizado(estagio, subsistema, **memoria)
+    return estagio
+
+
+def criar_subsistemas(nome="skfuzzy", tolerancia_tabela=1.0, ao_padrao=None, memoria=None):
+    """
+    Retorna as funções de cada estágio do motor ``nome`` (criar_estagio):
+    nucleo(erro, varerro) -> P_base e compensacao(text, carga) -> Delta_P.
+    """
+    return tuple(criar_estagio(nome, subsistema, tolerancia_tabela, ao_padrao, memoria) for subsistema in ESTAGIOS)
+
+
+def criar_motor(nome="skfuzzy", tolerancia_tabela=1.0, ao_padrao=None, memoria=None):
+    """
+    Retorna uma função inferir(erro, varerro, text, carga) -> (P_base, Delta_P),
+    com os dois estágios de criar_subsistemas().
+    """
+    nucleo, compensacao = criar_subsistemas(nome, tolerancia_tabela, ao_padrao, memoria)
+
+    def inferir(erro, varerro, text, carga):
+        return nucleo(erro, varerro), compensacao(text, carga)
+
+    return inferir
+
+
+# =====================================================================
+# 3. LAÇO DO SIMULADOR (ESTADO E MENSAGENS DE CONTROLE)
+# =====================================================================
+
+TOPIC_ESTADO = "c213/crac/estado"
+TOPIC_SP = "c213/crac/setpoint"
+TOPIC_COMANDO = "c213/crac/comando" # Tópico para comandos (iniciar/parar/limpar)
+TOPIC_INJECAO = "c213/crac/injecao"
+TOPIC_CONFIG = "c213/crac/config" # Motor e base de regras em uso (retido; gravado por gravacao.py)
+
+SETPOINTS = (16, 22, 25, 32)
+
+# Espera após cada iteração do laço (s): simulação rodando e parada
+PERIODO_PASSO = 0.05
+PERIODO_PAUSA = 0.5
+
+
+class EstadoControlador:
+    """Variáveis do simulador. Só o laço (passo()) as altera."""
+
+    __slots__ = (
+        "injecao_ativa", "erro_inj", "deltaErro_inj", "text_inj", "carga_inj",
+        "sp", "tempatual", "qest_atual", "text_atual", "erroatual", "erroanterior",
+        "simulacao_ativa", "reiniciar_simulacao", "simulacao_24h_ativa", "iteracao_24h",
+    )
+
+    def __init__(self, sp=25, tempatual=25):
+        # Variáveis para a injeção manual. Se True, a simulação usa 'erro_inj' em vez de 'erroatual'.
+        self.injecao_ativa = False
+        self.erro_inj = 0.0
+        self.deltaErro_inj = 0.0
+        self.text_inj = 25.0
+        self.carga_inj = 40.0
+
+        # Variáveis de Estado (Simulação e Sistema)
+        self.sp = sp # Setpoint inicial
+        self.tempatual = tempatual # Temperatura inicial
+        self.qest_atual = 40 # Carga térmica fixa
+        self.text_atual = 25 # Temperatura externa fixa
+        self.erroatual = self.tempatual - self.sp
+        self.erroanterior = self.erroatual
+
+        # Variáveis de Controle da Simulação
+        self.simulacao_ativa = False # Estado inicial: Parado
+        self.reiniciar_simulacao = False
+
+        # Ciclo de 24h: flag pedida via MQTT e passo corrente (None fora do ciclo)
+        self.simulacao_24h_ativa = False
+        self.iteracao_24h = None
+
+
+class ControladorCRAC:
+    """
+    Estado e laço do simulador, sem MQTT. processar_mensagem() trata o que
+    chega em TOPIC_SP/TOPIC_COMANDO/TOPIC_INJECAO; passo() executa uma
+    iteração do laço principal (um passo do ciclo de 24h, se ele estiver
+    ativo), entrega os estados a ``publicador.publicar(estado, prioritario)``
+    e devolve quanto esperar até a próxima. test_def.py liga isso ao broker;
+    gravacao.py reproduz mensagens gravadas sem broker.
+
+    As mensagens podem chegar de outra thread (a do paho): viram comandos
+    numa fila e são aplicadas por inteiro no início do passo seguinte, de
+    modo que um passo nunca vê um comando ou uma injeção pela metade. Cada
+    instância tem seu próprio EstadoControlador; vários controladores podem
+    rodar no mesmo processo.
+
+    Com um ``metricas`` (metricas.Registro), mede o atraso de cada iteração
+    em relação à espera pedida, a latência da inferência e da publicação e
+    conta passos e mensagens de controle. Quem agenda os passos por conta
+    própria (runtime_async.py) passa ``medir_atraso=False`` e mede o atraso
+    em relação aos seus prazos.
+
+    Com ``alertas`` (alertas.MotorAlertas de uma sala), cada estado
+    calculado (contínuo, injeção ou 24h) também é conferido contra as
+    regras de alerta; a republicação da amostra congelada com a simulação
+    parada não conta. Um reset da simulação encerra os alertas abertos.
+
+    Com ``perturbacoes`` (perturbacoes.Traco), o ciclo de 24h tira a
+    temperatura externa e a carga de cada passo do traço em vez da senoide
+    e dos degraus; cada ciclo continua de onde o anterior parou e, no fim
+    do traço, a simulação de 24h é encerrada.
+    """
+
+    def __init__(self, inferir, kp_24h=KP_24H, kp_continuo=KP_CONTINUO, publicador=None, log=print,
+                 metricas=None, medir_atraso=True, alertas=None, perturbacoes=None):
+        self.inferir = inferir
+        self.kp_24h = kp_24h
+        self.kp_continuo = kp_continuo
+        self.publicador = publicador
+        self.alertas = alertas
+        self.perturbacoes = perturbacoes
+        self.log = log
+        self.metricas = metricas
+        if metricas is not None:
+            from metricas import LIMITES_ATRASO
+
+            self._atraso = metricas.histograma(
+                "c213_laco_atraso_segundos", "Atraso do início de cada iteração em relação à espera pedida",
+                LIMITES_ATRASO) if medir_atraso else None
+            self._latencia_inferencia = metricas.histograma(
+                "c213_inferencia_segundos", "Duração da inferência fuzzy (núcleo + compensação)")
+            self._latencia_publicacao = metricas.histograma(
+                "c213_publicacao_segundos", "Duração da entrega do estado ao publicador")
+            self._passos = {modo: metricas.contador("c213_passos_total", "Iterações do laço", modo=modo)
+                            for modo in ("parado", "continuo", "24h")}
+            self._mensagens = {topico: metricas.contador("c213_mensagens_controle_total",
+                                                         "Mensagens de controle recebidas", topico=topico)
+                               for topico in (TOPIC_SP, TOPIC_COMANDO, TOPIC_INJECAO)}
+            self._inicio_passo = None
+            self._espera = 0.0
+
+        self.estado = EstadoControlador()
+        # Comandos recebidos (thread do MQTT), aplicados no início de cada passo().
+        # deque.append/popleft são atômicos: nenhuma trava entre as threads.
+        self._comandos = collections.deque()
+
+    def resetar_estado(self):
+        e = self.estado
+        e.tempatual = 25.0
+        e.erroatual = e.tempatual - e.sp
+        e.erroanterior = e.erroatual
+        e.reiniciar_simulacao = False
+
+        # Publicar o payload com a flag de reset para o dashboard limpar o gráfico
+        estado_reset = {
+            "temperatura": e.tempatual, "erro": 0.0, "varErro": 0.0,
+            "potencia": 0.0, "setpoint": e.sp,
+            "simulacao_rodando": False, # Estado final de parada
+            "reset": True # CHAVE CRUCIAL PARA LIMPEZA NO FRONT-END
+        }
+        self.publicador.publicar(estado_reset, prioritario=True)
+        if self.alertas is not None:
+            self.alertas.reiniciar()
+        self.log("\n--- Estado da Simulação RESETADO ---\n")
+
+    def processar_mensagem(self, topico, payload):
+        """
+        Trata uma mensagem dos tópicos de controle (payload JSON em bytes).
+        Só interpreta e enfileira o comando: pode ser chamado de outra thread.
+        """
+        if self.metricas is not None and topico in self._mensagens:
+            self._mensagens[topico].incrementar()
+        try:
+            data = json.loads(payload.decode("utf-8"))
+
+            if topico == TOPIC_SP:
+                novo_sp = int(data.get("setpoint"))
+                if novo_sp in SETPOINTS:
+                    self.enviar("setpoint", novo_sp)
+
+            elif topico == TOPIC_COMANDO:
+                comando = data.get("comando")
+                if comando in ("iniciar", "parar", "limpar_grafico", "iniciar_24h", "recarregar_regras"):
+                    self.enviar(comando)
+
+            elif topico == TOPIC_INJECAO:
+                try:
+                    self.enviar("injecao", *validar_injecao(data.get("erro"), data.get("deltaErro"),
+                                                            data.get("text"), data.get("carga")))
+                except Exception as e:
+                    self.log(f"Erro ao processar injeção MQTT: {e}")
+
+        except Exception as e:
+            self.log(f"Erro ao processar mensagem MQTT: {e}")
+
+    def enviar(self, comando, *args):
+        """
+        Enfileira um comando ("setpoint", sp), ("iniciar",), ("parar",),
+        ("limpar_grafico",), ("iniciar_24h",), ("recarregar_regras",) ou
+        ("injecao", erro, deltaErro, text, carga). É aplicado inteiro no
+        início do próximo passo().
+        """
+        self._comandos.append((comando, args))
+
+    def _aplicar_comandos(self):
+        # Só os que já estavam na fila: uma enxurrada de mensagens não prende o laço
+        for _ in range(len(self._comandos)):
+            comando, args = self._comandos.popleft()
+            self._aplicar(comando, args)
+
+    def _aplicar(self, comando, args):
+        e = self.estado
+        if comando == "setpoint":
+            e.sp = args[0]
+            self.log(f"[MQTT] Setpoint atualizado para {e.sp}°C")
+
+        elif comando == "iniciar":
+            e.simulacao_ativa = True
+            if e.reiniciar_simulacao: self.resetar_estado() # Começa limpo, se pedido
+
+        elif comando == "parar":
+            e.simulacao_ativa = False
+
+        elif comando == "limpar_grafico":
+            e.reiniciar_simulacao = True # Sinaliza reset no próximo loop ativo
+
+        elif comando == "iniciar_24h":
+            e.simulacao_24h_ativa = True
+            self.log("[MQTT] Simulação de 24h solicitada.")
+
+        elif comando == "recarregar_regras":
+            # A recompilação roda fora do laço (base_regras.MotorRecarregavel)
+            pedir = getattr(self.inferir, "pedir_recarga", None)
+            if pedir is None:
+                self.log("[MQTT] Motor sem base de regras recarregável; comando ignorado.")
+            else:
+                pedir()
+                self.log("[MQTT] Recarga da base de regras solicitada.")
+
+        elif comando == "injecao":
+            # Atualiza as variáveis de injeção e ativa o modo de injeção
+            e.erro_inj, e.deltaErro_inj, e.text_inj, e.carga_inj = args
+            e.injecao_ativa = True
+
+            # Parar a simulação é recomendado, pois a injeção é um teste estático.
+            e.simulacao_ativa = False
+
+            self.log("[MQTT] DADOS INJETADOS. Simulação pausada.")
+
+    def _potencia(self, erro_calc, varerroTemp_calc, text_calc, carga_calc, mapa_kp):
+        # Saturação das entradas (APLICADA ÀS VARIÁVEIS DE CÁLCULO)
+        erro_input = np.clip(erro_calc, -ERRO_MAX, ERRO_MAX)
+        varerro_input = np.clip(varerroTemp_calc, -VARERRO_MAX, VARERRO_MAX)
+
+        # --- GANHO KP CONDICIONAL (Mapa Otimizado) ---
+        Kp = ganho_kp(self.estado.sp, mapa_kp)
+
+        # --- CÁLCULO FUZZY ---
+        if self.metricas is None:
+            P_base, Delta_P = self.inferir(erro_input, varerro_input, text_calc, carga_calc)
+        else:
+            inicio = time.perf_counter()
+            P_base, Delta_P = self.inferir(erro_input, varerro_input, text_calc, carga_calc)
+            self._latencia_inferencia.observar(time.perf_counter() - inicio)
+
+        # --- INTEGRAÇÃO E CLIPPING ---
+        P_final = P_base * Kp + Delta_P
+        return np.clip(P_final, 0, 100)
+
+    def _publicar(self, estado, alertar=True):
+        if alertar and self.alertas is not None:
+            self.alertas.processar(estado)
+        if self.metricas is None:
+            self.publicador.publicar(estado)
+            return
+        inicio = time.perf_counter()
+        self.publicador.publicar(estado)
+        self._latencia_publicacao.observar(time.perf_counter() - inicio)
+
+    def passo(self):
+        """
+        Uma iteração do laço principal, depois de aplicar os comandos
+        pendentes. Retorna a espera (s) até a próxima.
+        """
+        self._aplicar_comandos()
+        if self.metricas is None:
+            return self._iteracao()
+        agora = time.perf_counter()
+        if self._inicio_passo is not None and self._atraso is not None:
+            self._atraso.observar(agora - self._inicio_passo - self._espera)
+        e = self.estado
+        modo = "24h" if e.simulacao_24h_ativa else "continuo" if e.simulacao_ativa else "parado"
+        self._passos[modo].incrementar()
+        self._espera = self._iteracao()
+        # O atraso da próxima iteração é medido a partir do fim desta
+        self._inicio_passo = time.perf_counter()
+        return self._espera
+
+    def _iteracao(self):
+        e = self.estado
+        if e.simulacao_24h_ativa:
+            return self._passo_24h()
+
+        # 1. VERIFICAÇÃO DE CONTROLE E RESET (PRIORIDADE MÁXIMA)
+        if e.reiniciar_simulacao:
+            self.resetar_estado()
+            e.injecao_ativa = False # Desativa injeção após reset
+            e.simulacao_ativa = False # Garante que o estado seja PAUSADO após o reset.
+
+        # 2. CONTROLE DO ESTADO ATIVO/PARADO
+        if not e.simulacao_ativa:
+            # Parada: publica só a temperatura atual e espera mais, liberando
+            # CPU para a thread MQTT (on_message).
+            estado = {
+                "temperatura": round(float(e.tempatual), 2),
+                "erro": 0.0, "varErro": 0.0,
+                "potencia": 0.0, "setpoint": e.sp,
+                "qest": e.qest_atual, "text": e.text_atual,
+                "simulacao_rodando": e.simulacao_ativa,
+            }
+            # A mesma amostra repetida não é uma medida nova para os alertas
+            self._publicar(estado, alertar=False)
+            return PERIODO_PAUSA
+
+        # --- CÁLCULO DE ERRO (CALC = CÁLCULO/INJEÇÃO) ---
+        if e.injecao_ativa:
+            erro_calc = e.erro_inj
+            varerroTemp_calc = e.deltaErro_inj
+            text_calc = e.text_inj
+            carga_calc = e.carga_inj
+        else:
+            # Usa o cálculo dinâmico da simulação
+            erro_calc = e.tempatual - e.sp
+            varerroTemp_calc = e.erroatual - e.erroanterior
+            text_calc = e.text_atual # (valor fixo original)
+            carga_calc = e.qest_atual # (valor fixo original)
+
+        # Atualiza o erroanterior (necessário para a próxima iteração dinâmica)
+        e.erroanterior = e.erroatual
+        e.erroatual = erro_calc
+
+        P_crac_final = self._potencia(erro_calc, varerroTemp_calc, text_calc, carga_calc, self.kp_continuo)
+
+        # --- MODELO TÉRMICO ---
+        # Só é atualizado se a simulação NÃO estiver em modo de injeção estática.
+        if not e.injecao_ativa:
+            e.tempatual = proxima_temperatura(e.tempatual, P_crac_final, carga_calc, text_calc)
+
+        # --- PUBLICAÇÃO ---
+        estado = {
+            "temperatura": round(float(e.tempatual), 2),
+            "erro": round(float(e.erroatual), 2),
+            "varErro": round(float(varerroTemp_calc), 2),
+            "potencia": round(float(P_crac_final), 2),
+            "setpoint": e.sp,
+            "qest": round(float(carga_calc), 1),
+            "text": round(float(text_calc), 1),
+            "simulacao_rodando": e.simulacao_ativa,
+            "injecao_ativa": e.injecao_ativa
+        }
+        self._publicar(estado)
+
+        # DEBUG
+        # print(f"SP: {e.sp:2d} | T: {e.tempatual:.2f} °C | Erro: {e.erroatual:.2f} | Potência: {P_crac_final:.2f}")
+        return PERIODO_PASSO
+
+    def _passo_24h(self):
+        """Um passo do ciclo de 24h (ciclo fechado, perturbações senoidal e em degraus ou do traço, sem injeção manual)."""
+        e = self.estado
+        if e.iteracao_24h is None:
+            self.log("\n--- INICIANDO SIMULAÇÃO DE 24H (Ciclo Fechado) ---")
+            # RESET INICIAL OBRIGATÓRIO PARA 24H
+            self.resetar_estado()
+            e.tempatual = 25.0
+            e.iteracao_24h = 0
+        iteracao = e.iteracao_24h
+
+        # 1. ATUALIZAÇÃO DAS PERTURBAÇÕES
+        if self.perturbacoes is None:
+            text_calc = perturba_text_24h(iteracao)
+            carga_calc = perturba_carga_24h(iteracao)
+        else:
+            valores = self.perturbacoes.proximo()
+            if valores is None:
+                self.publicador.descarregar()
+                self.log("\n--- FIM DO TRAÇO DE PERTURBAÇÕES: SIMULAÇÃO DE 24H ENCERRADA ---")
+                e.simulacao_24h_ativa = False
+                e.iteracao_24h = None
+                return PERIODO_PASSO
+            text_calc, carga_calc = valores
+
+        # 2. CÁLCULO DE ERRO
+        erro_calc = e.tempatual - e.sp
+        varerroTemp_calc = e.erroatual - e.erroanterior
+        e.erroanterior = e.erroatual
+        e.erroatual = erro_calc
+
+        P_crac_final = self._potencia(erro_calc, varerroTemp_calc, text_calc, carga_calc, self.kp_24h)
+        e.tempatual = proxima_temperatura(e.tempatual, P_crac_final, carga_calc, text_calc)
+
+        estado = {
+            "temperatura": round(float(e.tempatual), 2),
+            "erro": round(float(e.erroatual), 2),
+            "varErro": round(float(varerroTemp_calc), 2),
+            "potencia": round(float(P_crac_final), 2),
+            "setpoint": e.sp,
+            "qest": round(float(carga_calc), 1), # Publica o valor da perturbação
+            "text": round(float(text_calc), 1),  # Publica o valor da perturbação
+            "simulacao_rodando": True, # A simulação está rodando no modo 24h
+            "injecao_ativa": False,
+            "tempo_horas": round(iteracao * (24 / PASSOS_DIA), 2)
+        }
+        self._publicar(estado)
+
+        e.iteracao_24h += 1
+        if e.iteracao_24h >= PASSOS_DIA:
+            self.publicador.descarregar()
+            self.log("\n--- SIMULAÇÃO DE 24H CONCLUÍDA! ---")
+            e.simulacao_24h_ativa = False # Desliga a flag no final
+            e.iteracao_24h = None
+        return PERIODO_PASSO
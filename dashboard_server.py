@@ -1,9 +1,24 @@
+import atexit
 import json
+import os
+import queue
+import signal
+import sys
 import threading
+import time
 
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, jsonify, render_template, request
 import paho.mqtt.client as mqtt
 
+import avaliacao_lote
+import base_regras
+import estado_compartilhado
+import superficie
+import telemetria
+from difusao import Difusor, formatar_sse
+from historico import HistoricoEstado
+from metricas import TOPIC_METRICAS, Registro, formatar_prometheus
+
 BROKER = "test.mosquitto.org"
 TOPIC_ESTADO = "c213/crac/estado"
 TOPIC_SP = "c213/crac/setpoint"
@@ -11,36 +26,166 @@ TOPIC_COMANDO = "c213/crac/comando"
 TOPIC_INJECAO = "c213/crac/injecao"
 TOPIC_ALERTA = "datacenter/fuzzy/alert"
 
+SUB_CLIENT_ID = "c213_dashboard_sub"
+
+# Comentário SSE enviado a cada N s sem eventos (mantém a conexão e detecta abas fechadas)
+SSE_KEEPALIVE_S = 15
+
+# Serviço com vários workers (ver estado_compartilhado.py). Sem
+# C213_ESTADO_COMPARTILHADO, um processo só faz tudo. Com ela, "python
+# dashboard_server.py" vira o processo de ingestão (assinatura MQTT ->
+# segmento de memória compartilhada com esse nome, sem HTTP) e os workers que
+# importam este módulo (gunicorn -w N dashboard_server:app) leem o segmento
+SEGMENTO_COMPARTILHADO = os.environ.get("C213_ESTADO_COMPARTILHADO")
+if not SEGMENTO_COMPARTILHADO:
+    MODO = "unico"
+elif __name__ == "__main__":
+    MODO = "ingestao"
+else:
+    MODO = "worker"
+
+# Séries da assinatura MQTT: num worker, vêm do retrato do processo de ingestão
+SERIES_INGESTAO = {"c213_dashboard_mensagens_total", "c213_dashboard_erros_total",
+                   "c213_dashboard_processamento_segundos"}
+
 app = Flask(__name__)
 
 estado_atual = {}
-alerta_atual = None
+ultimo_instante = 0.0 # Instante da última amostra no histórico (mantém a ordem entre quadros)
+alerta_atual = None # Alerta ativo mais recente
+# (tipo, sala) -> último evento de cada alerta aberto ("*" para os agregados da frota);
+# sai daqui quando chega o encerramento
+alertas_ativos = {}
+
+# Fan-out da assinatura MQTT para os clientes de /stream e histórico das
+# amostras recebidas (RAM + arquivo), consultado em /historico. Na ingestão,
+# os dois ficam no segmento compartilhado; nos workers, são lidos de lá
+escritor = leitor = None
+if MODO == "worker":
+    leitor = estado_compartilhado.LeitorEstado(SEGMENTO_COMPARTILHADO)
+    difusor, historico = leitor.difusor, leitor.historico
+elif MODO == "ingestao":
+    escritor = estado_compartilhado.EscritorEstado(SEGMENTO_COMPARTILHADO)
+    difusor, historico = escritor.difusor, escritor.historico
+    atexit.register(escritor.fechar)
+else:
+    difusor = Difusor()
+    historico = HistoricoEstado()
+    atexit.register(historico.descarregar)
+
+# Métricas do servidor e último retrato publicado pelo simulador em TOPIC_METRICAS (ver /metrics)
+metricas = Registro()
+metricas_controlador = None
+mensagens_recebidas = {topico: metricas.contador("c213_dashboard_mensagens_total", "Mensagens MQTT recebidas",
+                                                 topico=topico)
+                       for topico in (TOPIC_ESTADO, TOPIC_ALERTA, TOPIC_METRICAS)}
+erros_mqtt = metricas.contador("c213_dashboard_erros_total", "Mensagens MQTT que falharam ao processar")
+processamento_estado = metricas.histograma("c213_dashboard_processamento_segundos",
+                                           "Decodificação, histórico e difusão de um quadro de estado")
+metricas.medidor("c213_dashboard_sse_clientes", lambda: difusor.assinantes, "Clientes conectados em /stream")
+metricas.medidor("c213_dashboard_sse_descartados_total", lambda: difusor.descartados,
+                 "Eventos descartados em filas SSE cheias", tipo="counter")
+avaliacao_duracao = metricas.histograma("c213_dashboard_avaliacao_segundos",
+                                        "Duração de uma avaliação em lote (/avaliar)")
+avaliacao_amostras = metricas.contador("c213_dashboard_avaliacao_amostras_total",
+                                       "Vetores de entrada avaliados em /avaliar")
+metricas.medidor("c213_dashboard_historico_amostras", lambda: len(historico), "Amostras no histórico")
+metricas.medidor("c213_controlador_metricas_idade_segundos",
+                 lambda: time.time() - controlador_metricas()["t"] if controlador_metricas() else float("nan"),
+                 "Idade do último retrato de métricas do simulador")
 
 # ---------- MQTT SUBSCRIBER (estado) ----------
 
 def on_connect_sub(client, userdata, flags, rc):
     print("SUB conectado ao broker MQTT, rc =", rc)
     client.subscribe(TOPIC_ESTADO)
+    client.subscribe(TOPIC_ALERTA)
+    client.subscribe(TOPIC_METRICAS)
+    telemetria.anunciar(client, SUB_CLIENT_ID) # Aceita estado em JSON (também em quadros) ou binário
     print("Assinado no tópico de estado:", TOPIC_ESTADO)
     print("Assinado no tópico de alerta:", TOPIC_ALERTA)
 
 def on_message_sub(client, userdata, msg):
-    global estado_atual, alerta_atual
+    global estado_atual, alerta_atual, metricas_controlador, ultimo_instante
+    if msg.topic in mensagens_recebidas:
+        mensagens_recebidas[msg.topic].incrementar()
     try:
-        payload = msg.payload.decode("utf-8")
-        data = json.loads(payload)
-
         if msg.topic == TOPIC_ESTADO:
-            estado_atual = data
+            with processamento_estado.cronometrar():
+                # Um quadro pode trazer várias amostras; o estado atual é a última
+                amostras = telemetria.decodificar_lote(msg.payload)
+                estado_atual = amostras[-1]
+                compartilhar("estado", estado_atual)
+                # Instante de cada amostra: a chegada do quadro, recuada pela
+                # diferença entre o "t" dela e o da última (sem depender do
+                # relógio do simulador); sem "t", todas ficam com a chegada
+                agora = time.time()
+                t_ultima = amostras[-1].get("t")
+                for amostra in amostras:
+                    if not amostra.get("reset"):
+                        t = amostra.get("t")
+                        t = agora if t is None or t_ultima is None else agora - (t_ultima - t)
+                        ultimo_instante = max(t, ultimo_instante)
+                        historico.adicionar(amostra, ultimo_instante)
+                    difusor.publicar("estado", amostra)
             # print("Estado atualizado:", estado_atual)
         elif msg.topic == TOPIC_ALERTA:
-            alerta_atual = data
-            print("Alerta recebido via MQTT:", alerta_atual)
+            evento = json.loads(msg.payload.decode("utf-8"))
+            registrar_alerta(evento)
+            compartilhar("alerta", situacao_alerta())
+            difusor.publicar("alerta", situacao_alerta())
+            print("Alerta recebido via MQTT:", evento)
+        elif msg.topic == TOPIC_METRICAS:
+            metricas_controlador = json.loads(msg.payload.decode("utf-8"))
+            compartilhar("metricas_controlador", metricas_controlador)
     except Exception as e:
+        erros_mqtt.incrementar()
         print("Erro ao processar mensagem MQTT:", e)
 
+def registrar_alerta(evento):
+    """Atualiza alertas_ativos com um evento de TOPIC_ALERTA (ver alertas.py)."""
+    global alerta_atual
+    chave = (evento.get("tipo"), "*" if evento.get("agregado") else evento.get("sala"))
+    # Alertas sem "ativo" (formato antigo) valem como abertos
+    if not evento.get("ativo", True):
+        alertas_ativos.pop(chave, None)
+    elif evento.get("evento") == "encerrado":
+        # Parte da frota normalizou, o alerta segue aberto nas demais salas
+        if chave in alertas_ativos:
+            alertas_ativos[chave]["total_ativas"] = evento.get("total_ativas")
+    else:
+        alertas_ativos.pop(chave, None)
+        alertas_ativos[chave] = evento
+    alerta_atual = next(reversed(alertas_ativos.values()), None)
+
+def situacao_alerta():
+    """Payload de /alerta e do evento 'alerta' de /stream."""
+    if leitor is not None:
+        return leitor.documento("alerta") or {"temAlerta": False}
+    if alerta_atual is None:
+        return {"temAlerta": False}
+    return {"temAlerta": True, "dados": alerta_atual, "ativos": len(alertas_ativos)}
+
+def estado_corrente():
+    """Último estado recebido ({} antes do primeiro)."""
+    if leitor is not None:
+        return leitor.documento("estado") or {}
+    return estado_atual
+
+def controlador_metricas():
+    """Último retrato de TOPIC_METRICAS (None antes do primeiro)."""
+    if leitor is not None:
+        return leitor.documento("metricas_controlador")
+    return metricas_controlador
+
+def compartilhar(nome, dados):
+    """No processo de ingestão, grava o documento no segmento compartilhado."""
+    if escritor is not None and not escritor.documento(nome, dados):
+        print(f"[Compartilhado] {nome} não cabe no segmento; mantido o anterior")
+
 def mqtt_loop_sub():
-    client = mqtt.Client(client_id="c213_dashboard_sub")
+    client = mqtt.Client(client_id=SUB_CLIENT_ID)
+    telemetria.preparar_consumidor(client, SUB_CLIENT_ID)
     client.on_connect = on_connect_sub
     client.on_message = on_message_sub
     client.connect(BROKER, 1883, 60)
@@ -48,9 +193,11 @@ def mqtt_loop_sub():
 
 # ---------- MQTT PUBLISHER (setpoint) ----------
 
-pub_client = mqtt.Client(client_id="c213_dashboard_pub")
-pub_client.connect(BROKER, 1883, 60)
-pub_client.loop_start()
+# Um por worker, com id próprio (o broker derruba a conexão anterior de um id repetido)
+if MODO != "ingestao":
+    pub_client = mqtt.Client(client_id="c213_dashboard_pub" if MODO == "unico" else f"c213_dashboard_pub_{os.getpid()}")
+    pub_client.connect(BROKER, 1883, 60)
+    pub_client.loop_start()
 
 # ---------- ROTAS HTTP ----------
 
@@ -60,16 +207,130 @@ def index():
 
 @app.route("/estado")
 def estado():
+    if leitor is not None:
+        # O JSON gravado pela ingestão vai direto, sem decodificar
+        texto = leitor.bruto("estado")
+        return Response(texto, mimetype="application/json") if texto else jsonify({"status": "aguardando_dados"})
     if not estado_atual:
         return jsonify({"status": "aguardando_dados"})
     return jsonify(estado_atual)
 
 @app.route("/alerta")
 def alerta():
-    """Retorna o último alerta recebido via MQTT, se houver."""
-    if alerta_atual is None:
-        return jsonify({"temAlerta": False})
-    return jsonify({"temAlerta": True, "dados": alerta_atual})
+    """Retorna o alerta ativo mais recente e quantos alertas estão abertos, se houver."""
+    return jsonify(situacao_alerta())
+
+@app.route("/stream")
+def stream():
+    """
+    Server-Sent Events: 'estado' a cada amostra nova e 'alerta' a cada
+    alerta, a partir da assinatura MQTT única do servidor. Ao conectar, o
+    cliente recebe o estado e o alerta atuais.
+    """
+    ultimo_id = request.headers.get("Last-Event-ID", type=int)
+    fila = difusor.assinar(ultimo_id)
+
+    def gerar():
+        try:
+            if ultimo_id is None:
+                yield formatar_sse("estado", json.dumps(estado_corrente() or {"status": "aguardando_dados"}))
+                yield formatar_sse("alerta", json.dumps(situacao_alerta()))
+            while True:
+                try:
+                    id_evento, evento, texto = fila.get(timeout=SSE_KEEPALIVE_S)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield formatar_sse(evento, texto, id_evento)
+        finally:
+            difusor.cancelar(fila)
+
+    return Response(gerar(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/historico")
+def historico_estado():
+    """
+    Série do histórico entre ``from`` e ``to`` (epoch em s; negativos são
+    relativos ao agora, ex. from=-3600), reduzida a mínimo/máximo/média por
+    intervalo de ``resolution`` s (padrão: até 500 intervalos).
+    """
+    agora = time.time()
+    de, ate, resolucao = (request.args.get(nome, type=float) for nome in ("from", "to", "resolution"))
+    de = agora + de if de is not None and de < 0 else de
+    ate = agora + ate if ate is not None and ate <= 0 else ate
+    if resolucao is not None and resolucao < 0:
+        return jsonify({"status": "erro", "msg": "resolution deve ser positiva"}), 400
+    return jsonify(historico.consultar(de, ate, resolucao))
+
+@app.route("/metrics")
+def metrics():
+    """Métricas do servidor e do simulador (último retrato recebido) no formato texto do Prometheus."""
+    retrato = metricas.instantaneo()
+    if leitor is not None:
+        # Séries da assinatura MQTT vêm da ingestão; as demais são deste worker
+        ingestao = leitor.documento("metricas_ingestao") or {"series": []}
+        retrato["series"] = ([s for s in retrato["series"] if s["nome"] not in SERIES_INGESTAO]
+                             + [s for s in ingestao["series"] if s["nome"] in SERIES_INGESTAO])
+    texto = formatar_prometheus(retrato)
+    if controlador_metricas():
+        texto += formatar_prometheus(controlador_metricas())
+    return Response(texto, mimetype="text/plain; version=0.0.4")
+
+@app.route("/superficie/<nome>")
+def superficie_controle(nome):
+    """
+    Superfície de controle de um subsistema (nucleo/potencia_base ou
+    compensacao/ajuste_potencia) em ``nx`` x ``ny`` pontos, no formato
+    binário de superficie.codificar ou, com ``formato=json``, em listas.
+    O ETag muda com a base de regras (base_regras.json, relido quando é
+    alterado) e a resolução.
+    """
+    base_regras.sincronizar()
+    nx = request.args.get("nx", superficie.RESOLUCAO_PADRAO, type=int)
+    ny = request.args.get("ny", nx, type=int)
+    try:
+        sup = superficie.calcular(nome, nx, ny)
+    except ValueError as e:
+        return jsonify({"status": "erro", "msg": str(e)}), 400
+
+    if request.args.get("formato") == "json":
+        resposta = jsonify(superficie.como_json(sup))
+    else:
+        resposta = Response(superficie.codificar(sup), mimetype="application/octet-stream")
+    resposta.set_etag(f"{sup['impressao'][:16]}-{nx}x{ny}-{request.args.get('formato', 'bin')}")
+    resposta.headers["Cache-Control"] = "no-cache" # revalida pelo ETag
+    return resposta.make_conditional(request)
+
+@app.route("/avaliar", methods=["POST"])
+def avaliar():
+    """
+    Avaliação em lote de vetores de teste (ver avaliacao_lote.py): linhas
+    ("entradas" ou colunas) ou uma "grade", avaliadas aqui mesmo pelo motor
+    vetorizado, sem MQTT e sem pausar a simulação. Sem "sp", usa o setpoint
+    do último estado recebido. Responde P_base, Delta_P e P_crac_final em
+    JSON ou, com ``formato=bin``, no formato de avaliacao_lote.codificar.
+    """
+    base_regras.sincronizar()
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict) and "sp" not in payload and "setpoint" in estado_corrente():
+        payload = dict(payload, sp=estado_corrente()["setpoint"])
+    inicio = time.perf_counter()
+    try:
+        saidas, forma = avaliacao_lote.avaliar_payload(payload)
+    except ValueError as e:
+        return jsonify({"status": "erro", "msg": str(e)}), 400
+    avaliacao_duracao.observar(time.perf_counter() - inicio)
+    n = len(saidas["P_base"])
+    avaliacao_amostras.incrementar(n)
+
+    if request.args.get("formato") == "bin":
+        return Response(avaliacao_lote.codificar(saidas), mimetype="application/octet-stream")
+    resposta = {"status": "ok", "n": n, "sp": payload.get("sp", 25)}
+    if forma is not None:
+        resposta["forma"] = forma
+    resposta.update({campo: saidas[campo].tolist() for campo in avaliacao_lote.CAMPOS_SAIDA})
+    return jsonify(resposta)
 
 @app.route("/setpoint", methods=["POST"])
 def setpoint():
@@ -93,7 +354,7 @@ def controle():
     data = request.get_json(silent=True) or {}
     comando = data.get("comando")
     
-    if comando not in ("iniciar", "parar", "limpar_grafico"):
+    if comando not in ("iniciar", "parar", "limpar_grafico", "recarregar_regras"):
         return jsonify({"status": "erro", "msg": "Comando inválido"}), 400
 
     payload = json.dumps({"comando": comando})
@@ -128,6 +389,14 @@ def controle_24h():
 # ---------- MAIN ----------
 
 if __name__ == "__main__":
-    t = threading.Thread(target=mqtt_loop_sub, daemon=True)
-    t.start()
-    app.run(host="0.0.0.0", port=5000, debug=False)
+    if MODO == "ingestao":
+        print(f"Ingestão: estado no segmento compartilhado '{SEGMENTO_COMPARTILHADO}' (sirva com "
+              f"C213_ESTADO_COMPARTILHADO={SEGMENTO_COMPARTILHADO} gunicorn -w N dashboard_server:app)")
+        # SIGTERM (systemd, docker stop) encerra como Ctrl+C: o atexit fecha o segmento
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        escritor.manter(metricas)
+        mqtt_loop_sub()
+    else:
+        t = threading.Thread(target=mqtt_loop_sub, daemon=True)
+        t.start()
+        app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
@@ -0,0 +1,120 @@
+"""
+Diagnósticos do controlador, fora do caminho de execução do simulador.
+
+    python diagnostico.py graficos                 # FPs de errotemp e varerrotemp (janela)
+    python diagnostico.py graficos --todas --salvar figs/
+    python diagnostico.py partida --repeticoes 5   # tempo de partida a frio
+
+Os gráficos (matplotlib + scikit-fuzzy) eram abertos por test_def.py em
+toda partida, com plt.show() bloqueante; agora só são gerados aqui, sob
+demanda. O comando 'partida' mede, em processos Python novos, o tempo de
+import + montagem do motor de inferência no caminho antigo e nos motores
+do caminho de execução.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Código executado em um processo novo para cada cenário de partida
+PARTIDAS = {
+    # Caminho antigo de test_def.py: matplotlib + skfuzzy + FPs desenhadas (sem o plt.show bloqueante)
+    "legado (skfuzzy + matplotlib)": (
+        "import matplotlib; matplotlib.use('Agg'); import matplotlib.pyplot as plt\n"
+        "from sistema_fuzzy import construir_controle\n"
+        "from controlador import criar_motor\n"
+        "variaveis, _ = construir_controle()\n"
+        "variaveis['errotemp'].view(); variaveis['varerrotemp'].view()\n"
+        "inferir = criar_motor('skfuzzy')\n"
+        "inferir(0.0, 0.0, 25.0, 40.0)\n"
+    ),
+    "skfuzzy": (
+        "from controlador import criar_motor\n"
+        "inferir = criar_motor('skfuzzy')\n"
+        "inferir(0.0, 0.0, 25.0, 40.0)\n"
+    ),
+    "vetorizado": (
+        "from controlador import criar_motor\n"
+        "inferir = criar_motor('vetorizado')\n"
+        "inferir(0.0, 0.0, 25.0, 40.0)\n"
+    ),
+    "tabela": (
+        "from controlador import criar_motor\n"
+        "inferir = criar_motor('tabela')\n"
+        "inferir(0.0, 0.0, 25.0, 40.0)\n"
+    ),
+    "exato": (
+        "from controlador import criar_motor\n"
+        "inferir = criar_motor('exato')\n"
+        "inferir(0.0, 0.0, 25.0, 40.0)\n"
+    ),
+}
+
+
+def graficos(nomes, salvar=None):
+    """Desenha as FPs das variáveis pedidas; mostra na tela ou grava PNGs em ``salvar``."""
+    import matplotlib
+    if salvar:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from sistema_fuzzy import construir_controle
+
+    variaveis, _ = construir_controle()
+    for nome in nomes:
+        variaveis[nome].view()
+        if salvar:
+            os.makedirs(salvar, exist_ok=True)
+            caminho = os.path.join(salvar, f"{nome}.png")
+            plt.gcf().savefig(caminho, dpi=120)
+            plt.close("all")
+            print(f"{nome}: {caminho}")
+    if not salvar:
+        plt.show()
+
+
+def medir_partida(repeticoes=3, cenarios=None):
+    """Tempo de parede (s) de cada cenário de PARTIDAS em processos novos: {cenário: [tempos]}."""
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    tempos = {}
+    for nome in cenarios or PARTIDAS:
+        tempos[nome] = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            subprocess.run([sys.executable, "-c", PARTIDAS[nome]], cwd=raiz, check=True)
+            tempos[nome].append(time.perf_counter() - inicio)
+    return tempos
+
+
+def main():
+    from sistema_fuzzy import VARIAVEIS
+
+    parser = argparse.ArgumentParser(description="Diagnósticos do controlador fuzzy (opcional).")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("graficos", help="funções de pertinência (matplotlib)")
+    p.add_argument("variaveis", nargs="*", default=["errotemp", "varerrotemp"],
+                   help=f"opções: {', '.join(VARIAVEIS)}")
+    p.add_argument("--todas", action="store_true", help="todas as variáveis de entrada e saída")
+    p.add_argument("--salvar", metavar="DIR", help="grava PNGs em DIR em vez de abrir janelas")
+
+    p = sub.add_parser("partida", help="tempo de partida a frio de cada motor de inferência")
+    p.add_argument("--repeticoes", type=int, default=3)
+    p.add_argument("--cenarios", nargs="+", choices=list(PARTIDAS), default=None)
+
+    args = parser.parse_args()
+
+    if args.comando == "graficos":
+        desconhecidas = set(args.variaveis) - set(VARIAVEIS)
+        if desconhecidas:
+            parser.error(f"variáveis desconhecidas: {', '.join(sorted(desconhecidas))}")
+        graficos(list(VARIAVEIS) if args.todas else args.variaveis, args.salvar)
+    else:
+        tempos = medir_partida(args.repeticoes, args.cenarios)
+        print(f"{'partida a frio':<32}{'mín (s)':>10}{'mediana (s)':>14}")
+        for nome, t in tempos.items():
+            print(f"{nome:<32}{min(t):>10.3f}{sorted(t)[len(t) // 2]:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
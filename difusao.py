@@ -0,0 +1,74 @@
+"""
+Fan-out de eventos do dashboard para clientes HTTP de streaming (SSE).
+
+Uma única assinatura MQTT (dashboard_server) alimenta um Difusor; cada
+aba aberta no navegador recebe sua própria fila, com as amostras novas
+apenas. Cada evento é serializado uma vez só, qualquer que seja o número
+de clientes. Um cliente lento não segura os outros nem a thread MQTT: na
+fila cheia, o evento mais antigo dele é descartado.
+
+Os últimos eventos ficam guardados para que um cliente que reconecta com
+o cabeçalho Last-Event-ID receba o que perdeu.
+"""
+import collections
+import json
+import queue
+import threading
+
+
+class Difusor:
+    def __init__(self, tamanho_fila=256, historico=256):
+        self.tamanho_fila = tamanho_fila
+        self._assinantes = set()
+        self._recentes = collections.deque(maxlen=historico)
+        self._proximo_id = 1
+        self._lock = threading.Lock()
+        self.descartados = 0
+
+    @property
+    def assinantes(self):
+        return len(self._assinantes)
+
+    def publicar(self, evento, dados):
+        """Envia um evento a todos os assinantes. Retorna o id do evento."""
+        texto = json.dumps(dados)
+        with self._lock:
+            item = (self._proximo_id, evento, texto)
+            self._proximo_id += 1
+            self._recentes.append(item)
+            for fila in self._assinantes:
+                self._enfileirar(fila, item)
+        return item[0]
+
+    def _enfileirar(self, fila, item):
+        while True:
+            try:
+                fila.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    fila.get_nowait()
+                    self.descartados += 1
+                except queue.Empty:
+                    pass
+
+    def assinar(self, ultimo_id=None):
+        """Nova fila de eventos; com ``ultimo_id``, começa pelos eventos guardados posteriores a ele."""
+        fila = queue.Queue(maxsize=self.tamanho_fila)
+        with self._lock:
+            if ultimo_id is not None:
+                for item in self._recentes:
+                    if item[0] > ultimo_id:
+                        self._enfileirar(fila, item)
+            self._assinantes.add(fila)
+        return fila
+
+    def cancelar(self, fila):
+        with self._lock:
+            self._assinantes.discard(fila)
+
+
+def formatar_sse(evento, texto, id_evento=None):
+    """Um evento no formato text/event-stream."""
+    linhas = f"id: {id_evento}\n" if id_evento is not None else ""
+    return f"{linhas}event: {evento}\ndata: {texto}\n\n"
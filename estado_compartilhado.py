@@ -0,0 +1,511 @@
+"""
+Estado do dashboard em memória compartilhada, para servir com vários
+workers WSGI.
+
+No modo de um processo, dashboard_server guarda o estado, os alertas, o
+histórico e os eventos de /stream em variáveis do módulo, alimentadas pela
+thread MQTT: com N workers, seriam N assinaturas e N estados diferentes.
+Com C213_ESTADO_COMPARTILHADO=<nome>:
+
+- um processo de ingestão (python dashboard_server.py) mantém a única
+  assinatura MQTT e escreve tudo num segmento multiprocessing.shared_memory
+  com esse nome (EscritorEstado);
+- os workers (gunicorn -w N dashboard_server:app) só leem o segmento
+  (LeitorEstado), sem MQTT de entrada, sem serialização entre processos e
+  sem cópia além da janela pedida.
+
+Layout do segmento (_layout): MAGICO_SEGMENTO, cabeçalho de inteiros de 64
+bits (_CAMPOS), documentos JSON em áreas de tamanho fixo (DOCUMENTOS: o
+estado atual, a situação dos alertas, os retratos de métricas), o anel dos
+últimos EVENTOS_ANEL eventos de /stream e o buffer circular do histórico
+(historico.REGISTRO, mapeado direto como array NumPy).
+
+Há um só escritor. Cada área tem um contador de sequência (seqlock): o
+escritor o torna ímpar, escreve e o torna par; o leitor lê o contador,
+copia o que precisa e confere que ele não mudou, repetindo se mudou. O
+escritor nunca espera pelos leitores. O instante do último batimento fica
+no cabeçalho: se a ingestão for reiniciada (segmento novo com o mesmo
+nome), os workers se religam sozinhos.
+"""
+import json
+import os
+import queue
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from historico import ARQUIVO_HISTORICO, REGISTRO, HistoricoEstado, reduzir
+
+MAGICO_SEGMENTO = b"C213SHM1"
+
+# Campos do cabeçalho (uint64), na ordem
+_CAMPOS = ("instancia", "ativo", "batimento_ms", "seq_historico", "capacidade", "total", "inicio_ram",
+           "gravados", "rotacoes", "proximo_evento", "eventos_anel", "tamanho_evento")
+_C = {campo: i for i, campo in enumerate(_CAMPOS)}
+
+# Documento -> bytes reservados (JSON)
+DOCUMENTOS = {
+    "estado": 8 * 1024,
+    "alerta": 64 * 1024,
+    "metricas_controlador": 512 * 1024,
+    "metricas_ingestao": 128 * 1024,
+    "config": 4 * 1024,
+}
+
+# Eventos de /stream guardados (um cliente atrasado mais que isso perde os mais antigos)
+EVENTOS_ANEL = 1024
+TAMANHO_EVENTO = 4096
+CAPACIDADE_HISTORICO = 65536
+
+# Espera entre consultas de um cliente de /stream por eventos novos (s)
+INTERVALO_SONDAGEM = 0.05
+INTERVALO_BATIMENTO = 1.0
+# Sem batimento há mais que isso, o leitor procura um segmento novo
+VALIDADE_BATIMENTO = 5.0
+
+_TENTATIVAS = 200
+
+
+def _layout(capacidade, eventos_anel, tamanho_evento):
+    """Deslocamentos {área: (início, tamanho)} e o tamanho total do segmento."""
+    areas = {}
+    pos = len(MAGICO_SEGMENTO) + 8 * len(_CAMPOS)
+    for nome, tamanho in DOCUMENTOS.items():
+        areas[nome] = (pos, 16 + tamanho) # sequência, comprimento, dados
+        pos += 16 + tamanho
+    areas["eventos"] = (pos, eventos_anel * tamanho_evento)
+    pos += eventos_anel * tamanho_evento
+    pos = -(-pos // 8) * 8
+    areas["historico"] = (pos, capacidade * REGISTRO.itemsize)
+    return areas, pos + capacidade * REGISTRO.itemsize
+
+
+def _abrir(nome, **kwargs):
+    """
+    Segmento fora do resource_tracker: ele apagaria o nome quando este
+    processo saísse, mesmo que o nome já fosse de uma ingestão mais nova.
+    """
+    try:
+        return shared_memory.SharedMemory(nome, track=False, **kwargs) # Python 3.13+
+    except TypeError:
+        segmento = shared_memory.SharedMemory(nome, **kwargs)
+        if os.name == "posix":
+            resource_tracker.unregister(segmento._name, "shared_memory")
+        return segmento
+
+
+class _Vistas:
+    """Arrays NumPy sobre as áreas de um segmento."""
+
+    def __init__(self, segmento):
+        self.segmento = segmento
+        buf = segmento.buf
+        if bytes(buf[:len(MAGICO_SEGMENTO)]) != MAGICO_SEGMENTO:
+            raise ValueError(f"{segmento.name}: segmento em formato desconhecido")
+        self.cabecalho = np.ndarray(len(_CAMPOS), dtype="<u8", buffer=buf, offset=len(MAGICO_SEGMENTO))
+        cab = self.cabecalho
+        self.areas, _ = _layout(int(cab[_C["capacidade"]]), int(cab[_C["eventos_anel"]]),
+                                int(cab[_C["tamanho_evento"]]))
+        self.documentos = {}
+        for nome in DOCUMENTOS:
+            ini, tamanho = self.areas[nome]
+            self.documentos[nome] = (np.ndarray(2, dtype="<u8", buffer=buf, offset=ini),
+                                     np.ndarray(tamanho - 16, dtype=np.uint8, buffer=buf, offset=ini + 16))
+        ini, _ = self.areas["eventos"]
+        n, tamanho = int(cab[_C["eventos_anel"]]), int(cab[_C["tamanho_evento"]])
+        # Por posição do anel: sequência, id, comprimento e os bytes "evento\ntexto"
+        self.eventos_meta = np.ndarray((n, tamanho // 8), dtype="<u8", buffer=buf, offset=ini)[:, :3]
+        self.eventos_dados = np.ndarray((n, tamanho), dtype=np.uint8, buffer=buf, offset=ini)[:, 24:]
+        ini, _ = self.areas["historico"]
+        self.ram = np.ndarray(int(cab[_C["capacidade"]]), dtype=REGISTRO, buffer=buf, offset=ini)
+
+    def campo(self, nome):
+        return int(self.cabecalho[_C[nome]])
+
+    def liberar(self):
+        """Solta as vistas e fecha o segmento (se ainda houver vistas em uso, fica para o coletor)."""
+        self.cabecalho = self.documentos = self.eventos_meta = self.eventos_dados = self.ram = None
+        try:
+            self.segmento.close()
+        except BufferError:
+            pass
+
+
+def _ler(sequencia, indice, ler):
+    """Resultado de ``ler()`` com sequencia[indice] par e igual antes e depois; None se o escritor não sair."""
+    for tentativa in range(_TENTATIVAS):
+        antes = int(sequencia[indice])
+        if not antes & 1:
+            valor = ler()
+            if int(sequencia[indice]) == antes:
+                return valor
+        time.sleep(0 if tentativa < 20 else 0.001)
+    return None
+
+
+# =====================================================================
+# 1. ESCRITA (PROCESSO DE INGESTÃO)
+# =====================================================================
+
+class HistoricoCompartilhado(HistoricoEstado):
+    """HistoricoEstado com o buffer circular no segmento e os contadores no cabeçalho."""
+
+    def __init__(self, vistas, caminho=ARQUIVO_HISTORICO, **kwargs):
+        self._vistas = vistas
+        # Thread MQTT e descarregar() no atexit: a sequência só pode ter um escritor por vez
+        self._escrita = threading.Lock()
+        super().__init__(caminho, ram=vistas.ram, **kwargs)
+        self._publicar()
+
+    def _publicar(self):
+        cab = self._vistas.cabecalho
+        cab[_C["total"]], cab[_C["inicio_ram"]] = self._total, self._inicio_ram
+        cab[_C["gravados"]], cab[_C["rotacoes"]] = self._gravados, self.rotacoes
+
+    def _escrever(self, operacao, *args):
+        cab = self._vistas.cabecalho
+        with self._escrita:
+            cab[_C["seq_historico"]] += 1
+            try:
+                operacao(*args)
+                self._publicar()
+            finally:
+                cab[_C["seq_historico"]] += 1
+
+    def adicionar(self, estado, t=None):
+        self._escrever(super().adicionar, estado, t)
+
+    def descarregar(self):
+        self._escrever(super().descarregar)
+
+
+class DifusorCompartilhado:
+    """Lado do escritor do anel de eventos: mesma interface de publicação de difusao.Difusor."""
+
+    assinantes = 0
+    descartados = 0
+
+    def __init__(self, vistas):
+        self._vistas = vistas
+        self.grandes_demais = 0
+
+    def publicar(self, evento, dados):
+        v = self._vistas
+        texto = json.dumps(dados).encode("utf-8")
+        conteudo = evento.encode("utf-8") + b"\n" + texto
+        if len(conteudo) > v.eventos_dados.shape[1]:
+            # O leitor usa o documento de mesmo nome no lugar do texto
+            conteudo = evento.encode("utf-8") + b"\n"
+            self.grandes_demais += 1
+        id_evento = v.campo("proximo_evento")
+        posicao = id_evento % len(v.eventos_meta)
+        meta = v.eventos_meta[posicao]
+        meta[0] += 1
+        meta[1], meta[2] = id_evento, len(conteudo)
+        v.eventos_dados[posicao, :len(conteudo)] = np.frombuffer(conteudo, dtype=np.uint8)
+        meta[0] += 1
+        v.cabecalho[_C["proximo_evento"]] = id_evento + 1
+        return id_evento
+
+
+class EscritorEstado:
+    """
+    Cria o segmento ``nome`` (substituindo um que tenha sobrado) e escreve
+    nele: documento(), historico (HistoricoCompartilhado) e difusor
+    (DifusorCompartilhado). Um só escritor por segmento.
+    """
+
+    def __init__(self, nome, capacidade=CAPACIDADE_HISTORICO, caminho_historico=ARQUIVO_HISTORICO,
+                 eventos_anel=EVENTOS_ANEL, tamanho_evento=TAMANHO_EVENTO):
+        self.nome = nome
+        _, tamanho = _layout(capacidade, eventos_anel, tamanho_evento)
+        try:
+            # Sobra de uma ingestão que não terminou direito: marcado como
+            # encerrado, para os workers passarem logo para o novo
+            antigo = shared_memory.SharedMemory(nome)
+            if bytes(antigo.buf[:len(MAGICO_SEGMENTO)]) == MAGICO_SEGMENTO:
+                struct.pack_into("<Q", antigo.buf, len(MAGICO_SEGMENTO) + 8 * _C["ativo"], 0)
+            antigo.close()
+            antigo.unlink()
+        except FileNotFoundError:
+            pass
+        segmento = _abrir(nome, create=True, size=tamanho)
+        segmento.buf[:len(MAGICO_SEGMENTO)] = MAGICO_SEGMENTO
+        cab = np.ndarray(len(_CAMPOS), dtype="<u8", buffer=segmento.buf, offset=len(MAGICO_SEGMENTO))
+        cab[:] = 0
+        cab[_C["instancia"]] = int.from_bytes(os.urandom(8), "little") | 1
+        cab[_C["capacidade"]], cab[_C["eventos_anel"]], cab[_C["tamanho_evento"]] = (
+            capacidade, eventos_anel, tamanho_evento)
+        cab[_C["proximo_evento"]] = 1
+        del cab
+
+        self._vistas = _Vistas(segmento)
+        self.historico = HistoricoCompartilhado(self._vistas, caminho_historico)
+        self.difusor = DifusorCompartilhado(self._vistas)
+        self.documento("config", {"historico": os.path.abspath(caminho_historico) if caminho_historico else None,
+                                  "pid": os.getpid()})
+        self.bater()
+        self._vistas.cabecalho[_C["ativo"]] = 1
+
+    def documento(self, nome, dados):
+        """Grava o documento ``nome`` (JSON). False se não couber na área reservada."""
+        texto = json.dumps(dados).encode("utf-8")
+        sequencia, area = self._vistas.documentos[nome]
+        if len(texto) > len(area):
+            return False
+        sequencia[0] += 1
+        area[:len(texto)] = np.frombuffer(texto, dtype=np.uint8)
+        sequencia[1] = len(texto)
+        sequencia[0] += 1
+        return True
+
+    def bater(self):
+        self._vistas.cabecalho[_C["batimento_ms"]] = int(time.time() * 1000)
+
+    def manter(self, metricas=None, intervalo=INTERVALO_BATIMENTO):
+        """Thread que bate a cada ``intervalo`` s e grava o retrato de ``metricas`` (metricas.Registro)."""
+        def laco():
+            while self._vistas.campo("ativo"):
+                self.bater()
+                if metricas is not None:
+                    self.documento("metricas_ingestao", metricas.instantaneo())
+                time.sleep(intervalo)
+        threading.Thread(target=laco, daemon=True, name="c213-batimento").start()
+
+    def fechar(self):
+        """
+        Grava o histórico pendente, marca o segmento como encerrado e tira o
+        nome do sistema. O mapeamento segue válido até o processo sair.
+        """
+        if not self._vistas.campo("ativo"):
+            return
+        self.historico.descarregar()
+        self._vistas.cabecalho[_C["ativo"]] = 0
+        segmento = self._vistas.segmento
+        if os.name == "posix" and getattr(segmento, "_track", True):
+            # Antes do 3.13, unlink() desfaz um registro no resource_tracker
+            resource_tracker.register(segmento._name, "shared_memory")
+        segmento.unlink()
+
+
+# =====================================================================
+# 2. LEITURA (WORKERS)
+# =====================================================================
+
+class LeitorEstado:
+    """
+    Lado dos workers: documento()/bruto(), historico (LeitorHistorico) e
+    difusor (LeitorEventos). Liga-se ao segmento sob demanda: antes de a
+    ingestão subir, os documentos são None e o histórico está vazio.
+    """
+
+    def __init__(self, nome):
+        self.nome = nome
+        self._vistas = None
+        self._instancia = 0
+        self._verificado = 0.0
+        self._lock = threading.Lock()
+        self._cache = {} # nome -> (instância, sequência, documento já decodificado)
+        self.historico = LeitorHistorico(self)
+        self.difusor = LeitorEventos(self)
+
+    def vistas(self):
+        """Vistas do segmento atual (ou None); religa se a ingestão parou ou foi reiniciada."""
+        agora = time.monotonic()
+        v = self._vistas
+        if agora - self._verificado < INTERVALO_BATIMENTO:
+            return v
+        with self._lock:
+            self._verificado = agora
+            v = self._vistas
+            if v is not None and v.campo("ativo") and time.time() - v.campo("batimento_ms") / 1000 < VALIDADE_BATIMENTO:
+                return v
+            try:
+                novo = _Vistas(_abrir(self.nome))
+            except (FileNotFoundError, ValueError):
+                return v # sem segmento (novo): segue com o último
+            if v is not None and novo.campo("instancia") == v.campo("instancia"):
+                novo.liberar()
+                return v
+            if v is not None:
+                v.liberar()
+            self._vistas, self._instancia = novo, novo.campo("instancia")
+            return novo
+
+    @property
+    def instancia(self):
+        self.vistas()
+        return self._instancia
+
+    def bruto(self, nome):
+        """Bytes JSON do documento ``nome`` (cópia só dele) ou None."""
+        v = self.vistas()
+        if v is None:
+            return None
+        sequencia, area = v.documentos[nome]
+        texto = _ler(sequencia, 0, lambda: area[:int(sequencia[1])].tobytes())
+        return texto or None
+
+    def documento(self, nome):
+        """Documento ``nome`` decodificado (decodifica de novo só quando muda) ou None."""
+        v = self.vistas()
+        if v is None:
+            return None
+        sequencia, _ = v.documentos[nome]
+        chave = (self._instancia, int(sequencia[0]))
+        em_cache = self._cache.get(nome)
+        if em_cache is not None and em_cache[0] == chave:
+            return em_cache[1]
+        texto = self.bruto(nome)
+        dados = json.loads(texto) if texto else None
+        self._cache[nome] = (chave, dados)
+        return dados
+
+
+def _janela(registros, de, ate):
+    """Vista dos registros (em ordem de t) com de <= t <= ate."""
+    t = registros["t"]
+    ini = 0 if de is None else int(np.searchsorted(t, de, side="left"))
+    fim = len(t) if ate is None else int(np.searchsorted(t, ate, side="right"))
+    return registros[ini:fim]
+
+
+class LeitorHistorico:
+    """Consulta do histórico do segmento, com a mesma interface de HistoricoEstado."""
+
+    def __init__(self, leitor):
+        self._leitor = leitor
+        self._mapa = None
+        self._chave_mapa = None
+
+    def __len__(self):
+        v = self._leitor.vistas()
+        return v.campo("total") if v is not None else 0
+
+    def _arquivo(self, v, gravados):
+        config = self._leitor.documento("config") or {}
+        caminho = config.get("historico")
+        if not caminho or gravados == 0:
+            return None
+        chave = (self._leitor.instancia, v.campo("rotacoes"), gravados)
+        if self._chave_mapa != chave:
+            try:
+                self._mapa = np.memmap(caminho, dtype=REGISTRO, mode="r", shape=(gravados,))
+            except (OSError, ValueError):
+                self._mapa = None
+            self._chave_mapa = chave
+        return self._mapa
+
+    def amostras(self, de=None, ate=None):
+        """Registros com de <= t <= ate, em ordem de chegada (copia só a janela)."""
+        v = self._leitor.vistas()
+        if v is None:
+            return np.zeros(0, dtype=REGISTRO)
+
+        def ler():
+            capacidade, total, inicio_ram = v.campo("capacidade"), v.campo("total"), v.campo("inicio_ram")
+            ini, n = inicio_ram % capacidade, total - inicio_ram
+            trechos = [v.ram[ini:ini + n]] if ini + n <= capacidade else [v.ram[ini:], v.ram[:ini + n - capacidade]]
+            partes = [_janela(trecho, de, ate) for trecho in trechos]
+            # O arquivo só é lido se a janela começa antes da amostra mais antiga da RAM
+            if inicio_ram > 0 and (de is None or not n or de < trechos[0]["t"][0]):
+                arquivo = self._arquivo(v, v.campo("gravados"))
+                if arquivo is not None:
+                    partes.insert(0, _janela(arquivo[:inicio_ram], de, ate))
+            return np.concatenate(partes) if partes else np.zeros(0, dtype=REGISTRO)
+
+        dados = _ler(v.cabecalho, _C["seq_historico"], ler)
+        return dados if dados is not None else np.zeros(0, dtype=REGISTRO)
+
+    def consultar(self, de=None, ate=None, resolucao=None):
+        return reduzir(self.amostras(de, ate), de, ate, resolucao)
+
+    def descarregar(self):
+        pass # quem grava é a ingestão
+
+
+class _Assinatura:
+    """Fila de um cliente de /stream sobre o anel de eventos: get(timeout) como queue.Queue."""
+
+    def __init__(self, eventos, ultimo_id):
+        self._eventos = eventos
+        self._instancia = None
+        self._proximo = 1
+        # A posição é a do momento da assinatura: nada publicado entre ela e
+        # o primeiro get() se perde
+        v = eventos._leitor.vistas()
+        if v is not None:
+            self._posicionar(v, ultimo_id)
+
+    def _posicionar(self, v, ultimo_id):
+        self._instancia = v.campo("instancia")
+        proximo = v.campo("proximo_evento")
+        if ultimo_id is None or ultimo_id >= proximo:
+            self._proximo = proximo
+        else:
+            self._proximo = max(ultimo_id + 1, proximo - len(v.eventos_meta) + 1, 1)
+
+    def get(self, timeout=None):
+        limite = time.monotonic() + (timeout if timeout is not None else float("inf"))
+        while True:
+            v = self._eventos._leitor.vistas()
+            if v is not None:
+                if self._instancia != v.campo("instancia"):
+                    # Ingestão nova (ou que subiu depois da assinatura): os ids
+                    # recomeçam e todos os seus eventos são novos para o cliente
+                    self._posicionar(v, 0)
+                item = self._eventos._ler(v, self)
+                if item is not None:
+                    return item
+            if time.monotonic() >= limite:
+                raise queue.Empty
+            time.sleep(INTERVALO_SONDAGEM)
+
+
+class LeitorEventos:
+    """Lado dos workers do anel de eventos: assinar()/cancelar() como difusao.Difusor."""
+
+    def __init__(self, leitor):
+        self._leitor = leitor
+        self._assinaturas = set()
+        self.descartados = 0
+
+    @property
+    def assinantes(self):
+        return len(self._assinaturas)
+
+    def assinar(self, ultimo_id=None):
+        assinatura = _Assinatura(self, ultimo_id)
+        self._assinaturas.add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        self._assinaturas.discard(assinatura)
+
+    def _ler(self, v, assinatura):
+        """Próximo evento da assinatura (id, evento, texto) ou None se não há novo."""
+        while True:
+            proximo = v.campo("proximo_evento")
+            if assinatura._proximo >= proximo:
+                return None
+            mais_antigo = proximo - len(v.eventos_meta)
+            if assinatura._proximo <= mais_antigo:
+                # Sobrescritos antes de serem lidos
+                self.descartados += mais_antigo + 1 - assinatura._proximo
+                assinatura._proximo = mais_antigo + 1
+            posicao = assinatura._proximo % len(v.eventos_meta)
+            meta = v.eventos_meta[posicao]
+            lido = _ler(meta, 0, lambda: (int(meta[1]), v.eventos_dados[posicao, :int(meta[2])].tobytes()))
+            if lido is None or lido[0] != assinatura._proximo:
+                # Sobrescrito enquanto era lido: tenta o seguinte
+                self.descartados += 1
+                assinatura._proximo += 1
+                continue
+            assinatura._proximo += 1
+            evento, _, texto = lido[1].partition(b"\n")
+            evento = evento.decode("utf-8")
+            texto = texto or self._leitor.bruto(evento) or b"{}"
+            return lido[0], evento, texto.decode("utf-8")
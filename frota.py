@@ -0,0 +1,192 @@
+"""
+Simulação de uma frota de salas/CRACs independentes em um só processo.
+
+O estado de todas as salas fica em arrays NumPy (struct-of-arrays): um
+array por variável, uma posição por sala. Cada passo avalia o controle
+fuzzy de todas as salas de uma vez com motor_vetorizado.avaliar_lote e
+atualiza o modelo térmico vetorizado. Opcionalmente publica o estado de
+cada sala em c213/crac/<sala>/estado.
+
+A cada passo, os alertas de todas as salas são avaliados de uma vez
+(alertas.MotorAlertas); com --mqtt, as salas que abriram ou fecharam o
+mesmo alerta no passo saem num único evento agregado em
+datacenter/fuzzy/alert.
+
+    python frota.py --salas 1000 --dias 1
+    python frota.py --salas 50 --mqtt --periodo 0.5
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from alertas import TOPIC_ALERTA, MotorAlertas
+from controlador import ERRO_MAX, VARERRO_MAX, KP_24H, KP_PADRAO, PASSOS_DIA, proxima_temperatura
+from motor_vetorizado import avaliar_lote
+from telemetria import CODIFICADORES, codificar_json
+
+mqttBroker = "test.mosquitto.org"
+TOPIC_ESTADO_SALA = "c213/crac/{sala}/estado"
+
+SETPOINTS = (16, 22, 25, 32)
+
+
+class Frota:
+    """
+    Estado de N salas. Cada sala tem setpoint, ganho Kp e perfil de
+    perturbação próprios; com os valores padrão o perfil é o mesmo de
+    perturba_text_24h / perturba_carga_24h.
+    """
+
+    def __init__(self, n, sp=25, temp_inicial=25.0, ids=None):
+        self.n = n
+        self.ids = list(ids) if ids is not None else [f"sala{i:04d}" for i in range(n)]
+        self.iteracao = 0
+
+        self.sp = np.full(n, sp, dtype=np.float64)
+        self.kp = np.array([KP_24H.get(int(s), KP_PADRAO) for s in self.sp])
+
+        # Perfil de perturbação por sala
+        self.text_media = np.full(n, 25.0)
+        self.text_amplitude = np.full(n, 10.0)
+        self.defasagem_horas = np.zeros(n)
+        self.carga_alta = np.full(n, 90.0)
+        self.carga_baixa = np.full(n, 30.0)
+
+        # Estado da planta e do controlador (mesmo estado inicial de resetar_estado())
+        self.temperatura = np.full(n, temp_inicial, dtype=np.float64)
+        self.erro = self.temperatura - self.sp
+        self.erro_anterior = self.erro.copy()
+        self.var_erro = np.zeros(n)
+        self.potencia = np.zeros(n)
+        self.text = np.zeros(n)
+        self.carga = np.zeros(n)
+
+    @classmethod
+    def aleatoria(cls, n, semente=0, **kwargs):
+        """Frota com setpoints, fusos e níveis de carga sorteados (reprodutível)."""
+        rng = np.random.default_rng(semente)
+        frota = cls(n, **kwargs)
+        frota.definir_setpoint(rng.choice(SETPOINTS, size=n))
+        frota.text_media = rng.uniform(20, 30, n)
+        frota.text_amplitude = rng.uniform(4, 10, n)
+        frota.defasagem_horas = rng.uniform(-3, 3, n)
+        frota.carga_alta = rng.uniform(60, 95, n)
+        frota.carga_baixa = rng.uniform(15, 40, n)
+        return frota
+
+    def definir_setpoint(self, sp, salas=slice(None)):
+        """Novo setpoint (escalar ou array) para as salas indicadas; o Kp acompanha."""
+        self.sp[salas] = sp
+        self.kp[salas] = [KP_24H.get(int(s), KP_PADRAO) for s in np.atleast_1d(self.sp[salas])]
+
+    def perturbacoes(self, iteracao):
+        """Temperatura externa e carga térmica de todas as salas no passo dado."""
+        horas = iteracao * (24 / PASSOS_DIA) + self.defasagem_horas
+        text = self.text_media + self.text_amplitude * np.sin((horas - 8) * np.pi / 12)
+        hora_do_dia = np.mod(horas, 24)
+        carga = np.where((hora_do_dia >= 8) & (hora_do_dia < 18), self.carga_alta, self.carga_baixa)
+        return text, carga
+
+    def passo(self, text=None, carga=None, ruido=None):
+        """
+        Avança todas as salas um passo. Sem text/carga, usa o perfil de cada
+        sala. ``ruido`` é somado à temperatura lida pelo controlador (erro de
+        medição do sensor); a planta segue com a temperatura real.
+        """
+        if text is None or carga is None:
+            text_perfil, carga_perfil = self.perturbacoes(self.iteracao)
+            text = text_perfil if text is None else text
+            carga = carga_perfil if carga is None else carga
+        self.text = np.broadcast_to(np.asarray(text, dtype=np.float64), (self.n,)).copy()
+        self.carga = np.broadcast_to(np.asarray(carga, dtype=np.float64), (self.n,)).copy()
+
+        medida = self.temperatura if ruido is None else self.temperatura + ruido
+        erro_calc = medida - self.sp
+        self.var_erro = self.erro - self.erro_anterior
+        self.erro_anterior = self.erro
+        self.erro = erro_calc
+
+        P_base, Delta_P = avaliar_lote(np.clip(self.erro, -ERRO_MAX, ERRO_MAX),
+                                       np.clip(self.var_erro, -VARERRO_MAX, VARERRO_MAX),
+                                       self.text, self.carga)
+        self.potencia = np.clip(P_base * self.kp + Delta_P, 0, 100)
+        self.temperatura = proxima_temperatura(self.temperatura, self.potencia, self.carga, self.text)
+        self.iteracao += 1
+
+    def estado(self, i):
+        """
+        Estado de uma sala no mesmo formato publicado em c213/crac/estado.
+        tempo_horas é o instante do último passo(), como no ciclo de 24h.
+        """
+        iteracao = max(self.iteracao - 1, 0)
+        return {
+            "temperatura": round(float(self.temperatura[i]), 2),
+            "erro": round(float(self.erro[i]), 2),
+            "varErro": round(float(self.var_erro[i]), 2),
+            "potencia": round(float(self.potencia[i]), 2),
+            "setpoint": int(self.sp[i]),
+            "qest": round(float(self.carga[i]), 1),
+            "text": round(float(self.text[i]), 1),
+            "simulacao_rodando": True,
+            "injecao_ativa": False,
+            "tempo_horas": round(iteracao * (24 / PASSOS_DIA), 2),
+        }
+
+    def publicar(self, client, codificar=codificar_json):
+        for i, sala in enumerate(self.ids):
+            client.publish(TOPIC_ESTADO_SALA.format(sala=sala), codificar(self.estado(i)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simula uma frota de CRACs com inferência fuzzy em lote.")
+    parser.add_argument("--salas", type=int, default=100)
+    parser.add_argument("--dias", type=float, default=1, help="dias simulados (288 passos por dia)")
+    parser.add_argument("--semente", type=int, default=0, help="semente dos perfis sorteados de cada sala")
+    parser.add_argument("--mqtt", action="store_true", help="publica o estado de cada sala no broker")
+    parser.add_argument("--formato", choices=list(CODIFICADORES), default="json", help="codificação do estado")
+    parser.add_argument("--publicar-a-cada", type=int, default=1, help="publica a cada N passos")
+    parser.add_argument("--periodo", type=float, default=0.0, help="intervalo entre passos em s (0 = sem pausa)")
+    parser.add_argument("--sem-alertas", action="store_true", help="não avalia os alertas das salas")
+    args = parser.parse_args()
+
+    frota = Frota.aleatoria(args.salas, args.semente)
+    alertas = None if args.sem_alertas else MotorAlertas(frota.n, frota.ids)
+
+    client = None
+    if args.mqtt:
+        import paho.mqtt.client as mqtt
+        client = mqtt.Client(client_id="c213_frota")
+        client.connect(mqttBroker, 1883, 60)
+        client.loop_start()
+        if alertas is not None:
+            alertas.ao_evento = lambda evento: client.publish(TOPIC_ALERTA, json.dumps(evento), qos=1)
+
+    passos = int(round(args.dias * PASSOS_DIA))
+    inicio = time.perf_counter()
+    for k in range(passos):
+        frota.passo()
+        if alertas is not None:
+            alertas.avaliar({"temperatura": frota.temperatura}, {"setpoint": frota.sp})
+        if client is not None and k % args.publicar_a_cada == 0:
+            frota.publicar(client, CODIFICADORES[args.formato])
+        if args.periodo > 0:
+            time.sleep(args.periodo)
+    duracao = time.perf_counter() - inicio
+
+    print(f"{args.salas} salas x {passos} passos em {duracao:.2f} s "
+          f"-> {args.salas * passos / duracao:,.0f} passos-sala/s")
+    print(f"Temperatura final: min {frota.temperatura.min():.2f} | média {frota.temperatura.mean():.2f} | "
+          f"máx {frota.temperatura.max():.2f} °C")
+    if alertas is not None:
+        print(f"Alertas: {alertas.eventos} eventos | ativos no fim: "
+              + ", ".join(f"{tipo} {n}" for tipo, n in alertas.resumo().items()))
+
+    if client is not None:
+        client.loop_stop()
+        client.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,465 @@
+"""
+Gravação e reprodução do tráfego MQTT do simulador, para reproduzir
+incidentes, testes de regressão e medidas de vazão sem broker.
+
+    python gravacao.py gravar trafego.c213log --duracao 600
+    python gravacao.py info trafego.c213log
+    python gravacao.py reproduzir trafego.c213log                  # o mais rápido possível
+    python gravacao.py reproduzir trafego.c213log --velocidade 1   # no ritmo original
+    python gravacao.py reproduzir trafego.c213log --saida referencia.c213log
+
+``gravar`` assina os tópicos do simulador (estado, setpoint, comando,
+injeção e a configuração retida do motor) e grava cada mensagem em um log binário: cabeçalho
+(MAGICO_LOG e o instante de início) seguido de registros <instante desde o
+início (s), tópico, tamanho> + payload como chegou (JSON ou bin1). A cada
+INTERVALO_INDICE segundos de gravação, o par (instante, posição) vai para
+<log>.idx, de onde ler() salta direto para o início de uma janela; sem o
+.idx, o índice é refeito percorrendo o log.
+
+``reproduzir`` entrega as mensagens de setpoint/comando/injeção, nos seus
+instantes, a um ControladorCRAC novo (controlador.py) e compara os estados
+que ele produz com os gravados em c213/crac/estado. As mensagens são
+aplicadas entre duas iterações do laço, com um relógio simulado que avança
+a espera de cada passo(): o resultado não depende da carga da máquina e
+duas reproduções do mesmo log são idênticas. Para a comparação valer, a
+gravação deve começar antes do primeiro comando (o controlador reproduzido
+parte do estado inicial do simulador). Com --saida, a própria reprodução é
+gravada e serve de referência para as próximas.
+
+O motor da reprodução é montado como o do test_def.py
+(base_regras.MotorRecarregavel com base_regras.json, tolerância da tabela e
+memória da inferência). O simulador publica em TOPIC_CONFIG, retido, o motor
+e as impressões digitais da base em uso; o gravador o recebe ao assinar e,
+sem --motor/--memoria/--tolerancia-tabela, a reprodução segue o gravado.
+Qualquer diferença (outro motor, base de regras alterada, memória ligada em
+um e não no outro) é avisada; com --estrito, a reprodução é recusada.
+"""
+import argparse
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from base_regras import ARQUIVO_REGRAS, MotorRecarregavel
+from controlador import (
+    TOPIC_ESTADO, TOPIC_SP, TOPIC_COMANDO, TOPIC_INJECAO, TOPIC_CONFIG, MOTORES,
+    ControladorCRAC, carregar_ganhos,
+)
+import telemetria
+
+mqttBroker = "test.mosquitto.org"
+CLIENT_ID = "c213_gravador"
+
+# Tópicos gravados; o byte de tópico de cada registro é o índice nesta tupla
+# (só acrescentar no fim: os logs já gravados continuam legíveis)
+TOPICOS = (TOPIC_ESTADO, TOPIC_SP, TOPIC_COMANDO, TOPIC_INJECAO, TOPIC_CONFIG)
+
+MAGICO_LOG = b"C213LOG1"
+_CABECALHO = struct.Struct("<8sd") # magico, início (s desde a época)
+_REGISTRO = struct.Struct("<dBI") # instante relativo (s), tópico, tamanho do payload
+INDICE = np.dtype([("t", "<f8"), ("posicao", "<u8")])
+
+# Intervalo (s de gravação) entre entradas do índice; o log também é descarregado no disco nesse ritmo
+INTERVALO_INDICE = 1.0
+
+# Campos comparados entre os estados gravados e os reproduzidos
+CAMPOS_COMPARADOS = ("temperatura", "erro", "varErro", "potencia", "setpoint")
+
+
+# =====================================================================
+# 1. LOG
+# =====================================================================
+
+class GravadorLog:
+    """Escreve o log e o índice. gravar() pode ser chamado da thread do paho."""
+
+    def __init__(self, caminho, inicio=None):
+        self.caminho = caminho
+        self.inicio = time.time() if inicio is None else inicio
+        self.registros = 0
+        self._t0 = time.monotonic()
+        self._proximo_indice = 0.0
+        self._lock = threading.Lock()
+        self._arquivo = open(caminho, "wb")
+        self._indice = open(caminho + ".idx", "wb")
+        self._arquivo.write(_CABECALHO.pack(MAGICO_LOG, self.inicio))
+
+    def gravar(self, topico, payload, t=None):
+        """Acrescenta uma mensagem; ``t`` em s desde o início (padrão: agora)."""
+        id_topico = TOPICOS.index(topico)
+        if t is None:
+            t = time.monotonic() - self._t0
+        with self._lock:
+            if t >= self._proximo_indice:
+                self._arquivo.flush()
+                self._indice.write(np.array([(t, self._arquivo.tell())], dtype=INDICE).tobytes())
+                self._indice.flush()
+                self._proximo_indice = t + INTERVALO_INDICE
+            self._arquivo.write(_REGISTRO.pack(t, id_topico, len(payload)))
+            self._arquivo.write(payload)
+            self.registros += 1
+
+    def fechar(self):
+        with self._lock:
+            self._arquivo.close()
+            self._indice.close()
+
+
+class LeitorLog:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        with open(caminho, "rb") as f:
+            cabecalho = f.read(_CABECALHO.size)
+        if len(cabecalho) < _CABECALHO.size or cabecalho[:8] != MAGICO_LOG:
+            raise ValueError(f"{caminho} não é um log de gravacao.py")
+        self.inicio = _CABECALHO.unpack(cabecalho)[1]
+        self.indice = self._carregar_indice()
+
+    def _carregar_indice(self):
+        tamanho = os.path.getsize(self.caminho)
+        try:
+            indice = np.fromfile(self.caminho + ".idx", dtype=INDICE)
+        except (OSError, ValueError):
+            indice = None
+        if indice is not None and len(indice) and indice["posicao"][-1] <= tamanho:
+            return indice
+        # Sem índice (ou de outro arquivo): um ponto por INTERVALO_INDICE, percorrendo o log
+        pontos, proximo = [], 0.0
+        for t, posicao, _, _ in self._registros(_CABECALHO.size):
+            if t >= proximo:
+                pontos.append((t, posicao))
+                proximo = t + INTERVALO_INDICE
+        return np.array(pontos, dtype=INDICE)
+
+    def _registros(self, posicao):
+        """(t, posição, id do tópico, payload) a partir de ``posicao``; para em um registro final incompleto."""
+        with open(self.caminho, "rb") as f:
+            f.seek(posicao)
+            while True:
+                cabecalho = f.read(_REGISTRO.size)
+                if len(cabecalho) < _REGISTRO.size:
+                    return
+                t, id_topico, tamanho = _REGISTRO.unpack(cabecalho)
+                payload = f.read(tamanho)
+                if len(payload) < tamanho:
+                    return
+                yield t, posicao, id_topico, payload
+                posicao += _REGISTRO.size + tamanho
+
+    def ler(self, de=None, ate=None):
+        """Mensagens (t, tópico, payload) com de <= t <= ate, em ordem de gravação."""
+        posicao = _CABECALHO.size
+        if de is not None and len(self.indice):
+            k = int(np.searchsorted(self.indice["t"], de, side="right")) - 1
+            if k >= 0:
+                posicao = int(self.indice["posicao"][k])
+        for t, _, id_topico, payload in self._registros(posicao):
+            if de is not None and t < de:
+                continue
+            if ate is not None and t > ate:
+                return
+            yield t, TOPICOS[id_topico], payload
+
+    def __iter__(self):
+        return self.ler()
+
+
+def gravar(caminho, duracao=None):
+    """Grava os tópicos do simulador até ``duracao`` s (ou Ctrl+C)."""
+    import paho.mqtt.client as mqtt
+
+    gravador = GravadorLog(caminho)
+
+    def on_connect(client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe([(topico, 0) for topico in TOPICOS])
+            print(f"Gravando {', '.join(TOPICOS)} em {caminho}")
+        else:
+            print(f"Falha na conexão MQTT, código {rc}")
+
+    def on_message(client, userdata, msg):
+        gravador.gravar(msg.topic, msg.payload)
+
+    client = mqtt.Client(client_id=CLIENT_ID)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(mqttBroker, 1883, 60)
+    client.loop_start()
+    try:
+        fim = time.monotonic() + duracao if duracao else None
+        while fim is None or time.monotonic() < fim:
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        gravador.fechar()
+    print(f"{gravador.registros} mensagens gravadas.")
+
+
+# =====================================================================
+# 2. REPRODUÇÃO
+# =====================================================================
+
+class _Coletor:
+    """Faz o papel do PublicadorEstado na reprodução: guarda (instante, estado)."""
+
+    def __init__(self):
+        self.t = 0.0
+        self.estados = []
+
+    def publicar(self, estado, prioritario=False):
+        self.estados.append((self.t, estado))
+        return True
+
+    def descarregar(self):
+        pass
+
+
+def _diferencas_configuracao(gravada, reproducao):
+    """Avisos sobre o que difere entre a configuração gravada e a da reprodução."""
+    if gravada is None:
+        return [f"o log não registra o motor do simulador ({TOPIC_CONFIG}); reproduzido com "
+                f"motor {reproducao['motor']}, memória {'ligada' if reproducao['memoria'] is not None else 'desligada'}"]
+    avisos = []
+    if gravada.get("motor") != reproducao["motor"]:
+        avisos.append(f"motor gravado {gravada.get('motor')}, reproduzido {reproducao['motor']}")
+    elif reproducao["motor"] == "tabela" and gravada.get("tolerancia_tabela") != reproducao["tolerancia_tabela"]:
+        avisos.append(f"tolerância da tabela gravada {gravada.get('tolerancia_tabela')}, "
+                      f"reproduzida {reproducao['tolerancia_tabela']}")
+    if gravada.get("memoria") != reproducao["memoria"]:
+        avisos.append(f"memória da inferência gravada {gravada.get('memoria')}, reproduzida {reproducao['memoria']}")
+    impressoes = gravada.get("impressoes") or {}
+    for estagio, impressao in reproducao["impressoes"].items():
+        if impressoes.get(estagio) != impressao:
+            avisos.append(f"base de regras do estágio {estagio} difere da gravada "
+                          f"({str(impressoes.get(estagio))[:12]} != {impressao[:12]})")
+    return avisos
+
+
+def reproduzir(caminho, motor=None, velocidade=0.0, kp_24h=None, kp_continuo=None, regras=ARQUIVO_REGRAS,
+               memoria=None, tolerancia_tabela=None, estrito=False):
+    """
+    Reproduz o log em um ControladorCRAC sem broker.
+
+    ``velocidade`` 0 roda o mais rápido possível; 1 no ritmo original
+    (2 = duas vezes mais rápido...). ``motor``, ``memoria`` (opções de
+    memoria_inferencia, False desliga) e ``tolerancia_tabela`` em None seguem
+    a configuração gravada em TOPIC_CONFIG. Com ``estrito``, levanta
+    ValueError se a configuração da reprodução diferir da gravada. Retorna
+    um dicionário com "gravados" e "reproduzidos" (listas de (t, estado)),
+    "mensagens" (as de controle entregues), "configuracao" (a da
+    reprodução), "avisos", "passos" e "duracao" (s de parede).
+    """
+    padrao_24h, padrao_continuo = carregar_ganhos()
+    leitor = LeitorLog(caminho)
+    mensagens, gravados, configuracoes, invalidos = [], [], [], 0
+    for t, topico, payload in leitor:
+        if topico == TOPIC_CONFIG:
+            try:
+                configuracoes.append((t, json.loads(payload)))
+            except ValueError:
+                invalidos += 1
+            continue
+        if topico != TOPIC_ESTADO:
+            mensagens.append((t, topico, payload))
+            continue
+        try:
+            gravados.extend((t, estado) for estado in telemetria.decodificar_lote(payload))
+        except ValueError:
+            invalidos += 1
+    fim = max(mensagens[-1][0] if mensagens else 0.0, gravados[-1][0] if gravados else 0.0)
+
+    gravada = configuracoes[0][1] if configuracoes else None
+    if motor is None:
+        motor = (gravada or {}).get("motor", "vetorizado")
+    if tolerancia_tabela is None:
+        tolerancia_tabela = (gravada or {}).get("tolerancia_tabela", 1.0)
+    if memoria is None:
+        memoria = (gravada or {}).get("memoria")
+    elif memoria is False:
+        memoria = None
+
+    coletor = _Coletor()
+    # Como no test_def.py; a validade da memória corre no relógio simulado
+    calcular_fuzzy = MotorRecarregavel(motor, regras, tolerancia_tabela, log=lambda *args: None,
+                                       memoria=None if memoria is None
+                                       else dict(memoria, relogio=lambda: coletor.t))
+    configuracao = calcular_fuzzy.configuracao()
+    avisos = _diferencas_configuracao(gravada, configuracao)
+    for t, outra in configuracoes[1:]:
+        if outra != gravada:
+            avisos.append(f"a configuração do simulador mudou durante a gravação (t = {t:.1f} s); "
+                          f"a reprodução usa a do início")
+            break
+    if estrito and avisos:
+        raise ValueError("configuração da reprodução difere da gravada: " + "; ".join(avisos))
+
+    controle = ControladorCRAC(calcular_fuzzy, kp_24h or padrao_24h, kp_continuo or padrao_continuo,
+                               coletor, log=lambda *args: None)
+    t, i, passos = 0.0, 0, 0
+    inicio = time.perf_counter()
+    while t <= fim:
+        while i < len(mensagens) and mensagens[i][0] <= t:
+            controle.processar_mensagem(mensagens[i][1], mensagens[i][2])
+            i += 1
+        coletor.t = t
+        t += controle.passo()
+        passos += 1
+        if velocidade:
+            espera = inicio + t / velocidade - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+
+    return {"gravados": gravados, "reproduzidos": coletor.estados, "mensagens": mensagens,
+            "configuracao": configuracao, "avisos": avisos,
+            "invalidos": invalidos, "passos": passos, "duracao": time.perf_counter() - inicio}
+
+
+def _trecho_ativo(estados):
+    """
+    Estados com a simulação rodando, sem repetições consecutivas: o
+    publicador suprime o estado repetido, então só a sequência de estados
+    distintos é comparável. O instante "t" do publicador não conta.
+    """
+    saida = []
+    for _, estado in estados:
+        estado = {campo: valor for campo, valor in estado.items() if campo != "t"}
+        if estado.get("simulacao_rodando") and (not saida or estado != saida[-1]):
+            saida.append(estado)
+    return saida
+
+
+def comparar(gravados, reproduzidos, tolerancia=0.0):
+    """Diferenças entre os trechos ativos de duas listas de (t, estado)."""
+    a, b = _trecho_ativo(gravados), _trecho_ativo(reproduzidos)
+    n = min(len(a), len(b))
+    va = np.array([[e.get(c, np.nan) for c in CAMPOS_COMPARADOS] for e in a[:n]], dtype=float).reshape(n, len(CAMPOS_COMPARADOS))
+    vb = np.array([[e.get(c, np.nan) for c in CAMPOS_COMPARADOS] for e in b[:n]], dtype=float).reshape(n, len(CAMPOS_COMPARADOS))
+    diferenca = np.abs(va - vb)
+    divergentes = np.flatnonzero((diferenca > tolerancia + 1e-9).any(axis=1))
+    primeira = int(divergentes[0]) if len(divergentes) else None
+    return {
+        "gravados": len(a),
+        "reproduzidos": len(b),
+        "comparados": n,
+        "divergentes": len(divergentes),
+        "primeira_divergencia": primeira,
+        "amostras": (a[primeira], b[primeira]) if primeira is not None else None,
+        "max_diferenca": {c: float(diferenca[:, k].max()) if n else 0.0 for k, c in enumerate(CAMPOS_COMPARADOS)},
+        "iguais": len(a) == len(b) and not len(divergentes),
+    }
+
+
+def gravar_reproducao(resultado, caminho, formato="json"):
+    """
+    Grava a configuração do motor, as mensagens de controle e os estados
+    reproduzidos como um novo log (referência para regressão).
+    """
+    codificar = telemetria.CODIFICADORES[formato]
+    eventos = [(0.0, -1, TOPIC_CONFIG, json.dumps(resultado["configuracao"]).encode())]
+    eventos += [(t, 0, topico, payload) for t, topico, payload in resultado["mensagens"]]
+    eventos += [(t, 1, TOPIC_ESTADO, codificar(estado)) for t, estado in resultado["reproduzidos"]]
+    # Em empate, a mensagem de controle vem antes do estado do passo em que foi aplicada
+    eventos.sort(key=lambda e: (e[0], e[1]))
+    gravador = GravadorLog(caminho)
+    for t, _, topico, payload in eventos:
+        gravador.gravar(topico, payload, t)
+    gravador.fechar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grava e reproduz o tráfego MQTT do simulador.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("gravar", help="grava os tópicos c213/crac do broker")
+    p.add_argument("log")
+    p.add_argument("--duracao", type=float, default=None, help="segundos (padrão: até Ctrl+C)")
+
+    p = sub.add_parser("info", help="resumo de um log")
+    p.add_argument("log")
+
+    p = sub.add_parser("reproduzir", help="reproduz um log no controlador, sem broker, e compara os estados")
+    p.add_argument("log")
+    p.add_argument("--motor", choices=MOTORES, default=None, help="padrão: o gravado (ou vetorizado)")
+    p.add_argument("--regras", default=ARQUIVO_REGRAS,
+                   help="base de regras (JSON/YAML; se não existir, a de sistema_fuzzy.py)")
+    p.add_argument("--memoria", dest="memoria", action="store_const", const={}, default=None,
+                   help="liga a memória da inferência (padrão: como gravado)")
+    p.add_argument("--sem-memoria", dest="memoria", action="store_const", const=False,
+                   help="desliga a memória da inferência")
+    p.add_argument("--tolerancia-tabela", type=float, default=None,
+                   help="erro máximo do motor tabela (padrão: o gravado, ou 1.0)")
+    p.add_argument("--estrito", action="store_true",
+                   help="recusa reproduzir se motor ou base de regras diferirem dos gravados")
+    p.add_argument("--velocidade", type=float, default=0.0,
+                   help="0 = o mais rápido possível, 1 = ritmo original")
+    p.add_argument("--tolerancia", type=float, default=0.0, help="diferença aceita por campo")
+    p.add_argument("--saida", help="grava a reprodução como um novo log")
+    p.add_argument("--formato", choices=telemetria.FORMATOS, default="json", help="codificação do estado em --saida")
+
+    args = parser.parse_args()
+
+    if args.comando == "gravar":
+        gravar(args.log, args.duracao)
+
+    elif args.comando == "info":
+        leitor = LeitorLog(args.log)
+        contagem, bytes_, ultimo, configuracao = dict.fromkeys(TOPICOS, 0), 0, 0.0, None
+        for t, topico, payload in leitor:
+            contagem[topico] += 1
+            if topico == TOPIC_CONFIG and configuracao is None:
+                try:
+                    configuracao = json.loads(payload)
+                except ValueError:
+                    pass
+            bytes_ += len(payload)
+            ultimo = t
+        print(f"{args.log}: início {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(leitor.inicio))}, "
+              f"{ultimo:.1f} s, {os.path.getsize(args.log) / 1024:.1f} kB "
+              f"({bytes_ / 1024:.1f} kB de payload), {len(leitor.indice)} entradas no índice")
+        for topico, n in contagem.items():
+            print(f"  {topico:<24}{n:>10}")
+        if configuracao is not None:
+            impressoes = ", ".join(f"{e} {i[:12]}" for e, i in configuracao.get("impressoes", {}).items())
+            print(f"Motor gravado: {configuracao.get('motor')}, memória {configuracao.get('memoria')}, "
+                  f"base de regras {impressoes}")
+
+    else:
+        try:
+            resultado = reproduzir(args.log, args.motor, args.velocidade, regras=args.regras,
+                                   memoria=args.memoria, tolerancia_tabela=args.tolerancia_tabela,
+                                   estrito=args.estrito)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        for aviso in resultado["avisos"]:
+            print(f"Aviso: {aviso}")
+        passos, duracao = resultado["passos"], resultado["duracao"]
+        print(f"{len(resultado['mensagens'])} mensagens de controle, {passos} passos em {duracao:.3f} s "
+              f"({passos / max(duracao, 1e-9):,.0f} passos/s)")
+        if resultado["invalidos"]:
+            print(f"{resultado['invalidos']} payloads de estado inválidos ignorados")
+        if args.saida:
+            gravar_reproducao(resultado, args.saida, args.formato)
+            print(f"Reprodução gravada em {args.saida}")
+
+        diferencas = comparar(resultado["gravados"], resultado["reproduzidos"], args.tolerancia)
+        if not diferencas["gravados"]:
+            print("O log não tem estados da simulação rodando para comparar.")
+        print(f"Estados ativos: {diferencas['gravados']} gravados, {diferencas['reproduzidos']} reproduzidos, "
+              f"{diferencas['divergentes']} divergentes de {diferencas['comparados']} comparados")
+        print("Maior diferença: " + ", ".join(f"{c} {v:.2f}" for c, v in diferencas["max_diferenca"].items()))
+        if diferencas["primeira_divergencia"] is not None:
+            gravado, reproduzido = diferencas["amostras"]
+            print(f"Primeira divergência (amostra {diferencas['primeira_divergencia']}):\n"
+                  f"  gravado:     {gravado}\n  reproduzido: {reproduzido}")
+        if not diferencas["iguais"]:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Histórico das amostras de estado no servidor do dashboard.
+
+As amostras mais recentes ficam em um buffer circular pré-alocado (array
+estruturado NumPy, um registro de 36 bytes por amostra). Em lotes, elas
+são acrescentadas a um arquivo binário só de escrita no fim, lido com
+np.memmap: o histórico sobrevive a reinícios do servidor e janelas longas
+são lidas sem carregar o arquivo na memória.
+
+consultar(de, ate, resolucao) agrupa as amostras em intervalos de
+``resolucao`` segundos e devolve mínimo, máximo e média de cada campo por
+intervalo, para o navegador desenhar janelas longas sem receber cada
+amostra.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+CAMPOS = ("temperatura", "erro", "varErro", "potencia", "setpoint", "qest", "text")
+REGISTRO = np.dtype([("t", "<f8")] + [(c, "<f4") for c in CAMPOS])
+
+ARQUIVO_HISTORICO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "historico_estado.v1.bin")
+
+# Número máximo de intervalos devolvidos quando a resolução não é informada
+PONTOS_PADRAO = 500
+
+
+class HistoricoEstado:
+    """
+    Histórico de um processo. Com ``ram`` (array REGISTRO, ex. num segmento
+    de memória compartilhada), o buffer circular é esse array e a
+    capacidade é o tamanho dele.
+    """
+
+    def __init__(self, caminho=ARQUIVO_HISTORICO, capacidade=65536, lote=256,
+                 intervalo_gravacao=5.0, tamanho_max_arquivo=256 * 2**20, ram=None):
+        self.caminho = caminho
+        capacidade = len(ram) if ram is not None else capacidade
+        self.capacidade = capacidade
+        self.lote = min(lote, capacidade)
+        self.intervalo_gravacao = intervalo_gravacao
+        self.tamanho_max_arquivo = tamanho_max_arquivo
+
+        self._ram = np.zeros(capacidade, dtype=REGISTRO) if ram is None else ram
+        self._lock = threading.Lock()
+        self._mapa = None
+
+        # Amostras já no arquivo (descarta um registro final incompleto)
+        self._gravados = 0
+        if caminho and os.path.exists(caminho):
+            self._gravados = os.path.getsize(caminho) // REGISTRO.itemsize
+            with open(caminho, "r+b") as f:
+                f.truncate(self._gravados * REGISTRO.itemsize)
+        # Índice global da próxima amostra; as da RAM são [_inicio_ram, _total)
+        self._total = self._gravados
+        self._inicio_ram = self._gravados
+        self._ultima_gravacao = time.monotonic()
+        # Vezes que o arquivo virou .anterior (quem mapeia o arquivo refaz o mapa)
+        self.rotacoes = 0
+
+    def __len__(self):
+        return self._total
+
+    def adicionar(self, estado, t=None):
+        """Acrescenta uma amostra (dict do estado publicado); campos ausentes viram NaN."""
+        registro = (time.time() if t is None else t,) + tuple(
+            float(estado[c]) if isinstance(estado.get(c), (int, float)) else np.nan for c in CAMPOS)
+        with self._lock:
+            if self._total - self._gravados >= self.capacidade:
+                self._gravar()
+            self._ram[self._total % self.capacidade] = registro
+            self._total += 1
+            self._inicio_ram = max(self._inicio_ram, self._total - self.capacidade)
+            if (self._total - self._gravados >= self.lote
+                    or time.monotonic() - self._ultima_gravacao >= self.intervalo_gravacao):
+                self._gravar()
+
+    def descarregar(self):
+        """Grava no arquivo as amostras que ainda estão só na RAM."""
+        with self._lock:
+            self._gravar()
+
+    def _gravar(self):
+        self._ultima_gravacao = time.monotonic()
+        if not self.caminho:
+            # Só memória: o que sai do buffer circular é perdido
+            self._gravados = self._total
+            return
+        if self._gravados == self._total:
+            return
+        pendentes = self._trecho_ram(self._gravados, self._total)
+        if (self._gravados + len(pendentes)) * REGISTRO.itemsize > self.tamanho_max_arquivo:
+            # Arquivo cheio: o atual vira .anterior e um novo começa vazio
+            os.replace(self.caminho, self.caminho + ".anterior")
+            self._mapa = None
+            self.rotacoes += 1
+            deslocamento = self._gravados
+            self._gravados = 0
+            self._total -= deslocamento
+            self._inicio_ram -= deslocamento
+            # Índices da RAM são módulo capacidade: reposiciona o buffer (no lugar)
+            self._ram[:] = np.roll(self._ram, -(deslocamento % self.capacidade))
+        with open(self.caminho, "ab") as f:
+            f.write(pendentes.tobytes())
+        self._gravados = self._total
+
+    def _trecho_ram(self, ini, fim):
+        """Registros de índice global [ini, fim), todos presentes na RAM, em ordem."""
+        a, b = ini % self.capacidade, fim % self.capacidade
+        if fim - ini == 0:
+            return self._ram[:0]
+        if a < b:
+            return self._ram[a:b]
+        return np.concatenate([self._ram[a:], self._ram[:b]])
+
+    def _arquivo(self):
+        """Memmap dos registros gravados (refeito quando o arquivo cresce)."""
+        if not self.caminho or self._gravados == 0:
+            return self._ram[:0]
+        if self._mapa is None or len(self._mapa) != self._gravados:
+            self._mapa = np.memmap(self.caminho, dtype=REGISTRO, mode="r", shape=(self._gravados,))
+        return self._mapa
+
+    def amostras(self, de=None, ate=None):
+        """Registros com de <= t <= ate, em ordem de chegada."""
+        with self._lock:
+            ram = self._trecho_ram(self._inicio_ram, self._total).copy()
+            antigos = ram[:0]
+            # O arquivo só é lido se a janela começa antes da amostra mais antiga da RAM
+            if self.caminho and self._inicio_ram > 0 and (de is None or not len(ram) or de < ram["t"][0]):
+                arquivo = self._arquivo()[:self._inicio_ram]
+                t = arquivo["t"]
+                ini = 0 if de is None else int(np.searchsorted(t, de, side="left"))
+                fim = len(t) if ate is None else int(np.searchsorted(t, ate, side="right"))
+                antigos = np.array(arquivo[ini:fim])
+        dados = np.concatenate([antigos, ram])
+        t = dados["t"]
+        ini = 0 if de is None else int(np.searchsorted(t, de, side="left"))
+        fim = len(t) if ate is None else int(np.searchsorted(t, ate, side="right"))
+        return dados[ini:fim]
+
+    def consultar(self, de=None, ate=None, resolucao=None):
+        """
+        Série reduzida em intervalos de ``resolucao`` s: {"t": [início de cada
+        intervalo], "n": [amostras], campo: {"min": [...], "max": [...], "media": [...]}}.
+        Sem ``resolucao``, usa a que dá até PONTOS_PADRAO intervalos.
+        """
+        return reduzir(self.amostras(de, ate), de, ate, resolucao)
+
+
+def reduzir(dados, de=None, ate=None, resolucao=None):
+    """Registros REGISTRO em ordem de chegada -> série reduzida de consultar()."""
+    if not len(dados):
+        return {"resolucao": resolucao, "t": [], "n": [], **{c: {"min": [], "max": [], "media": []} for c in CAMPOS}}
+    t = dados["t"]
+    inicio = t[0] if de is None else de
+    if not resolucao:
+        fim = t[-1] if ate is None else ate
+        resolucao = max((fim - inicio) / PONTOS_PADRAO, 1e-3)
+
+    indice = np.floor((t - inicio) / resolucao).astype(np.int64)
+    # Amostras em ordem de chegada: cada intervalo é um trecho contíguo
+    cortes = np.flatnonzero(np.r_[True, indice[1:] != indice[:-1]])
+    contagem = np.diff(np.r_[cortes, len(t)])
+    saida = {"resolucao": resolucao, "t": (inicio + indice[cortes] * resolucao).tolist(), "n": contagem.tolist()}
+    for campo in CAMPOS:
+        valores = dados[campo].astype(np.float64)
+        validos = ~np.isnan(valores)
+        soma = np.add.reduceat(np.where(validos, valores, 0.0), cortes)
+        n = np.add.reduceat(validos.astype(np.int64), cortes)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            media = soma / n
+            minimo = np.fmin.reduceat(valores, cortes)
+            maximo = np.fmax.reduceat(valores, cortes)
+        saida[campo] = {"min": _lista(minimo), "max": _lista(maximo), "media": _lista(media)}
+    return saida
+
+
+def _lista(valores):
+    """Array -> lista para JSON, com NaN como None (null)."""
+    return [None if v != v else round(v, 4) for v in valores.tolist()]
@@ -0,0 +1,188 @@
+"""
+Memória (LRU + validade) da inferência de cada estágio do controlador.
+
+No laço contínuo a compensação recebe sempre as mesmas entradas (text_atual
+e qest_atual são fixos) e, em regime, o núcleo também: erro e Δerro se
+acomodam em torno de um ponto. EstagioMemorizado fica na frente de um
+estágio (x, y) -> z de controlador.criar_estagio e guarda as últimas
+saídas por entrada quantizada:
+
+- cada entrada é arredondada para a grade de QUANTIZACAO (passo por
+  variável; 0 = sem quantização) e o estágio é avaliado no ponto da grade,
+  de modo que a saída é a mesma qualquer que seja a ordem das consultas;
+- até ``capacidade`` entradas, descartando a usada há mais tempo (LRU);
+- cada saída vale por ``validade`` s (None = sem limite);
+- entradas não finitas (ou grandes demais para a grade) vão direto ao
+  estágio, sem memória;
+- consultas, acertos, expiradas e despejos ficam em contadores e, com
+  ``metricas``, em c213_memoria_inferencia_total.
+
+Com a recarga da base de regras (base_regras.MotorRecarregavel) o estágio
+recompilado vem com memória nova. Os fallbacks (ao_padrao) só são contados
+nas inferências feitas, não nos acertos.
+
+    python memoria_inferencia.py --passos 5000 --sp 22
+"""
+import argparse
+import collections
+import math
+import time
+
+import sistema_fuzzy
+
+# Passo da grade de cada variável de entrada. O erro da quantização é no
+# máximo meio passo vezes a inclinação da superfície; no laço fechado ele
+# também muda a trajetória. Com estes valores, o desvio da potência no laço
+# contínuo fica em até 0,02 ponto (main(), nos quatro setpoints)
+QUANTIZACAO = {
+    'errotemp': 0.001,
+    'varerrotemp': 0.0001,
+    'text': 0.1,
+    'cargatermica': 0.1,
+}
+CAPACIDADE_PADRAO = 4096
+VALIDADE_PADRAO = 300.0
+
+
+def _grade(valor, passo):
+    """valor arredondado para a grade de ``passo`` (0 = sem grade); None se não for finito."""
+    if not passo:
+        return valor if math.isfinite(valor) else None
+    pontos = valor / passo
+    return round(pontos) * passo if math.isfinite(pontos) else None
+
+
+class EstagioMemorizado:
+    """Estágio (x, y) -> z com memória LRU das saídas por entrada quantizada."""
+
+    def __init__(self, estagio, subsistema, quantizacao=None, capacidade=CAPACIDADE_PADRAO,
+                 validade=VALIDADE_PADRAO, metricas=None, relogio=time.monotonic):
+        self.estagio = estagio
+        self.subsistema = subsistema
+        quantizacao = QUANTIZACAO if quantizacao is None else quantizacao
+        self.passos = tuple(float(quantizacao.get(e, 0.0))
+                            for e in sistema_fuzzy.SUBSISTEMAS[subsistema]['entradas'])
+        self.capacidade = capacidade
+        self.validade = validade
+        self.relogio = relogio
+        self._saidas = collections.OrderedDict()
+        self.consultas = self.acertos = self.expiradas = self.despejos = 0
+
+        self._contadores = None
+        if metricas is not None:
+            self._contadores = {
+                resultado: metricas.contador("c213_memoria_inferencia_total",
+                                             "Consultas à memória da inferência por resultado",
+                                             subsistema=subsistema, resultado=resultado)
+                for resultado in ("acerto", "falta")
+            }
+
+    def __call__(self, x, y):
+        px, py = self.passos
+        gx, gy = _grade(float(x), px), _grade(float(y), py)
+        if gx is None or gy is None:
+            return self.estagio(x, y)
+        x, y = gx, gy
+        chave = (x, y)
+        self.consultas += 1
+
+        item = self._saidas.get(chave)
+        agora = self.relogio() if self.validade is not None else 0.0
+        if item is not None:
+            if self.validade is None or agora - item[1] <= self.validade:
+                self._saidas.move_to_end(chave)
+                self.acertos += 1
+                if self._contadores is not None:
+                    self._contadores["acerto"].incrementar()
+                return item[0]
+            self.expiradas += 1
+
+        z = self.estagio(x, y)
+        self._saidas[chave] = (z, agora)
+        self._saidas.move_to_end(chave)
+        if len(self._saidas) > self.capacidade:
+            self._saidas.popitem(last=False)
+            self.despejos += 1
+        if self._contadores is not None:
+            self._contadores["falta"].incrementar()
+        return z
+
+    @property
+    def taxa_acerto(self):
+        return self.acertos / self.consultas if self.consultas else 0.0
+
+    def limpar(self):
+        self._saidas.clear()
+
+    def resumo(self):
+        return {
+            "consultas": self.consultas, "acertos": self.acertos, "taxa_acerto": round(self.taxa_acerto, 4),
+            "expiradas": self.expiradas, "despejos": self.despejos, "tamanho": len(self._saidas),
+        }
+
+
+# =====================================================================
+# COMPARAÇÃO NO LAÇO CONTÍNUO
+# =====================================================================
+
+class _Descarte:
+    """Publicador que só guarda a potência de cada estado."""
+
+    def __init__(self):
+        self.potencias = []
+
+    def publicar(self, estado, prioritario=False):
+        self.potencias.append(estado.get("potencia", 0.0))
+        return True
+
+    def descarregar(self):
+        pass
+
+
+def _laco_continuo(inferir, sp, passos):
+    from controlador import ControladorCRAC, KP_24H, KP_CONTINUO
+
+    publicador = _Descarte()
+    controle = ControladorCRAC(inferir, KP_24H, KP_CONTINUO, publicador, log=lambda *args: None)
+    controle.enviar("setpoint", sp)
+    controle.enviar("iniciar")
+    inicio = time.perf_counter()
+    for _ in range(passos):
+        controle.passo()
+    return time.perf_counter() - inicio, publicador.potencias
+
+
+def main():
+    from controlador import ESTAGIOS, MOTORES, criar_estagio
+
+    parser = argparse.ArgumentParser(description="Mede a memória da inferência no laço contínuo.")
+    parser.add_argument("--motor", choices=MOTORES, default="vetorizado")
+    parser.add_argument("--sp", type=int, default=22)
+    parser.add_argument("--passos", type=int, default=5000)
+    parser.add_argument("--capacidade", type=int, default=CAPACIDADE_PADRAO)
+    args = parser.parse_args()
+
+    def motor(memoria):
+        estagios = [criar_estagio(args.motor, n) for n in ESTAGIOS]
+        if memoria:
+            estagios = [EstagioMemorizado(e, n, capacidade=args.capacidade) for e, n in zip(estagios, ESTAGIOS)]
+        nucleo, compensacao = estagios
+
+        def inferir(erro, varerro, text, carga):
+            return nucleo(erro, varerro), compensacao(text, carga)
+        return inferir, estagios
+
+    inferir, _ = motor(False)
+    duracao, referencia = _laco_continuo(inferir, args.sp, args.passos)
+    inferir, estagios = motor(True)
+    duracao_memo, potencias = _laco_continuo(inferir, args.sp, args.passos)
+
+    desvio = max(abs(a - b) for a, b in zip(referencia, potencias))
+    print(f"{args.motor}, SP {args.sp}, {args.passos} passos: {duracao / args.passos * 1e6:.1f} µs/passo sem memória, "
+          f"{duracao_memo / args.passos * 1e6:.1f} µs/passo com memória | desvio máx. da potência {desvio:.3f}")
+    for nome, estagio in zip(ESTAGIOS, estagios):
+        print(f"  {nome}: {estagio.resumo()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Métricas do caminho quente do controlador: contadores, medidores e
+histogramas de latência, a poucos µs por observação.
+
+Registro.instantaneo() devolve um retrato serializável em JSON. O
+test_def.py o publica a cada INTERVALO_METRICAS s em TOPIC_METRICAS; o
+dashboard_server.py assina esse tópico e expõe o último retrato do
+controlador, junto das próprias métricas, em /metrics no formato texto do
+Prometheus (formatar_prometheus).
+
+Nomes e unidades seguem a convenção do Prometheus: segundos, sufixo
+_total nos contadores, rótulos como argumentos nomeados:
+
+    registro = Registro()
+    fallback = registro.contador("c213_fallback_total", "Regras sem disparo", subsistema="nucleo")
+    fallback.incrementar()
+"""
+import bisect
+import threading
+import time
+
+TOPIC_METRICAS = "c213/crac/metricas"
+
+# Limites dos histogramas (s): inferência/publicação (µs a ms) e atraso do laço (ms)
+LIMITES_LATENCIA = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1)
+LIMITES_ATRASO = (1e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0)
+
+
+class Contador:
+    __slots__ = ("valor", "_lock")
+
+    def __init__(self):
+        self.valor = 0
+        self._lock = threading.Lock()
+
+    def incrementar(self, n=1):
+        with self._lock:
+            self.valor += n
+
+
+class Histograma:
+    __slots__ = ("limites", "contagens", "soma", "_lock")
+
+    def __init__(self, limites):
+        self.limites = tuple(limites)
+        self.contagens = [0] * (len(self.limites) + 1) # o último é +Inf
+        self.soma = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        i = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            self.contagens[i] += 1
+            self.soma += valor
+
+    def cronometrar(self):
+        """Context manager que observa a duração do bloco."""
+        return _Cronometro(self)
+
+
+class _Cronometro:
+    __slots__ = ("histograma", "inicio")
+
+    def __init__(self, histograma):
+        self.histograma = histograma
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histograma.observar(time.perf_counter() - self.inicio)
+
+
+class Registro:
+    def __init__(self):
+        # (nome, rótulos) -> (tipo, ajuda, métrica ou função do medidor)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, nome, tipo, ajuda, rotulos, criar):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            if chave not in self._series:
+                self._series[chave] = (tipo, ajuda, criar())
+            return self._series[chave][2]
+
+    def contador(self, nome, ajuda="", **rotulos):
+        return self._registrar(nome, "counter", ajuda, rotulos, Contador)
+
+    def histograma(self, nome, ajuda="", limites=LIMITES_LATENCIA, **rotulos):
+        return self._registrar(nome, "histogram", ajuda, rotulos, lambda: Histograma(limites))
+
+    def medidor(self, nome, funcao, ajuda="", tipo="gauge", **rotulos):
+        """
+        Valor lido de ``funcao()`` a cada retrato (ex.: profundidade de uma
+        fila). ``tipo`` "counter" para totais mantidos em outro objeto.
+        """
+        return self._registrar(nome, tipo, ajuda, rotulos, lambda: funcao)
+
+    def instantaneo(self):
+        """Retrato de todas as séries: {"t": epoch, "series": [dict por série]}."""
+        with self._lock:
+            series = list(self._series.items())
+        saida = []
+        for (nome, rotulos), (tipo, ajuda, metrica) in series:
+            item = {"nome": nome, "tipo": tipo, "ajuda": ajuda, "rotulos": dict(rotulos)}
+            if isinstance(metrica, Histograma):
+                with metrica._lock:
+                    item.update(limites=list(metrica.limites), contagens=list(metrica.contagens), soma=metrica.soma)
+            elif isinstance(metrica, Contador):
+                item["valor"] = metrica.valor
+            else:
+                try:
+                    item["valor"] = float(metrica())
+                except Exception:
+                    item["valor"] = float("nan")
+            saida.append(item)
+        return {"t": time.time(), "series": saida}
+
+
+# =====================================================================
+# FORMATO DO PROMETHEUS
+# =====================================================================
+
+def _rotulos(rotulos, extra=None):
+    pares = list(rotulos.items()) + ([extra] if extra else [])
+    if not pares:
+        return ""
+    escapar = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in pares) + "}"
+
+
+def _numero(valor):
+    if valor != valor:
+        return "NaN"
+    if valor in (float("inf"), float("-inf")):
+        return "+Inf" if valor > 0 else "-Inf"
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+def formatar_prometheus(instantaneo):
+    """Texto no formato de exposição do Prometheus (0.0.4) a partir de Registro.instantaneo()."""
+    linhas = []
+    anunciados = set()
+    for item in sorted(instantaneo["series"], key=lambda s: s["nome"]):
+        nome, rotulos = item["nome"], item["rotulos"]
+        if nome not in anunciados:
+            anunciados.add(nome)
+            if item["ajuda"]:
+                linhas.append(f"# HELP {nome} {item['ajuda']}")
+            linhas.append(f"# TYPE {nome} {item['tipo']}")
+        if item["tipo"] == "histogram":
+            acumulado = 0
+            for limite, n in zip(item["limites"] + [float("inf")], item["contagens"]):
+                acumulado += n
+                linhas.append(f"{nome}_bucket{_rotulos(rotulos, ('le', _numero(float(limite))))} {acumulado}")
+            linhas.append(f"{nome}_sum{_rotulos(rotulos)} {_numero(item['soma'])}")
+            linhas.append(f"{nome}_count{_rotulos(rotulos)} {acumulado}")
+        else:
+            linhas.append(f"{nome}{_rotulos(rotulos)} {_numero(item['valor'])}")
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,174 @@
+"""
+Cenários Monte Carlo do controle fuzzy distribuídos em um pool de processos.
+
+Cada cenário é uma simulação em malha fechada independente, com perfil de
+temperatura externa e de carga sorteados, troca de setpoint no meio da
+execução e ruído no sensor de temperatura. Os cenários são divididos em
+lotes; cada processo simula um lote inteiro de uma vez como uma Frota
+(inferência vetorizada) e devolve as métricas por cenário, que são
+agregadas em um relatório com percentis e histogramas.
+
+A semente de cada cenário vem de SeedSequence(semente).spawn(n): os
+sorteios não dependem do número de processos nem do tamanho do lote, e o
+resultado é idêntico para qualquer número de processos (mudar o tamanho
+do lote altera só o último bit de arredondamento do produto matricial).
+
+    python monte_carlo.py --cenarios 5000 --dias 2 --saida relatorio.json
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from controlador import PASSOS_DIA
+from frota import Frota, SETPOINTS
+
+# Faixa segura de operação (a mesma dos alertas de test_def.py)
+FAIXA_SEGURA = (18.0, 26.0)
+
+PERCENTIS = (5, 25, 50, 75, 95, 99)
+BINS_HISTOGRAMA = 20
+
+METRICAS = ("horas_fora_faixa", "pico_potencia", "potencia_media", "temp_min", "temp_max", "iae")
+
+# Distribuições sorteadas por cenário
+PROB_TROCA_SETPOINT = 0.5
+
+
+def _sortear_cenario(seed_seq, passos, ruido):
+    rng = np.random.default_rng(seed_seq)
+    cenario = {
+        "sp": rng.choice(SETPOINTS),
+        "temp_inicial": rng.uniform(20, 30),
+        "text_media": rng.uniform(20, 30),
+        "text_amplitude": rng.uniform(4, 12),
+        "defasagem_horas": rng.uniform(-3, 3),
+        "carga_alta": rng.uniform(60, 100),
+        "carga_baixa": rng.uniform(10, 40),
+        "passo_troca": rng.integers(passos) if rng.random() < PROB_TROCA_SETPOINT else -1,
+        "sp_novo": rng.choice(SETPOINTS),
+    }
+    cenario["ruido"] = rng.normal(0.0, ruido, passos) if ruido > 0 else np.zeros(passos)
+    return cenario
+
+
+def _rodar_lote(seeds, passos, ruido):
+    """Simula um lote de cenários como uma frota e devolve {métrica: array}."""
+    cenarios = [_sortear_cenario(s, passos, ruido) for s in seeds]
+    coluna = lambda campo: np.array([c[campo] for c in cenarios])
+
+    frota = Frota(len(cenarios), sp=coluna("sp"), temp_inicial=coluna("temp_inicial"))
+    for campo in ("text_media", "text_amplitude", "defasagem_horas", "carga_alta", "carga_baixa"):
+        setattr(frota, campo, coluna(campo).astype(np.float64))
+    ruidos = np.stack([c["ruido"] for c in cenarios])
+
+    passo_troca = coluna("passo_troca")
+    sp_novo = coluna("sp_novo")
+    trocas = {}
+    for i in np.flatnonzero(passo_troca >= 0):
+        trocas.setdefault(int(passo_troca[i]), []).append(i)
+
+    dt_horas = 24 / PASSOS_DIA
+    fora = np.zeros(frota.n)
+    pico = np.zeros(frota.n)
+    soma_potencia = np.zeros(frota.n)
+    iae = np.zeros(frota.n)
+    temp_min = np.full(frota.n, np.inf)
+    temp_max = np.full(frota.n, -np.inf)
+
+    for k in range(passos):
+        if k in trocas:
+            salas = trocas[k]
+            frota.definir_setpoint(sp_novo[salas], salas)
+        frota.passo(ruido=ruidos[:, k])
+
+        T = frota.temperatura
+        fora += (T < FAIXA_SEGURA[0]) | (T > FAIXA_SEGURA[1])
+        np.maximum(pico, frota.potencia, out=pico)
+        soma_potencia += frota.potencia
+        iae += np.abs(T - frota.sp)
+        np.minimum(temp_min, T, out=temp_min)
+        np.maximum(temp_max, T, out=temp_max)
+
+    return {
+        "horas_fora_faixa": fora * dt_horas,
+        "pico_potencia": pico,
+        "potencia_media": soma_potencia / passos,
+        "temp_min": temp_min,
+        "temp_max": temp_max,
+        "iae": iae * dt_horas,
+    }
+
+
+def executar(cenarios=1000, dias=1, semente=0, ruido=0.2, trabalhadores=None, lote=256):
+    """
+    Roda ``cenarios`` simulações de ``dias`` dias e devolve {métrica: array}
+    com um valor por cenário, na ordem das sementes. Levanta ValueError se
+    ``cenarios``, ``lote`` ou o número de passos de ``dias`` for menor que 1.
+    """
+    passos = int(round(dias * PASSOS_DIA))
+    if cenarios < 1 or lote < 1:
+        raise ValueError(f"cenarios e lote devem ser >= 1 (recebidos {cenarios} e {lote})")
+    if passos < 1:
+        raise ValueError(f"dias = {dias:g} não chega a um passo de simulação")
+    seeds = np.random.SeedSequence(semente).spawn(cenarios)
+    lotes = [seeds[i:i + lote] for i in range(0, cenarios, lote)]
+    trabalhadores = trabalhadores or os.cpu_count() or 1
+
+    if trabalhadores == 1:
+        resultados = [_rodar_lote(s, passos, ruido) for s in lotes]
+    else:
+        with ProcessPoolExecutor(max_workers=trabalhadores) as pool:
+            resultados = list(pool.map(_rodar_lote, lotes, [passos] * len(lotes), [ruido] * len(lotes)))
+
+    return {m: np.concatenate([r[m] for r in resultados]) for m in METRICAS}
+
+
+def relatorio(metricas):
+    """Percentis, média, extremos e histograma de cada métrica."""
+    saida = {}
+    for nome, valores in metricas.items():
+        contagens, bordas = np.histogram(valores, bins=BINS_HISTOGRAMA)
+        resumo = {"media": float(valores.mean()), "min": float(valores.min()), "max": float(valores.max())}
+        resumo.update({f"p{p}": float(v) for p, v in zip(PERCENTIS, np.percentile(valores, PERCENTIS))})
+        resumo["histograma"] = {"contagens": contagens.tolist(), "bordas": bordas.round(4).tolist()}
+        saida[nome] = resumo
+    return saida
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cenários Monte Carlo do controle fuzzy em paralelo.")
+    parser.add_argument("--cenarios", type=int, default=1000)
+    parser.add_argument("--dias", type=float, default=1, help="dias simulados por cenário")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--ruido", type=float, default=0.2, help="desvio padrão do ruído do sensor em °C")
+    parser.add_argument("--trabalhadores", type=int, default=None, help="processos (padrão: todos os núcleos)")
+    parser.add_argument("--lote", type=int, default=256, help="cenários simulados juntos por processo")
+    parser.add_argument("--saida", help="grava o relatório em JSON")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    try:
+        metricas = executar(args.cenarios, args.dias, args.semente, args.ruido, args.trabalhadores, args.lote)
+    except ValueError as e:
+        parser.error(str(e))
+    duracao = time.perf_counter() - inicio
+
+    resumo = relatorio(metricas)
+    print(f"{args.cenarios} cenários x {args.dias:g} dias em {duracao:.2f} s")
+    print(f"{'métrica':<18}{'média':>9}{'p5':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'máx':>9}")
+    for nome, r in resumo.items():
+        print(f"{nome:<18}{r['media']:>9.2f}{r['p5']:>9.2f}{r['p50']:>9.2f}{r['p95']:>9.2f}{r['p99']:>9.2f}{r['max']:>9.2f}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({"cenarios": args.cenarios, "dias": args.dias, "semente": args.semente,
+                       "ruido": args.ruido, "faixa_segura": FAIXA_SEGURA, "metricas": resumo}, f, indent=2)
+        print(f"Relatório gravado em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
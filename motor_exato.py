@@ -0,0 +1,240 @@
+"""
+Motor de inferência exato e esparso para os subsistemas de sistema_fuzzy.
+
+O skfuzzy e o motor_vetorizado avaliam todas as regras e integram o
+centróide sobre o universo de saída amostrado (passo 0,2 em potencia_base,
+0,5 em ajuste_potencia). Aqui nada é amostrado:
+
+- as FPs (trimf/trapmf) são lineares por partes: na compilação, o universo
+  de cada entrada é dividido nos pontos de quebra das FPs e, para cada
+  trecho, guardam-se só os termos não nulos nele, com a reta de cada um.
+  Para uma entrada, uma busca binária acha o trecho; com FPs vizinhas que
+  se sobrepõem duas a duas, são no máximo 2 termos por entrada e 2x2
+  regras disparadas das 25 (ou 9);
+- cada termo de saída cortado no nível da sua ativação é um trapézio, e a
+  agregação (máximo) é linear entre os vértices dos trapézios e os
+  cruzamentos das suas arestas. A área e o momento de cada trecho linear
+  são integrados em forma fechada, de modo que o centróide não depende da
+  resolução do universo de saída.
+
+A entrada é limitada ao universo como no ControlSystemSimulation; o
+resultado difere do skfuzzy só pelo erro de discretização dele (milésimos
+de ponto de potência). A exceção é varerrotemp entre 1,95 e 2: o último
+ponto do universo amostrado (np.arange, 2,0000000000000018) fica além do
+ombro de MP, e no skfuzzy a pertinência cai para zero nesse intervalo;
+aqui ela vale 1 até 2, como definido.
+
+    python motor_exato.py --amostras 20000
+"""
+import argparse
+import bisect
+import time
+
+import numpy as np
+
+import sistema_fuzzy
+
+
+def _trapezio(tipo, params):
+    """(a, b, c, d) de uma trimf/trapmf: sobe de a a b, vale 1 de b a c, desce de c a d."""
+    if tipo == 'trimf':
+        a, b, c = params
+        return float(a), float(b), float(b), float(c)
+    return tuple(float(p) for p in params)
+
+
+def _reta(trapezio, z):
+    """(inclinação, intercepto) do trecho do trapézio que contém z (um ponto interior a um trecho)."""
+    a, b, c, d = trapezio
+    if z <= a or z >= d:
+        return 0.0, 0.0
+    if z < b:
+        return 1.0 / (b - a), -a / (b - a)
+    if z <= c:
+        return 0.0, 1.0
+    return -1.0 / (d - c), d / (d - c)
+
+
+class _Entrada:
+    """Termos não nulos de uma variável de entrada, por trecho entre pontos de quebra."""
+
+    def __init__(self, nome):
+        var = sistema_fuzzy.VARIAVEIS[nome]
+        u = sistema_fuzzy.universo(nome)
+        self.inicio, self.fim = float(u[0]), float(u[-1])
+        self.termos = list(var['termos'])
+        trapezios = [_trapezio(*fp) for fp in var['termos'].values()]
+
+        cortes = sorted({p for t in trapezios for p in t} | {self.inicio, self.fim})
+        self.cortes = cortes
+        self.trechos = []
+        for z0, z1 in zip(cortes, cortes[1:]):
+            meio = (z0 + z1) / 2
+            ativos = []
+            for i, t in enumerate(trapezios):
+                m, q = _reta(t, meio)
+                if m or q:
+                    ativos.append((i, m, q))
+            self.trechos.append(tuple(ativos))
+
+    def fuzzificar(self, x):
+        """[(termo, pertinência > 0)] de x, limitado ao universo."""
+        x = min(max(x, self.inicio), self.fim)
+        k = bisect.bisect_right(self.cortes, x) - 1
+        if k == len(self.trechos) and x == self.cortes[-1]:
+            k -= 1 # último ponto de quebra: pertence ao trecho à esquerda
+        if not 0 <= k < len(self.trechos):
+            return []
+        return [(i, mu) for i, m, q in self.trechos[k] if (mu := m * x + q) > 0]
+
+
+class SubsistemaExato:
+    """
+    Um subsistema de sistema_fuzzy.SUBSISTEMAS compilado em trechos e
+    trapézios. Chamado com (x, y), devolve a saída defuzzificada ou None
+    quando nenhuma regra dispara.
+    """
+
+    def __init__(self, nome):
+        sub = sistema_fuzzy.SUBSISTEMAS[nome]
+        self.nome = nome
+        self.entradas = tuple(sub['entradas'])
+        self.saida = sub['saida']
+        self.padrao = sub['padrao']
+        self._x, self._y = (_Entrada(e) for e in self.entradas)
+
+        termos_saida = sistema_fuzzy.VARIAVEIS[self.saida]['termos']
+        indice_saida = {termo: k for k, termo in enumerate(termos_saida)}
+        self._trapezios = [_trapezio(*fp) for fp in termos_saida.values()]
+        u = sistema_fuzzy.universo(self.saida)
+        self._limites = (float(u[0]), float(u[-1]))
+
+        # regras[i][j] = (índice da regra, termo de saída) para os termos i de x e j de y
+        self._regras = [[None] * len(self._y.termos) for _ in self._x.termos]
+        for k, (tx, ty, tz) in enumerate(sub['regras']):
+            self._regras[self._x.termos.index(tx)][self._y.termos.index(ty)] = (k, indice_saida[tz])
+
+    def regras_ativas(self, x, y):
+        """[(índice da regra em SUBSISTEMAS, termo de saída, ativação > 0)] para a entrada (x, y)."""
+        ativas = []
+        my = self._y.fuzzificar(y)
+        for i, mx in self._x.fuzzificar(x):
+            linha = self._regras[i]
+            for j, mu in my:
+                regra = linha[j]
+                if regra is not None:
+                    ativas.append((regra[0], regra[1], mx if mx < mu else mu))
+        return ativas
+
+    def __call__(self, x, y):
+        cortes = {}
+        for _, termo, ativacao in self.regras_ativas(float(x), float(y)):
+            if ativacao > cortes.get(termo, 0.0):
+                cortes[termo] = ativacao
+        if not cortes:
+            return None
+        return self._centroide(cortes)
+
+    def _centroide(self, cortes):
+        """Centróide de max_k min(corte_k, FP_k), integrado trecho a trecho em forma fechada."""
+        inicio, fim = self._limites
+        # Trapézio cortado: vértices (a, 0), (b', h), (c', h), (d, 0)
+        trapezios = []
+        for termo, h in cortes.items():
+            a, b, c, d = self._trapezios[termo]
+            trapezios.append((a, a + h * (b - a), d - h * (d - c), d, h))
+
+        pontos = {inicio, fim}
+        for t in trapezios:
+            pontos.update(t[:4])
+        if len(trapezios) > 1:
+            pontos.update(_cruzamentos(trapezios))
+        pontos = sorted(p for p in pontos if inicio <= p <= fim)
+
+        # Entre dois pontos consecutivos cada trapézio é uma reta e o máximo
+        # é o de um só deles: área e momento do trapézio (z0, f0)-(z1, f1)
+        area = momento = 0.0
+        for z0, z1 in zip(pontos, pontos[1:]):
+            largura = z1 - z0
+            if largura <= 0:
+                continue
+            meio = (z0 + z1) / 2
+            f0 = f1 = 0.0
+            for a, b, c, d, h in trapezios:
+                if meio <= a or meio >= d:
+                    continue
+                if meio < b:
+                    v0, v1 = h * (z0 - a) / (b - a), h * (z1 - a) / (b - a)
+                elif meio <= c:
+                    v0 = v1 = h
+                else:
+                    v0, v1 = h * (d - z0) / (d - c), h * (d - z1) / (d - c)
+                if v0 + v1 > f0 + f1:
+                    f0, f1 = v0, v1
+            area += largura * (f0 + f1) / 2
+            momento += largura * (f0 * (2 * z0 + z1) + f1 * (z0 + 2 * z1)) / 6
+        return momento / area if area > 0 else None
+
+
+def _arestas(trapezio):
+    """Arestas não verticais de um trapézio cortado: (z inicial, z final, inclinação, intercepto)."""
+    a, b, c, d, h = trapezio
+    arestas = []
+    if b > a:
+        arestas.append((a, b, h / (b - a), -h * a / (b - a)))
+    if c > b:
+        arestas.append((b, c, 0.0, h))
+    if d > c:
+        arestas.append((c, d, -h / (d - c), h * d / (d - c)))
+    return arestas
+
+
+def _cruzamentos(trapezios):
+    """Abscissas onde arestas de trapézios diferentes se cruzam (mudanças de qual é o máximo)."""
+    arestas = [_arestas(t) for t in trapezios]
+    pontos = []
+    for i in range(len(trapezios)):
+        for j in range(i + 1, len(trapezios)):
+            # Suportes disjuntos: nenhum cruzamento acima de zero
+            if trapezios[i][3] <= trapezios[j][0] or trapezios[j][3] <= trapezios[i][0]:
+                continue
+            for ini1, fim1, m1, q1 in arestas[i]:
+                for ini2, fim2, m2, q2 in arestas[j]:
+                    if m1 == m2:
+                        continue
+                    z = (q2 - q1) / (m1 - m2)
+                    if max(ini1, ini2) < z < min(fim1, fim2):
+                        pontos.append(z)
+    return pontos
+
+
+def main():
+    from motor_vetorizado import SubsistemaVetorizado
+
+    parser = argparse.ArgumentParser(description="Compara o motor exato com o vetorizado (skfuzzy discretizado).")
+    parser.add_argument("--amostras", type=int, default=20000)
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.semente)
+    for nome in sistema_fuzzy.SUBSISTEMAS:
+        exato = SubsistemaExato(nome)
+        vetorizado = SubsistemaVetorizado(nome)
+        ux, uy = (sistema_fuzzy.universo(e) for e in exato.entradas)
+        x = rng.uniform(ux[0], ux[-1], args.amostras)
+        y = rng.uniform(uy[0], uy[-1], args.amostras)
+
+        inicio = time.perf_counter()
+        z = np.array([exato(a, b) for a, b in zip(x.tolist(), y.tolist())], dtype=float)
+        duracao = time.perf_counter() - inicio
+        referencia = vetorizado.avaliar(x, y)
+        diferenca = np.abs(z - referencia)
+        regras = np.mean([len(exato.regras_ativas(a, b)) for a, b in zip(x[:2000].tolist(), y[:2000].tolist())])
+        print(f"{nome}: {duracao / args.amostras * 1e6:.1f} µs por avaliação | "
+              f"{regras:.2f} regras ativas em média de {len(sistema_fuzzy.SUBSISTEMAS[nome]['regras'])} | "
+              f"diferença para o vetorizado: máx {np.nanmax(diferenca):.4f}, média {np.nanmean(diferenca):.4f} | "
+              f"sem regra: {int(np.isnan(z).sum())} (vetorizado {int(np.isnan(referencia).sum())})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Motor de inferência por tabela pré-compilada.
+
+Cada subsistema de sistema_fuzzy (núcleo: errotemp x varerrotemp,
+compensação: text x cargatermica) é avaliado uma única vez, na partida,
+sobre uma grade das entradas, com o motor_vetorizado. Depois disso cada passo de controle é só
+uma interpolação bilinear (alguns microssegundos), em vez de refazer
+ativação das regras, agregação e defuzzificação no scikit-fuzzy.
+
+A grade parte dos próprios universos das variáveis e é refinada, linha a
+linha e coluna a coluna, onde o erro da interpolação (medido no centro e
+no meio das arestas de cada célula) passa da tolerância pedida.
+
+As grades compiladas ficam em cache no disco (cache_compilado), com chave
+na impressão digital do subsistema: com a base de regras inalterada, a
+partida só mapeia os arrays já gravados. Uma grade que não atinge a
+tolerância em ``iteracoes_max`` refinamentos é rejeitada (ValueError) e não
+vai para o cache.
+"""
+import bisect
+
+import numpy as np
+
+import cache_compilado
+import sistema_fuzzy
+from motor_vetorizado import SubsistemaVetorizado
+
+
+class TabelaControle:
+    """
+    Superfície de controle pré-compilada de um subsistema de sistema_fuzzy.
+
+    ``tabela(x, y)`` devolve a saída interpolada, ou ``None`` quando nenhuma
+    regra dispara, do mesmo jeito que o skfuzzy deixa de preencher
+    ``output`` nesse caso.
+    """
+
+    def __init__(self, nome, tolerancia=1.0, iteracoes_max=12, cache=True):
+        self.nome = nome
+        self.tolerancia = tolerancia
+        self._compilado = SubsistemaVetorizado(nome)
+        self.entradas = self._compilado.entradas
+        self.saida = self._compilado.saida
+
+        impressao = sistema_fuzzy.impressao_digital(nome)
+        tipo = f"tabela-{nome}"
+        chave = cache_compilado.chave(tipo, impressao, tolerancia, iteracoes_max)
+        encontrado = cache_compilado.carregar(tipo, chave) if cache else None
+        if encontrado is not None and encontrado[1]['erro_maximo'] > tolerancia:
+            encontrado = None # gravada antes da verificação abaixo; recompila
+        self.do_cache = encontrado is not None
+        if self.do_cache:
+            arrays, dados = encontrado
+            xs, ys, z = arrays['xs'], arrays['ys'], arrays['z']
+            self.erro_maximo = dados['erro_maximo']
+        else:
+            xs, ys, z = self._compilar(tolerancia, iteracoes_max)
+            if self.erro_maximo > tolerancia:
+                raise ValueError(f"Tabela {nome}: erro máximo {self.erro_maximo:.3f} acima da tolerância "
+                                 f"{tolerancia} após {iteracoes_max} refinamentos da grade "
+                                 f"(aumente a tolerância ou iteracoes_max)")
+            if cache:
+                cache_compilado.gravar(tipo, chave, {'xs': xs, 'ys': ys, 'z': z},
+                                       {'erro_maximo': self.erro_maximo}, impressao)
+
+        self.xs, self.ys, self.z = xs, ys, z
+        # Listas Python são mais rápidas que indexar ndarray elemento a elemento
+        self._xs = xs.tolist()
+        self._ys = ys.tolist()
+        self._z = z.tolist()
+
+    def _compilar(self, tolerancia, iteracoes_max):
+        xs = self._compilado.universo_x
+        ys = self._compilado.universo_y
+        for iteracao in range(iteracoes_max):
+            z = self._avaliar_grade(xs, ys)
+
+            # Erro da interpolação no centro de cada célula e no meio das arestas
+            xc = (xs[:-1] + xs[1:]) / 2
+            yc = (ys[:-1] + ys[1:]) / 2
+            erro_c = np.abs(self._avaliar_grade(xc, yc)
+                            - (z[:-1, :-1] + z[1:, :-1] + z[:-1, 1:] + z[1:, 1:]) / 4)
+            erro_x = np.abs(self._avaliar_grade(xc, ys) - (z[:-1] + z[1:]) / 2)
+            erro_y = np.abs(self._avaliar_grade(xs, yc) - (z[:, :-1] + z[:, 1:]) / 2)
+            # Células com vértice sem regra disparada são resolvidas na consulta
+            erro_c, erro_x, erro_y = (np.nan_to_num(e) for e in (erro_c, erro_x, erro_y))
+
+            pior_x = np.maximum(erro_c.max(axis=1), erro_x.max(axis=1))
+            pior_y = np.maximum(erro_c.max(axis=0), erro_y.max(axis=0))
+            self.erro_maximo = float(max(pior_x.max(), pior_y.max()))
+            if self.erro_maximo <= tolerancia or iteracao == iteracoes_max - 1:
+                break
+            xs = np.union1d(xs, xc[pior_x > tolerancia])
+            ys = np.union1d(ys, yc[pior_y > tolerancia])
+        return xs, ys, z
+
+    def _avaliar_grade(self, xs, ys):
+        gx, gy = np.meshgrid(xs, ys, indexing='ij')
+        return self._compilado.avaliar(gx, gy)
+
+    def __call__(self, x, y):
+        xs, ys = self._xs, self._ys
+        # Entradas limitadas ao universo, como no ControlSystemSimulation
+        x = min(max(float(x), xs[0]), xs[-1])
+        y = min(max(float(y), ys[0]), ys[-1])
+
+        i = min(bisect.bisect_right(xs, x), len(xs) - 1) - 1
+        j = min(bisect.bisect_right(ys, y), len(ys) - 1) - 1
+        tx = (x - xs[i]) / (xs[i + 1] - xs[i])
+        ty = (y - ys[j]) / (ys[j + 1] - ys[j])
+
+        linha0 = self._z[i]
+        linha1 = self._z[i + 1]
+        z = ((linha0[j] * (1 - ty) + linha0[j + 1] * ty) * (1 - tx)
+             + (linha1[j] * (1 - ty) + linha1[j + 1] * ty) * tx)
+        if z != z:
+            # NaN: algum vértice da célula fica onde nenhuma regra dispara
+            # (ex.: fim do universo de varerrotemp), então avalia o ponto
+            # diretamente.
+            z = float(self._compilado.avaliar([x], [y])[0])
+            if z != z:
+                return None
+        return z
+
+    def verificar(self, amostras=200, semente=0):
+        """Maior diferença da tabela para o ControlSystemSimulation em pontos aleatórios."""
+        from skfuzzy import control as ctrl
+
+        rng = np.random.default_rng(semente)
+        _, sistemas = sistema_fuzzy.construir_controle()
+        simulacao = ctrl.ControlSystemSimulation(sistemas[self.nome])
+        lx, ly = self.entradas
+        pior = 0.0
+        for _ in range(amostras):
+            x = rng.uniform(self._xs[0], self._xs[-1])
+            y = rng.uniform(self._ys[0], self._ys[-1])
+            simulacao.input[lx] = x
+            simulacao.input[ly] = y
+            simulacao.compute()
+            esperado = simulacao.output.get(self.saida)
+            simulacao.reset()
+            obtido = self(x, y)
+            if esperado is None or obtido is None:
+                if (esperado is None) != (obtido is None):
+                    pior = float('inf')
+                continue
+            pior = max(pior, abs(obtido - esperado))
+        return pior
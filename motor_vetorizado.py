@@ -0,0 +1,144 @@
+"""
+Avaliador Mamdani vetorizado em NumPy para os subsistemas de sistema_fuzzy.
+
+Em vez de uma amostra por vez pelo ControlSystemSimulation, recebe arrays
+de entradas (com broadcasting) e devolve arrays de saída: pertinências por
+interpolação, disparo das regras por mínimo, acumulação por máximo e
+centróide exato da função de saída linear por partes, tudo em poucas
+operações sobre blocos de amostras.
+
+Uso típico (varreduras, sintonia do Kp, reprocessamento de telemetria):
+
+    P_base, Delta_P = avaliar_lote(erro, varerro, text, carga)
+"""
+import functools
+
+import numpy as np
+
+import sistema_fuzzy
+
+# Amostras avaliadas por bloco (limita a memória da agregação: bloco x universo)
+TAMANHO_BLOCO = 8192
+
+
+class SubsistemaVetorizado:
+    """Um subsistema de sistema_fuzzy.SUBSISTEMAS compilado em arrays."""
+
+    def __init__(self, nome):
+        sub = sistema_fuzzy.SUBSISTEMAS[nome]
+        self.nome = nome
+        self.entradas = tuple(sub['entradas'])
+        self.saida = sub['saida']
+        self.padrao = sub['padrao']
+
+        nome_x, nome_y = self.entradas
+        self.universo_x = sistema_fuzzy.universo(nome_x).astype(np.float64)
+        self.universo_y = sistema_fuzzy.universo(nome_y).astype(np.float64)
+        fps_x = sistema_fuzzy.pertinencias(nome_x)
+        fps_y = sistema_fuzzy.pertinencias(nome_y)
+        fps_z = sistema_fuzzy.pertinencias(self.saida)
+        self._fps_x = list(fps_x.values())
+        self._fps_y = list(fps_y.values())
+
+        termos_x, termos_y, termos_z = list(fps_x), list(fps_y), list(fps_z)
+        rx, ry, rz = (np.array(col) for col in zip(*[
+            (termos_x.index(tx), termos_y.index(ty), termos_z.index(tz)) for tx, ty, tz in sub['regras']
+        ]))
+        self._regras_x, self._regras_y = rx, ry
+
+        # Por termo de saída: regras que o ativam e o trecho do universo onde
+        # a FP é não nula (fora dele min(corte, FP) = 0 e não altera o máximo).
+        # Termos que não aparecem em nenhuma regra nunca contribuem.
+        self._termos_saida = []
+        for k, mf in enumerate(fps_z.values()):
+            indices = np.flatnonzero(rz == k)
+            if len(indices) == 0:
+                continue
+            suporte = np.flatnonzero(mf > 0)
+            ini, fim = suporte[0], suporte[-1] + 1
+            self._termos_saida.append((indices, ini, fim, mf[ini:fim]))
+
+        # Área e momento da função linear por partes são lineares nos valores
+        # de pertinência: cada trapézio [u_k, u_k+1] é integrado exatamente,
+        # como no centróide do skfuzzy.
+        u = sistema_fuzzy.universo(self.saida).astype(np.float64)
+        h = np.diff(u)
+        pesos = np.zeros((len(u), 2))
+        pesos[:-1, 0] += h / 2
+        pesos[1:, 0] += h / 2
+        pesos[:-1, 1] += h * (2 * u[:-1] + u[1:]) / 6
+        pesos[1:, 1] += h * (u[:-1] + 2 * u[1:]) / 6
+        self.universo_saida = u
+        self._pesos = pesos
+
+    def avaliar(self, x, y, padrao=np.nan):
+        """
+        Saída defuzzificada para as entradas x, y (arrays com broadcasting).
+
+        Onde nenhuma regra dispara o resultado é ``padrao``.
+        """
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+        forma = x.shape
+        x = x.ravel()
+        y = y.ravel()
+        saida = np.empty(x.size)
+        for ini in range(0, x.size, TAMANHO_BLOCO):
+            fim = ini + TAMANHO_BLOCO
+            saida[ini:fim] = self._avaliar_bloco(x[ini:fim], y[ini:fim], padrao)
+        return saida.reshape(forma)
+
+    def _avaliar_bloco(self, x, y, padrao):
+        # Fuzzificação: como o ControlSystemSimulation, a entrada é limitada
+        # ao universo e a pertinência é interpolada na FP amostrada.
+        ux, uy = self.universo_x, self.universo_y
+        x = np.clip(x, ux[0], ux[-1])
+        y = np.clip(y, uy[0], uy[-1])
+        mx = np.stack([np.interp(x, ux, mf) for mf in self._fps_x], axis=-1)
+        my = np.stack([np.interp(y, uy, mf) for mf in self._fps_y], axis=-1)
+        ativacao = np.minimum(mx[:, self._regras_x], my[:, self._regras_y])
+
+        agregado = np.zeros((len(x), len(self.universo_saida)))
+        for indices, ini, fim, mf in self._termos_saida:
+            corte = ativacao[:, indices].max(axis=1)
+            trecho = agregado[:, ini:fim]
+            np.maximum(trecho, np.minimum(corte[:, None], mf), out=trecho)
+
+        area, momento = (agregado @ self._pesos).T
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(area > 0, momento / area, padrao)
+
+
+@functools.lru_cache(maxsize=None)
+def _compilado(nome):
+    return SubsistemaVetorizado(nome)
+
+
+def subsistema(nome):
+    """
+    Instância compartilhada (compilada uma vez) de um subsistema.
+    base_regras.aplicar() a descarta (descartar()) quando a base de regras
+    muda; a compilação segura sistema_fuzzy.TRAVA_BASE, de modo que nenhuma
+    instância compilada com uma base trocada pela metade fica no cache.
+    """
+    with sistema_fuzzy.TRAVA_BASE:
+        return _compilado(nome)
+
+
+def descartar():
+    """Esvazia o cache de subsistema()."""
+    with sistema_fuzzy.TRAVA_BASE:
+        _compilado.cache_clear()
+
+
+def avaliar_lote(errotemp, varerrotemp, text, cargatermica):
+    """
+    Avalia os dois estágios do controlador para arrays de entradas.
+
+    Retorna (P_base, Delta_P). Onde nenhuma regra dispara são usados os
+    valores padrão de cada subsistema (100.0 e 0.0), como no laço de controle.
+    """
+    nucleo = subsistema('nucleo')
+    compensacao = subsistema('compensacao')
+    P_base = nucleo.avaliar(errotemp, varerrotemp, nucleo.padrao)
+    Delta_P = compensacao.avaliar(text, cargatermica, compensacao.padrao)
+    return P_base, Delta_P
@@ -0,0 +1,358 @@
+"""
+Perturbações do ciclo de 24h lidas de traços reais (temperatura externa e
+carga térmica medidas no site), no lugar da senoide de perturba_text_24h e
+do degrau de perturba_carga_24h.
+
+    python perturbacoes.py exemplo site.csv --dias 730          # traço sintético para testes
+    python perturbacoes.py converter site.csv site.c213tr        # CSV -> binário colunar
+    python perturbacoes.py info site.c213tr
+    python simulacao_headless.py --dias 730 --traco site.c213tr
+
+Formatos aceitos:
+
+- CSV com cabeçalho: coluna de tempo (segundos desde a época ou data ISO
+  8601; sem ela, amostras a cada ``intervalo`` s), temperatura externa (°C)
+  e carga (%). Linhas com valor vazio ou inválido são ignoradas. O arquivo
+  é lido em blocos de TAMANHO_BLOCO linhas, sem carregar tudo.
+- Binário colunar (.c213tr): cabeçalho _CABECALHO (MAGICO_TRACO, número de
+  amostras, instante inicial e intervalo) seguido das duas colunas em
+  float32, amostradas em intervalo fixo. É mapeado em memória (np.memmap):
+  só os blocos lidos entram na RAM, de modo que traços de anos não custam
+  nada na partida. "converter" gera o binário a partir de um CSV em uma
+  passada, reamostrando no intervalo pedido.
+
+Traco entrega as amostras reamostradas no passo do controlador (5 min no
+ciclo de 24h) por interpolação linear, bloco a bloco e sob demanda:
+proximo() para o laço (um passo por vez) e bloco(n) para as simulações
+vetorizadas. Cada ciclo de 24h do simulador continua do ponto em que o
+anterior parou, de modo que um traço de vários dias é reproduzido dia a dia.
+"""
+import argparse
+import csv
+import datetime
+import itertools
+import os
+import shutil
+import struct
+import time
+
+import numpy as np
+
+from controlador import PASSOS_DIA
+
+MAGICO_TRACO = b"C213TRC1"
+# magico, amostras, instante inicial (s desde a época), intervalo (s)
+_CABECALHO = struct.Struct("<8sQdd")
+
+# Passo do ciclo de 24h em segundos (5 min)
+PASSO_24H_S = 24 * 3600 / PASSOS_DIA
+
+# Linhas do CSV (ou amostras do binário) por bloco
+TAMANHO_BLOCO = 65536
+
+COLUNAS_PADRAO = {"tempo": "t", "text": "text", "carga": "carga"}
+
+
+# =====================================================================
+# 1. LEITURA EM BLOCOS
+# =====================================================================
+
+def _instante(texto):
+    """Segundos desde a época de um número ou de uma data ISO 8601."""
+    try:
+        return float(texto)
+    except ValueError:
+        return datetime.datetime.fromisoformat(texto.strip()).timestamp()
+
+
+def blocos_csv(caminho, colunas=None, intervalo=None, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Gera (t, text, carga) em arrays de até ``tamanho_bloco`` amostras a partir
+    de um CSV. Sem coluna de tempo (ou com ``colunas["tempo"]`` None), as
+    linhas valem a cada ``intervalo`` s a partir de 0; uma linha inválida é
+    descartada mas ocupa o seu instante.
+    """
+    colunas = dict(COLUNAS_PADRAO, **(colunas or {}))
+    with open(caminho, newline="", encoding="utf-8") as f:
+        leitor = csv.reader(f)
+        cabecalho = [c.strip() for c in next(leitor)]
+        try:
+            i_text, i_carga = cabecalho.index(colunas["text"]), cabecalho.index(colunas["carga"])
+        except ValueError:
+            raise ValueError(f"{caminho}: colunas {colunas['text']!r} e {colunas['carga']!r} "
+                             f"são obrigatórias (cabeçalho: {cabecalho})") from None
+        i_tempo = cabecalho.index(colunas["tempo"]) if colunas["tempo"] in cabecalho else None
+        if i_tempo is None and not intervalo:
+            raise ValueError(f"{caminho}: sem coluna {colunas['tempo']!r}, informe o intervalo entre amostras")
+
+        t, text, carga = [], [], []
+        n = 0
+        for linha in leitor:
+            if not linha:
+                continue
+            n += 1
+            try:
+                valores = (_instante(linha[i_tempo]) if i_tempo is not None else (n - 1) * intervalo,
+                           float(linha[i_text]), float(linha[i_carga]))
+            except (ValueError, IndexError):
+                continue
+            if any(v != v for v in valores):
+                continue
+            t.append(valores[0])
+            text.append(valores[1])
+            carga.append(valores[2])
+            if len(t) == tamanho_bloco:
+                yield np.array(t), np.array(text), np.array(carga)
+                t, text, carga = [], [], []
+        if t:
+            yield np.array(t), np.array(text), np.array(carga)
+
+
+def abrir_binario(caminho):
+    """(t0, intervalo, colunas) de um .c213tr; colunas é um memmap float32 (2, n): text e carga."""
+    with open(caminho, "rb") as f:
+        magico, n, t0, intervalo = _CABECALHO.unpack(f.read(_CABECALHO.size))
+    if magico != MAGICO_TRACO:
+        raise ValueError(f"{caminho}: traço em formato desconhecido")
+    if n == 0:
+        return t0, intervalo, np.zeros((2, 0), dtype="<f4")
+    return t0, intervalo, np.memmap(caminho, dtype="<f4", mode="r", offset=_CABECALHO.size, shape=(2, n))
+
+
+def blocos_binario(caminho, inicio=None, tamanho_bloco=TAMANHO_BLOCO):
+    """Gera (t, text, carga) de um .c213tr em blocos, a partir do instante ``inicio`` (fatias do memmap)."""
+    t0, intervalo, colunas = abrir_binario(caminho)
+    n = colunas.shape[1]
+    # Uma amostra antes do início, para interpolar o primeiro passo
+    primeira = 0 if inicio is None else min(max(int((inicio - t0) // intervalo), 0), n)
+    for ini in range(primeira, n, tamanho_bloco):
+        fim = min(ini + tamanho_bloco, n)
+        yield t0 + intervalo * np.arange(ini, fim), colunas[0, ini:fim], colunas[1, ini:fim]
+
+
+def blocos(caminho, inicio=None, colunas=None, intervalo=None, tamanho_bloco=TAMANHO_BLOCO):
+    """Blocos (t, text, carga) de um CSV ou de um .c213tr, pelo conteúdo do arquivo."""
+    with open(caminho, "rb") as f:
+        binario = f.read(len(MAGICO_TRACO)) == MAGICO_TRACO
+    if binario:
+        return blocos_binario(caminho, inicio, tamanho_bloco)
+    return blocos_csv(caminho, colunas, intervalo, tamanho_bloco)
+
+
+# =====================================================================
+# 2. REAMOSTRAGEM
+# =====================================================================
+
+def reamostrar(fonte, passo, inicio=None):
+    """
+    Gera (text, carga) em arrays, amostrados em inicio + k*passo por
+    interpolação linear, à medida que os blocos (t, text, carga) de
+    ``fonte`` chegam. Sem ``inicio``, começa na primeira amostra; antes
+    dela vale o primeiro valor. Termina na última amostra do traço.
+    """
+    anterior = None
+    k = 0 # próximo passo a gerar
+    for t, text, carga in fonte:
+        if anterior is not None:
+            # A última amostra do bloco anterior fecha o intervalo entre os blocos
+            t = np.concatenate(([anterior[0]], t))
+            text = np.concatenate(([anterior[1]], text))
+            carga = np.concatenate(([anterior[2]], carga))
+        if np.any(np.diff(t) <= 0):
+            raise ValueError("Instantes do traço fora de ordem ou repetidos")
+        if inicio is None:
+            inicio = float(t[0])
+        anterior = (t[-1], text[-1], carga[-1])
+
+        ultimo = int(np.floor((t[-1] - inicio) / passo))
+        if ultimo < k:
+            continue
+        instantes = inicio + passo * np.arange(k, ultimo + 1)
+        k = ultimo + 1
+        yield np.interp(instantes, t, text), np.interp(instantes, t, carga)
+
+
+class Traco:
+    """
+    Fonte de perturbações de um traço (CSV ou .c213tr) no passo ``passo`` (s).
+    proximo() -> (text, carga) ou None no fim do traço; bloco(n) -> arrays
+    com até n passos. Com ``repetir``, recomeça do início ao chegar ao fim.
+    """
+
+    def __init__(self, caminho, passo=PASSO_24H_S, inicio=None, repetir=False, colunas=None, intervalo=None):
+        self.caminho = caminho
+        self.passo = passo
+        self.inicio = inicio
+        self.repetir = repetir
+        self.colunas = colunas
+        self.intervalo = intervalo
+        self.passos = 0
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Volta ao início do traço."""
+        fonte = blocos(self.caminho, self.inicio, self.colunas, self.intervalo)
+        self._gerador = reamostrar(fonte, self.passo, self.inicio)
+        self._text = self._carga = np.empty(0)
+        self._i = 0
+
+    def _carregar(self):
+        """Próximo bloco reamostrado; False no fim do traço."""
+        for text, carga in self._gerador:
+            if len(text):
+                self._text, self._carga, self._i = text, carga, 0
+                return True
+        if self.repetir and self.passos:
+            self.reiniciar()
+            return self._carregar()
+        return False
+
+    def proximo(self):
+        if self._i >= len(self._text) and not self._carregar():
+            return None
+        i = self._i
+        self._i += 1
+        self.passos += 1
+        return float(self._text[i]), float(self._carga[i])
+
+    def bloco(self, n):
+        """Até ``n`` passos seguintes: (text, carga) em arrays (menos que n no fim do traço)."""
+        partes_text, partes_carga = [], []
+        faltam = n
+        while faltam > 0:
+            if self._i >= len(self._text) and not self._carregar():
+                break
+            fim = min(self._i + faltam, len(self._text))
+            partes_text.append(self._text[self._i:fim])
+            partes_carga.append(self._carga[self._i:fim])
+            faltam -= fim - self._i
+            self.passos += fim - self._i
+            self._i = fim
+        if not partes_text:
+            return np.empty(0), np.empty(0)
+        return np.concatenate(partes_text), np.concatenate(partes_carga)
+
+
+# =====================================================================
+# 3. CONVERSÃO E TRAÇO DE EXEMPLO
+# =====================================================================
+
+def converter(origem, destino, intervalo=PASSO_24H_S, colunas=None, intervalo_origem=None):
+    """
+    Grava ``origem`` (CSV ou .c213tr) como .c213tr amostrado a cada
+    ``intervalo`` s, em uma passada e com memória limitada a um bloco: a
+    coluna de carga vai para um arquivo auxiliar e é anexada no fim.
+    Retorna o número de amostras.
+    """
+    temporario = destino + ".tmp"
+    auxiliar = destino + ".carga.tmp"
+    fonte = blocos(origem, None, colunas, intervalo_origem)
+    primeiro = next(fonte, None)
+    t0 = float(primeiro[0][0]) if primeiro is not None else 0.0
+    n = 0
+    try:
+        with open(temporario, "wb") as f, open(auxiliar, "w+b") as fc:
+            f.write(_CABECALHO.pack(MAGICO_TRACO, 0, t0, intervalo))
+            if primeiro is not None:
+                for text, carga in reamostrar(itertools.chain([primeiro], fonte), intervalo, t0):
+                    f.write(text.astype("<f4").tobytes())
+                    fc.write(carga.astype("<f4").tobytes())
+                    n += len(text)
+            fc.seek(0)
+            shutil.copyfileobj(fc, f)
+            f.seek(0)
+            f.write(_CABECALHO.pack(MAGICO_TRACO, n, t0, intervalo))
+        os.replace(temporario, destino)
+    finally:
+        for caminho in (temporario, auxiliar):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+    return n
+
+
+def exemplo(caminho, dias=365, intervalo=600.0, semente=0, inicio="2024-01-01T00:00:00"):
+    """
+    Grava um traço sintético em CSV (t ISO 8601, text, carga), um dia por
+    vez: sazonalidade anual e ciclo diário na temperatura externa, com
+    ruído correlacionado; carga alta em horário comercial nos dias úteis.
+    """
+    rng = np.random.default_rng(semente)
+    t_inicio = datetime.datetime.fromisoformat(inicio)
+    por_dia = int(round(86400 / intervalo))
+    ruido = 0.0
+    with open(caminho, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["t", "text", "carga"])
+        for dia in range(int(dias)):
+            horas = np.arange(por_dia) * intervalo / 3600
+            data = t_inicio + datetime.timedelta(days=dia)
+            sazonal = 25 + 6 * np.sin(2 * np.pi * (dia - 100) / 365)
+            passeio = np.empty(por_dia)
+            for i in range(por_dia):
+                ruido = 0.98 * ruido + rng.normal(0, 0.3)
+                passeio[i] = ruido
+            text = sazonal + 6 * np.sin((horas - 8) * np.pi / 12) + passeio
+            util = data.weekday() < 5
+            carga = np.where(util & (horas >= 8) & (horas < 18), 85.0, 35.0) + rng.normal(0, 4, por_dia)
+            carga = np.clip(carga, 0, 100)
+            for h, te, ca in zip(horas, text, carga):
+                instante = data + datetime.timedelta(hours=float(h))
+                escritor.writerow([instante.isoformat(), f"{te:.2f}", f"{ca:.1f}"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Traços de temperatura externa e carga para o ciclo de 24h.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("converter", help="CSV (ou .c213tr) -> .c213tr amostrado em intervalo fixo")
+    p.add_argument("origem")
+    p.add_argument("destino")
+    p.add_argument("--intervalo", type=float, default=PASSO_24H_S, help="intervalo do binário (s)")
+    p.add_argument("--intervalo-origem", type=float, help="intervalo do CSV sem coluna de tempo (s)")
+    for coluna, padrao in COLUNAS_PADRAO.items():
+        p.add_argument(f"--coluna-{coluna}", default=padrao, help=f"coluna de {coluna} no CSV")
+
+    p = sub.add_parser("info", help="resumo de um traço")
+    p.add_argument("caminho")
+
+    p = sub.add_parser("exemplo", help="grava um traço sintético em CSV")
+    p.add_argument("caminho")
+    p.add_argument("--dias", type=int, default=365)
+    p.add_argument("--intervalo", type=float, default=600.0, help="intervalo entre amostras (s)")
+    p.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.comando == "converter":
+        colunas = {coluna: getattr(args, f"coluna_{coluna}") for coluna in COLUNAS_PADRAO}
+        inicio = time.perf_counter()
+        n = converter(args.origem, args.destino, args.intervalo, colunas, args.intervalo_origem)
+        print(f"{n} amostras a cada {args.intervalo:g} s gravadas em {args.destino} "
+              f"({os.path.getsize(args.destino) / 1e6:.1f} MB) em {time.perf_counter() - inicio:.1f} s")
+    elif args.comando == "info":
+        n = soma_text = soma_carga = 0
+        minimos, maximos = [np.inf, np.inf], [-np.inf, -np.inf]
+        primeiro = ultimo = None
+        for t, text, carga in blocos(args.caminho, intervalo=PASSO_24H_S):
+            primeiro = t[0] if primeiro is None else primeiro
+            ultimo = t[-1]
+            n += len(t)
+            soma_text += float(np.sum(text, dtype=np.float64))
+            soma_carga += float(np.sum(carga, dtype=np.float64))
+            for i, coluna in enumerate((text, carga)):
+                minimos[i] = min(minimos[i], float(coluna.min()))
+                maximos[i] = max(maximos[i], float(coluna.max()))
+        if not n:
+            print("Traço vazio.")
+            return
+        data = lambda t: datetime.datetime.fromtimestamp(t).isoformat(timespec="minutes")
+        print(f"{n} amostras de {data(primeiro)} a {data(ultimo)} ({(ultimo - primeiro) / 86400:.1f} dias, "
+              f"intervalo médio {(ultimo - primeiro) / max(n - 1, 1):.0f} s)")
+        print(f"text: min {minimos[0]:.1f} | média {soma_text / n:.1f} | máx {maximos[0]:.1f} °C")
+        print(f"carga: min {minimos[1]:.1f} | média {soma_carga / n:.1f} | máx {maximos[1]:.1f} %")
+    elif args.comando == "exemplo":
+        exemplo(args.caminho, args.dias, args.intervalo, args.semente)
+        print(f"Traço sintético de {args.dias} dias gravado em {args.caminho}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Publicação do estado no MQTT com agrupamento, supressão de repetidos e
+controle de contrapressão.
+
+PublicadorEstado fica entre o laço de simulação e client.publish():
+
+- Agrupamento: se o formato negociado admite quadros ("json-lote" ou
+  "bin1", ver telemetria.py), as amostras são acumuladas e enviadas em
+  quadros a no máximo ``taxa_quadros`` por segundo
+  (telemetria.codificar_lote: um objeto JSON/registro binário por quadro
+  de uma amostra, lista JSON ou registros concatenados por quadro de
+  várias). Em "json" cada amostra sai na hora, em uma mensagem própria.
+- Instante: cada amostra aceita ganha "t" (time.time()), para o
+  consumidor saber quando cada amostra de um quadro foi produzida.
+- Repetidos: uma amostra igual à última enviada é descartada, exceto a
+  cada ``intervalo_repeticao`` segundos (batimento, para quem acabou de
+  assinar o tópico ver o estado parado).
+- Contrapressão: conta as mensagens entregues ao paho e ainda não
+  enviadas (MQTTMessageInfo.is_published()). Acima de metade de
+  ``fila_max`` passa a enviar só uma de cada N amostras (N dobra até
+  DECIMACAO_MAX); em ``fila_max`` descarta o quadro inteiro. Quando a fila esvazia, N volta
+  a cair. A memória fica limitada a ``fila_max`` mensagens no paho mais
+  ``amostras_max`` amostras no buffer.
+
+Amostras ``prioritarias`` (ex.: o reset do gráfico) nunca são decimadas
+nem suprimidas e esvaziam o buffer na hora; o quadro delas vai ao paho
+mesmo com a fila em ``fila_max``. Pode ser chamado do laço de
+simulação e dos callbacks do paho ao mesmo tempo.
+"""
+import collections
+import threading
+import time
+
+import telemetria
+
+DECIMACAO_MAX = 16
+
+
+class PublicadorEstado:
+    def __init__(self, client, topico, codificacao=None, qos=0, taxa_quadros=20.0,
+                 intervalo_repeticao=2.0, fila_max=100, amostras_max=200):
+        self.client = client
+        self.topico = topico
+        self.codificacao = codificacao or telemetria.Negociacao("json")
+        self.qos = qos
+        self.intervalo_quadro = 1.0 / taxa_quadros if taxa_quadros else 0.0
+        self.intervalo_repeticao = intervalo_repeticao
+        self.fila_max = fila_max
+
+        self._buffer = collections.deque(maxlen=amostras_max)
+        self._ultimo_quadro = 0.0
+        self._ultima_amostra = None
+        self._ultimo_envio_amostra = 0.0
+        self._contador = 0
+        self.fator_decimacao = 1
+
+        # MQTTMessageInfo das mensagens entregues ao paho e ainda não enviadas
+        self._pendentes = []
+
+        self.contadores = collections.Counter()
+        self._lock = threading.RLock()
+
+    @property
+    def profundidade(self):
+        self._pendentes = [info for info in self._pendentes if not info.is_published()]
+        return len(self._pendentes)
+
+    def publicar(self, estado, prioritario=False):
+        """Entrega uma amostra. Retorna True se ela foi aceita no buffer."""
+        with self._lock:
+            return self._publicar(estado, prioritario)
+
+    def _publicar(self, estado, prioritario):
+        agora = time.monotonic()
+        self.contadores["amostras"] += 1
+
+        if not prioritario:
+            if estado == self._ultima_amostra and agora - self._ultimo_envio_amostra < self.intervalo_repeticao:
+                self.contadores["suprimidas"] += 1
+                return False
+            self._contador += 1
+            if self._contador % self.fator_decimacao:
+                self.contadores["decimadas"] += 1
+                return False
+
+        if len(self._buffer) == self._buffer.maxlen:
+            self.contadores["descartadas"] += 1 # a mais antiga sai do deque
+        self._buffer.append(dict(estado, t=round(time.time(), 3)))
+        self._ultima_amostra = estado
+        self._ultimo_envio_amostra = agora
+
+        if prioritario or not self.codificacao.lote or agora - self._ultimo_quadro >= self.intervalo_quadro:
+            self._descarregar(prioritario)
+        return True
+
+    def descarregar(self):
+        """Envia agora as amostras acumuladas como um quadro."""
+        with self._lock:
+            self._descarregar()
+
+    def _descarregar(self, prioritario=False):
+        if not self._buffer:
+            return
+        self._ultimo_quadro = time.monotonic()
+        amostras = list(self._buffer)
+        self._buffer.clear()
+
+        profundidade = self.profundidade
+        self._ajustar_decimacao(profundidade)
+        if profundidade >= self.fila_max and not prioritario:
+            self.contadores["descartadas"] += len(amostras)
+            self.contadores["quadros_descartados"] += 1
+            return
+
+        if self.codificacao.lote:
+            quadros = [(len(amostras), self.codificacao.codificar_lote(amostras))]
+        else:
+            # Consumidores que só entendem um objeto por mensagem
+            quadros = [(1, self.codificacao.codificar(amostra)) for amostra in amostras]
+        for n, payload in quadros:
+            info = self.client.publish(self.topico, payload, qos=self.qos)
+            if info.rc != 0 and self.qos == 0:
+                # Sem conexão: com QoS 0 o paho não enfileira, a amostra é perdida
+                self.contadores["descartadas"] += n
+                self.contadores["falhas"] += 1
+                continue
+            self._pendentes.append(info)
+            self.contadores["quadros"] += 1
+            self.contadores["enviadas"] += n
+
+    def _ajustar_decimacao(self, profundidade):
+        anterior = self.fator_decimacao
+        if profundidade >= self.fila_max // 2:
+            self.fator_decimacao = min(self.fator_decimacao * 2, DECIMACAO_MAX)
+        elif profundidade <= self.fila_max // 4 and self.fator_decimacao > 1:
+            self.fator_decimacao //= 2
+        if self.fator_decimacao != anterior:
+            print(f"[Publicador] fila MQTT com {profundidade} mensagens; "
+                  f"enviando 1 de cada {self.fator_decimacao} amostras")
+
+    def resumo(self):
+        with self._lock:
+            return dict(self.contadores, profundidade=self.profundidade, fator_decimacao=self.fator_decimacao)
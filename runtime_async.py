@@ -0,0 +1,365 @@
+"""
+Runtime asyncio do simulador: um único event loop roda o cliente MQTT e
+quantos laços de controle forem pedidos, sem uma thread por cliente nem
+por laço.
+
+    python runtime_async.py                                  # como o test_def.py
+    python runtime_async.py --controladores 50 --periodo 0.05 0.1
+
+No test_def.py o laço dorme PERIODO_PASSO depois de cada passo: o período
+real é PERIODO_PASSO mais a duração da inferência e da publicação e deriva
+com a carga da máquina. Parado, ele acorda a cada PERIODO_PAUSA só para
+republicar o mesmo estado. Aqui:
+
+- Agendador: a k-ésima ativação de um laço é marcada para início +
+  k·período no relógio do event loop, qualquer que seja a duração dos
+  passos anteriores. Uma ativação que acorda mais de um período depois do
+  prazo é um prazo perdido: as ativações perdidas são puladas (contadas em
+  c213_prazos_perdidos_total) em vez de executadas em rajada. O atraso de
+  cada ativação em relação ao prazo vai para c213_laco_atraso_segundos.
+- Parado, o laço dorme até chegar um comando, que é aplicado na hora, ou
+  até INTERVALO_REPETICAO (o batimento do estado parado do publicador).
+- ClienteMQTTAsync: o paho sem loop_start(). O socket é registrado no
+  event loop (add_reader/add_writer) e loop_read/loop_write/loop_misc são
+  chamados por ele, como no exemplo de asyncio do próprio paho; os
+  callbacks rodam no event loop, sem travas entre threads.
+- Cada LacoControle tem seu ControladorCRAC, seu PublicadorEstado e seu
+  período (--periodo aceita uma lista, repetida entre os controladores).
+  Com um controlador, os tópicos são os do test_def.py e o dashboard
+  funciona sem mudança; com mais de um, o controlador <nome> usa
+  c213/crac/<nome>/estado, .../setpoint, .../comando e .../injecao.
+- Os controladores compartilham um base_regras.MotorRecarregavel, como o
+  do test_def.py: base_regras.json, se existir, vigiado e recarregado
+  (também pelo comando "recarregar_regras") fora do event loop.
+- Cada controlador confere seus estados com um alertas.MotorAlertas e
+  publica a abertura e o encerramento dos alertas em TOPIC_ALERTA (com
+  "sala" = <nome> quando há mais de um).
+"""
+import argparse
+import asyncio
+import json
+
+from alertas import TOPIC_ALERTA, MotorAlertas
+from base_regras import ARQUIVO_REGRAS, MotorRecarregavel
+from controlador import (
+    TOPIC_ESTADO, TOPIC_SP, TOPIC_COMANDO, TOPIC_INJECAO, TOPIC_CONFIG, MOTORES,
+    PERIODO_PASSO, PERIODO_PAUSA,
+    ControladorCRAC, carregar_ganhos,
+)
+from metricas import LIMITES_ATRASO, TOPIC_METRICAS, Registro
+from publicador import PublicadorEstado
+from telemetria import FORMATOS, Negociacao
+
+mqttBroker = "test.mosquitto.org"
+CLIENT_ID = "c213_fuzzy_async"
+
+# Tópicos do controlador <nome> quando há mais de um no processo
+TOPICO_CONTROLADOR = "c213/crac/{nome}/{tipo}"
+
+# Publicação do estado (ver publicador.py), como no test_def.py
+TAXA_QUADROS_HZ = 10
+INTERVALO_REPETICAO = 2.0
+FILA_MQTT_MAX = 100
+QOS_ESTADO = 0
+
+# Manutenção do paho (keepalive, reenvios) e espera entre tentativas de reconexão (s)
+INTERVALO_MANUTENCAO = 1.0
+INTERVALO_RECONEXAO = 5.0
+
+INTERVALO_METRICAS = 5.0
+
+
+# =====================================================================
+# 1. AGENDADOR PERIÓDICO
+# =====================================================================
+
+class Agendador:
+    """
+    Ativações a cada ``periodo`` s no ``relogio`` (loop.time), marcadas a
+    partir da primeira e não do fim do passo anterior: a duração dos passos
+    não se acumula no período.
+    """
+
+    def __init__(self, periodo, relogio):
+        self.periodo = periodo
+        self._relogio = relogio
+        self.proximo = relogio()
+        self.ativacoes = 0
+        self.perdidos = 0
+        self.atraso_max = 0.0
+
+    def reancorar(self):
+        """A próxima ativação é agora (depois de uma espera fora do agendador)."""
+        self.proximo = self._relogio()
+
+    async def esperar(self):
+        """
+        Dorme até a próxima ativação. Retorna (atraso, perdidos): quanto
+        acordou depois do prazo (s) e quantas ativações foram puladas.
+        """
+        agora = self._relogio()
+        perdidos = 0
+        if agora - self.proximo >= self.periodo:
+            # Prazo perdido: pula para a última ativação que já venceu
+            perdidos = int((agora - self.proximo) // self.periodo)
+            self.proximo += perdidos * self.periodo
+            self.perdidos += perdidos
+        elif agora < self.proximo:
+            await asyncio.sleep(self.proximo - agora)
+        atraso = max(self._relogio() - self.proximo, 0.0)
+        self.atraso_max = max(self.atraso_max, atraso)
+        self.proximo += self.periodo
+        self.ativacoes += 1
+        return atraso, perdidos
+
+
+# =====================================================================
+# 2. LAÇO DE CONTROLE
+# =====================================================================
+
+class LacoControle:
+    """
+    Um ControladorCRAC agendado no event loop. receber() é chamado pelo
+    on_message (no próprio loop) com os tópicos de controle padrão.
+    """
+
+    def __init__(self, controle, periodo=PERIODO_PASSO, nome=None, metricas=None):
+        self.controle = controle
+        self.periodo = periodo
+        self.nome = nome
+        self.agendador = None
+        self._comando = asyncio.Event()
+        self._atraso = self._perdidos = None
+        if metricas is not None:
+            rotulos = {"controlador": nome} if nome else {}
+            self._atraso = metricas.histograma(
+                "c213_laco_atraso_segundos", "Atraso do início de cada iteração em relação ao prazo",
+                LIMITES_ATRASO, **rotulos)
+            self._perdidos = metricas.contador(
+                "c213_prazos_perdidos_total", "Ativações do laço puladas por atraso maior que um período",
+                **rotulos)
+
+    def receber(self, topico, payload):
+        """Enfileira a mensagem de controle e acorda o laço, se estiver parado."""
+        self.controle.processar_mensagem(topico, payload)
+        self._comando.set()
+
+    async def executar(self):
+        self.agendador = Agendador(self.periodo, asyncio.get_running_loop().time)
+        while True:
+            atraso, perdidos = await self.agendador.esperar()
+            if self._atraso is not None:
+                self._atraso.observar(atraso)
+                if perdidos:
+                    self._perdidos.incrementar(perdidos)
+
+            self._comando.clear()
+            if self.controle.passo() == PERIODO_PAUSA:
+                # Parado: envia o que restou no buffer e dorme até um comando ou o batimento
+                self.controle.publicador.descarregar()
+                try:
+                    await asyncio.wait_for(self._comando.wait(), INTERVALO_REPETICAO)
+                except asyncio.TimeoutError:
+                    pass
+                self.agendador.reancorar()
+
+
+# =====================================================================
+# 3. CLIENTE MQTT NO EVENT LOOP
+# =====================================================================
+
+class ClienteMQTTAsync:
+    """
+    Liga um paho.mqtt.client.Client (já com on_connect/on_message) ao
+    event loop em execução. connect() e reconnect() abrem o socket de forma
+    bloqueante, como no test_def.py; todo o resto é dirigido pelo loop.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.loop = asyncio.get_running_loop()
+        self._manutencao = None
+        client.on_socket_open = self._socket_aberto
+        client.on_socket_close = self._socket_fechado
+        client.on_socket_register_write = self._registrar_escrita
+        client.on_socket_unregister_write = self._cancelar_escrita
+
+    def _socket_aberto(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+
+    def _socket_fechado(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+
+    def _registrar_escrita(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def _cancelar_escrita(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    def conectar(self, host, porta=1883, keepalive=60):
+        self.client.connect(host, porta, keepalive)
+        self._manutencao = self.loop.create_task(self._manter())
+
+    async def _manter(self):
+        import paho.mqtt.client as mqtt
+
+        while True:
+            await asyncio.sleep(INTERVALO_MANUTENCAO)
+            if self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+                continue
+            # Conexão perdida: o socket já foi fechado pelo paho
+            try:
+                self.client.reconnect()
+            except OSError as e:
+                print(f"[MQTT] Falha ao reconectar: {e}")
+                await asyncio.sleep(INTERVALO_RECONEXAO)
+
+    def fechar(self):
+        if self._manutencao is not None:
+            self._manutencao.cancel()
+        self.client.disconnect()
+
+
+# =====================================================================
+# 4. RUNTIME
+# =====================================================================
+
+def topicos_controlador(nome):
+    """Tópico de estado e mapa tópico recebido -> tópico de controle padrão do controlador ``nome``."""
+    if nome is None:
+        return TOPIC_ESTADO, {TOPIC_SP: TOPIC_SP, TOPIC_COMANDO: TOPIC_COMANDO, TOPIC_INJECAO: TOPIC_INJECAO}
+    return TOPICO_CONTROLADOR.format(nome=nome, tipo="estado"), {
+        TOPICO_CONTROLADOR.format(nome=nome, tipo=tipo): padrao
+        for tipo, padrao in (("setpoint", TOPIC_SP), ("comando", TOPIC_COMANDO), ("injecao", TOPIC_INJECAO))}
+
+
+async def executar(n_controladores=1, periodos=(PERIODO_PASSO,), motor="vetorizado", tolerancia_tabela=1.0,
+                   formato="json", broker=mqttBroker, intervalo_metricas=INTERVALO_METRICAS, memoria=False,
+                   regras=ARQUIVO_REGRAS):
+    import paho.mqtt.client as mqtt
+
+    metricas = Registro()
+    telemetria = Negociacao(formato)
+    kp_24h, kp_continuo = carregar_ganhos()
+    fallbacks = {sub: metricas.contador("c213_fallback_total", "Inferências sem regra disparada (valor padrão)",
+                                        subsistema=sub)
+                 for sub in ("nucleo", "compensacao")}
+    # Com memória, os controladores compartilham as saídas já calculadas (ver memoria_inferencia.py)
+    calcular_fuzzy = MotorRecarregavel(motor, regras, tolerancia_tabela,
+                                       ao_padrao=lambda sub: fallbacks[sub].incrementar(),
+                                       memoria={"metricas": metricas} if memoria else None)
+    calcular_fuzzy.vigiar()
+    metricas.medidor("c213_regras_recargas_total", lambda: calcular_fuzzy.recargas,
+                     "Recargas da base de regras por resultado", tipo="counter", resultado="ok")
+    metricas.medidor("c213_regras_recargas_total", lambda: calcular_fuzzy.falhas,
+                     "Recargas da base de regras por resultado", tipo="counter", resultado="rejeitada")
+
+    client = mqtt.Client(client_id=CLIENT_ID)
+    conectado = asyncio.Event()
+    rotas = {} # tópico recebido -> (laço, tópico de controle padrão)
+    loop = asyncio.get_running_loop()
+
+    def publicar_configuracao():
+        # Retida, para gravacao.py reproduzir com o mesmo motor e base
+        client.publish(TOPIC_CONFIG, json.dumps(calcular_fuzzy.configuracao()), qos=1, retain=True)
+
+    # A recarga acontece na thread do vigia; o paho é dirigido pelo event loop
+    calcular_fuzzy.ao_recarregar = lambda motor: loop.call_soon_threadsafe(publicar_configuracao)
+
+    def on_connect(client, userdata, flags, rc):
+        if rc != 0:
+            print(f"Falha na conexão MQTT, código {rc}")
+            return
+        client.subscribe([(topico, 0) for topico in rotas])
+        telemetria.assinar(client)
+        publicar_configuracao()
+        conectado.set()
+        print(f"MQTT conectado. {len(lacos)} controlador(es), {len(rotas)} tópicos de controle assinados.")
+
+    def on_message(client, userdata, msg):
+        if telemetria.processar(msg):
+            return
+        rota = rotas.get(msg.topic)
+        if rota is not None:
+            rota[0].receber(rota[1], msg.payload)
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+    cliente = ClienteMQTTAsync(client)
+
+    lacos = []
+    for i in range(n_controladores):
+        nome = f"crac{i:03d}" if n_controladores > 1 else None
+        topico_estado, controle_topicos = topicos_controlador(nome)
+        log = print if nome is None else (lambda texto, nome=nome: print(f"[{nome}] {texto}"))
+        controle = ControladorCRAC(calcular_fuzzy, kp_24h, kp_continuo, log=log, metricas=metricas,
+                                   medir_atraso=False)
+        controle.publicador = PublicadorEstado(client, topico_estado, telemetria, QOS_ESTADO, TAXA_QUADROS_HZ,
+                                               INTERVALO_REPETICAO, FILA_MQTT_MAX)
+        controle.alertas = MotorAlertas(
+            ids=None if nome is None else [nome],
+            ao_evento=lambda evento: client.publish(TOPIC_ALERTA, json.dumps(evento), qos=1),
+            metricas=metricas if nome is None else None)
+        laco = LacoControle(controle, periodos[i % len(periodos)], nome, metricas)
+        lacos.append(laco)
+        for topico, padrao in controle_topicos.items():
+            rotas[topico] = (laco, padrao)
+
+    metricas.medidor("c213_controladores", lambda: len(lacos), "Laços de controle no event loop")
+    metricas.medidor("c213_mqtt_pendentes", lambda: sum(l.controle.publicador.profundidade for l in lacos),
+                     "Mensagens entregues ao paho e ainda não enviadas")
+
+    cliente.conectar(broker, 1883, 60)
+    print("Aguardando conexão MQTT...")
+    await conectado.wait()
+
+    tarefas = [asyncio.create_task(laco.executar()) for laco in lacos]
+    if intervalo_metricas:
+        async def publicar_metricas():
+            while True:
+                await asyncio.sleep(intervalo_metricas)
+                client.publish(TOPIC_METRICAS, json.dumps(metricas.instantaneo()))
+        tarefas.append(asyncio.create_task(publicar_metricas()))
+
+    print("Sistema Fuzzy Iniciado. Aguardando comando INICIAR via MQTT...")
+    try:
+        await asyncio.gather(*tarefas)
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+        for laco in lacos:
+            if laco.agendador is not None:
+                a = laco.agendador
+                print(f"{laco.nome or 'controlador'}: {a.ativacoes} ativações a cada {a.periodo * 1e3:.0f} ms, "
+                      f"{a.perdidos} prazos perdidos, atraso máx. {a.atraso_max * 1e3:.2f} ms")
+        cliente.fechar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador fuzzy com vários laços de controle em um event loop asyncio.")
+    parser.add_argument("--controladores", type=int, default=1, help="laços de controle no processo")
+    parser.add_argument("--periodo", type=float, nargs="+", default=[PERIODO_PASSO],
+                        help="período (s) de cada controlador; a lista se repete entre eles")
+    parser.add_argument("--motor", choices=MOTORES, default="vetorizado")
+    parser.add_argument("--tolerancia", type=float, default=1.0, help="erro máximo do motor tabela (%% de potência)")
+    parser.add_argument("--formato", choices=("auto",) + FORMATOS, default="json",
+                        help='formato do estado publicado ("auto" negocia binário/quadros, ver telemetria.py)')
+    parser.add_argument("--broker", default=mqttBroker)
+    parser.add_argument("--metricas", type=float, default=INTERVALO_METRICAS,
+                        help=f"intervalo (s) de publicação em {TOPIC_METRICAS} (0 desliga)")
+    parser.add_argument("--memoria", action="store_true",
+                        help="memória das saídas da inferência por entrada quantizada (memoria_inferencia.py)")
+    parser.add_argument("--regras", default=ARQUIVO_REGRAS,
+                        help="base de regras (base_regras.py), usada e vigiada se existir")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(executar(args.controladores, args.periodo, args.motor, args.tolerancia, args.formato,
+                             args.broker, args.metricas, args.memoria, args.regras))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
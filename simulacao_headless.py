@@ -0,0 +1,133 @@
+"""
+Simulação headless do ciclo de 24h: sem broker MQTT e sem time.sleep.
+
+Roda o mesmo modelo térmico e o mesmo controle fuzzy em dois estágios do
+ciclo de 24h de ControladorCRAC (controlador.py) por N dias simulados, tão rápido
+quanto a CPU permitir, e devolve as trajetórias como arrays NumPy. Com
+``--traco`` (perturbacoes.py), a temperatura externa e a carga vêm de um
+traço medido, lido um dia por vez, em vez do perfil sintético.
+
+    python simulacao_headless.py --dias 30 --sp 22 --saida trajetoria.npz
+    python simulacao_headless.py --dias 730 --traco site.c213tr
+"""
+import argparse
+import time
+
+import numpy as np
+
+from controlador import (
+    ERRO_MAX, VARERRO_MAX, KP_24H, MOTORES, PASSOS_DIA,
+    perturba_text_24h, perturba_carga_24h, ganho_kp, proxima_temperatura, criar_motor,
+)
+
+# Séries devolvidas por simular(), com os mesmos nomes do estado publicado
+CAMPOS = ("tempo_horas", "temperatura", "erro", "varErro", "potencia", "P_base", "Delta_P", "text", "qest")
+
+
+def simular(dias=1, sp=25, motor="vetorizado", temp_inicial=25.0, kp=None, inferir=None, perturbacoes=None):
+    """
+    Simula ``dias`` ciclos de 24h em malha fechada.
+
+    ``inferir`` permite reaproveitar um motor já criado com criar_motor()
+    entre várias simulações; se omitido, é criado a partir de ``motor``.
+    ``kp`` sobrepõe o ganho do mapa KP_24H para o setpoint.
+    ``perturbacoes`` (perturbacoes.Traco) substitui o perfil sintético;
+    se o traço acabar antes, a simulação para no fim dele.
+
+    Retorna um dicionário {campo: ndarray} com um valor por passo.
+    """
+    if inferir is None:
+        inferir = criar_motor(motor)
+    if kp is None:
+        kp = ganho_kp(sp, KP_24H)
+
+    # As perturbações sintéticas se repetem a cada dia: calcula um ciclo só
+    if perturbacoes is None:
+        text_dia = [float(perturba_text_24h(i)) for i in range(PASSOS_DIA)]
+        carga_dia = [float(perturba_carga_24h(i)) for i in range(PASSOS_DIA)]
+
+    n = int(round(dias * PASSOS_DIA))
+    linhas = np.empty((n, len(CAMPOS)))
+
+    # Mesmo estado inicial de resetar_estado()
+    tempatual = float(temp_inicial)
+    erroatual = tempatual - sp
+    erroanterior = erroatual
+
+    for k in range(n):
+        if perturbacoes is not None and k % PASSOS_DIA == 0:
+            # Traço: um dia por vez, sem carregar o arquivo inteiro
+            text_dia, carga_dia = (c.tolist() for c in perturbacoes.bloco(PASSOS_DIA))
+        if k % PASSOS_DIA >= len(text_dia):
+            n = k # fim do traço
+            break
+        text_calc = text_dia[k % PASSOS_DIA]
+        carga_calc = carga_dia[k % PASSOS_DIA]
+
+        erro_calc = tempatual - sp
+        varerroTemp_calc = erroatual - erroanterior
+        erroanterior = erroatual
+        erroatual = erro_calc
+
+        erro_input = min(max(erro_calc, -ERRO_MAX), ERRO_MAX)
+        varerro_input = min(max(varerroTemp_calc, -VARERRO_MAX), VARERRO_MAX)
+        P_base, Delta_P = inferir(erro_input, varerro_input, text_calc, carga_calc)
+
+        P_crac_final = min(max(P_base * kp + Delta_P, 0.0), 100.0)
+        tempatual = proxima_temperatura(tempatual, P_crac_final, carga_calc, text_calc)
+
+        linhas[k] = (k * (24 / PASSOS_DIA), tempatual, erroatual, varerroTemp_calc,
+                     P_crac_final, P_base, Delta_P, text_calc, carga_calc)
+
+    return {campo: linhas[:n, i] for i, campo in enumerate(CAMPOS)}
+
+
+def salvar(trajetoria, caminho):
+    """Grava as trajetórias em .npz (comprimido) ou .csv, conforme a extensão."""
+    if caminho.endswith(".csv"):
+        dados = np.column_stack([trajetoria[c] for c in CAMPOS])
+        np.savetxt(caminho, dados, delimiter=",", header=",".join(CAMPOS), comments="", fmt="%.6g")
+    else:
+        np.savez_compressed(caminho, **trajetoria)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulação headless do controle fuzzy do CRAC (ciclos de 24h).")
+    parser.add_argument("--dias", type=float, default=1, help="dias simulados (288 passos por dia)")
+    parser.add_argument("--sp", type=int, default=25, help="setpoint em °C")
+    parser.add_argument("--motor", choices=MOTORES, default="vetorizado", help="motor de inferência fuzzy")
+    parser.add_argument("--kp", type=float, default=None, help="sobrepõe o ganho Kp do mapa de 24h")
+    parser.add_argument("--temp-inicial", type=float, default=25.0)
+    parser.add_argument("--saida", help="arquivo de saída (.npz ou .csv)")
+    parser.add_argument("--traco", help="traço de temperatura externa e carga (CSV ou .c213tr, ver perturbacoes.py)")
+    args = parser.parse_args()
+
+    perturbacoes = None
+    if args.traco:
+        from perturbacoes import Traco
+
+        perturbacoes = Traco(args.traco)
+
+    inicio = time.perf_counter()
+    inferir = criar_motor(args.motor)
+    preparo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    trajetoria = simular(args.dias, args.sp, kp=args.kp, temp_inicial=args.temp_inicial, inferir=inferir,
+                         perturbacoes=perturbacoes)
+    duracao = time.perf_counter() - inicio
+
+    passos = len(trajetoria["temperatura"])
+    T = trajetoria["temperatura"]
+    print(f"Motor {args.motor}: preparo {preparo:.2f} s")
+    print(f"{passos} passos ({passos / PASSOS_DIA:g} dias) em {duracao:.2f} s -> {passos / duracao:,.0f} passos/s")
+    print(f"Temperatura: min {T.min():.2f} | média {T.mean():.2f} | máx {T.max():.2f} °C | "
+          f"potência média {trajetoria['potencia'].mean():.2f} %")
+
+    if args.saida:
+        salvar(trajetoria, args.saida)
+        print(f"Trajetórias gravadas em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
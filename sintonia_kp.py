@@ -0,0 +1,130 @@
+"""
+Sintonia automática do ganho Kp por setpoint.
+
+Para cada setpoint permitido e cada modo do simulador (ciclo de 24h com
+perturbações, ou laço contínuo com Text e carga fixos), avalia uma grade
+de candidatos Kp em malha fechada e refina a busca em torno do melhor
+(busca em grade sem gradiente). Todos os candidatos de uma rodada são
+simulados juntos como uma Frota, uma sala por candidato; os pares
+(modo, setpoint) são distribuídos em um pool de processos.
+
+Custo de cada candidato (menor é melhor):
+
+    PESOS['iae'] * |T - sp| médio  +  PESOS['sobressinal'] * max|T - sp|
+    + PESOS['energia'] * potência média (%)
+
+O resultado é gravado em ganhos_kp.json, que test_def.py carrega na
+partida (controlador.carregar_ganhos):
+
+    python sintonia_kp.py --dias 2 --saida ganhos_kp.json
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from controlador import ARQUIVO_GANHOS, PASSOS_DIA
+from frota import Frota, SETPOINTS
+
+MODOS = ("24h", "continuo")
+
+# Perturbações fixas do laço contínuo de test_def.py (text_atual, qest_atual)
+TEXT_CONTINUO = 25.0
+CARGA_CONTINUO = 40.0
+
+PESOS = {"iae": 1.0, "sobressinal": 0.25, "energia": 0.02}
+
+KP_MIN, KP_MAX = 0.0, 1.5
+PONTOS_GRADE = 151
+RODADAS_REFINO = 2
+
+
+def avaliar_candidatos(sp, kps, modo="24h", dias=2, temp_inicial=25.0):
+    """Simula um candidato Kp por sala e devolve {métrica: array} por candidato."""
+    kps = np.asarray(kps, dtype=np.float64)
+    frota = Frota(len(kps), sp=sp, temp_inicial=temp_inicial)
+    frota.kp = kps.copy()
+
+    passos = int(round(dias * PASSOS_DIA))
+    soma_erro = np.zeros(len(kps))
+    desvio_max = np.zeros(len(kps))
+    soma_potencia = np.zeros(len(kps))
+    for _ in range(passos):
+        if modo == "24h":
+            frota.passo()
+        else:
+            frota.passo(TEXT_CONTINUO, CARGA_CONTINUO)
+        desvio = np.abs(frota.temperatura - sp)
+        soma_erro += desvio
+        np.maximum(desvio_max, desvio, out=desvio_max)
+        soma_potencia += frota.potencia
+
+    metricas = {"iae": soma_erro / passos, "sobressinal": desvio_max, "energia": soma_potencia / passos}
+    metricas["custo"] = sum(PESOS[m] * metricas[m] for m in PESOS)
+    return metricas
+
+
+def sintonizar(sp, modo="24h", dias=2):
+    """Grade em [KP_MIN, KP_MAX] e refino local; devolve (modo, sp, kp, métricas do kp escolhido)."""
+    kps = np.linspace(KP_MIN, KP_MAX, PONTOS_GRADE)
+    passo = kps[1] - kps[0]
+    melhor = None
+    for _ in range(RODADAS_REFINO + 1):
+        metricas = avaliar_candidatos(sp, kps, modo, dias)
+        i = int(np.argmin(metricas["custo"]))
+        if melhor is None or metricas["custo"][i] < melhor[1]["custo"]:
+            melhor = (float(kps[i]), {m: float(v[i]) for m, v in metricas.items()})
+        # Próxima rodada: grade 10x mais fina em torno do melhor até agora
+        centro = melhor[0]
+        kps = np.clip(np.linspace(centro - passo, centro + passo, 21), KP_MIN, KP_MAX)
+        passo /= 10
+    return modo, sp, melhor[0], melhor[1]
+
+
+def sintonizar_todos(dias=2, modos=MODOS, trabalhadores=None):
+    """Sintoniza todos os pares (modo, setpoint) em paralelo. Retorna a tabela de ganhos."""
+    tarefas = [(sp, modo) for modo in modos for sp in SETPOINTS]
+    trabalhadores = trabalhadores or os.cpu_count() or 1
+    if trabalhadores == 1:
+        resultados = [sintonizar(sp, modo, dias) for sp, modo in tarefas]
+    else:
+        with ProcessPoolExecutor(max_workers=trabalhadores) as pool:
+            resultados = list(pool.map(sintonizar, *zip(*tarefas), [dias] * len(tarefas)))
+
+    tabela = {modo: {} for modo in modos}
+    detalhes = {modo: {} for modo in modos}
+    for modo, sp, kp, metricas in resultados:
+        tabela[modo][str(sp)] = round(kp, 4)
+        detalhes[modo][str(sp)] = {m: round(v, 4) for m, v in metricas.items()}
+    return tabela, detalhes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sintonia automática do Kp por setpoint.")
+    parser.add_argument("--dias", type=float, default=2, help="dias simulados por candidato")
+    parser.add_argument("--modos", nargs="+", choices=MODOS, default=list(MODOS))
+    parser.add_argument("--trabalhadores", type=int, default=None, help="processos (padrão: todos os núcleos)")
+    parser.add_argument("--saida", default=ARQUIVO_GANHOS, help="tabela de ganhos gerada (JSON)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    tabela, detalhes = sintonizar_todos(args.dias, args.modos, args.trabalhadores)
+    duracao = time.perf_counter() - inicio
+
+    print(f"Sintonia concluída em {duracao:.2f} s")
+    for modo in args.modos:
+        for sp in SETPOINTS:
+            d = detalhes[modo][str(sp)]
+            print(f"{modo:<9} SP={sp:2d} °C  Kp={tabela[modo][str(sp)]:.4f}  custo={d['custo']:.3f}  "
+                  f"|e| médio={d['iae']:.2f}  desvio máx={d['sobressinal']:.2f}  potência média={d['energia']:.1f} %")
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump({**tabela, "pesos": PESOS, "dias": args.dias, "metricas": detalhes}, f, indent=2)
+    print(f"Tabela de ganhos gravada em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Definição dos dois subsistemas fuzzy do controlador do CRAC.
+
+Universos, funções de pertinência e regras ficam descritos como dados
+simples, para que o mesmo controlador possa ser montado no scikit-fuzzy
+(construir_controle) ou compilado pelos motores próprios (motor_vetorizado,
+motor_tabela) sem duplicar nenhum parâmetro.
+"""
+import hashlib
+import json
+import threading
+
+import numpy as np
+
+# =====================================================================
+# 1. VARIÁVEIS E FUNÇÕES DE PERTINÊNCIA
+# =====================================================================
+# Universo no formato de np.arange: (início, fim, passo)
+VARIAVEIS = {
+    # Erro (errotemp)
+    'errotemp': {
+        'universo': (-16, 16.5, 0.5),
+        'termos': {
+            'MN': ('trapmf', [-16, -16, -5, -2]),
+            'PN': ('trimf', [-5, -2, 0]),
+            'ZE': ('trimf', [-1, 0, 1]),
+            'PP': ('trimf', [0, 2, 5]),
+            'MP': ('trapmf', [2, 5, 16, 16]),
+        },
+    },
+    # Delta Erro (varerrotemp)
+    'varerrotemp': {
+        'universo': (-2, 2.05, 0.05),
+        'termos': {
+            'MN': ('trapmf', [-2, -2, -1.5, -1]),
+            'PN': ('trimf', [-1.5, -1, 0]),
+            'ZE': ('trimf', [-0.5, 0, 0.5]),
+            'PP': ('trimf', [0, 1, 1.5]),
+            'MP': ('trapmf', [1, 1.5, 2, 2]),
+        },
+    },
+    # Temperatura externa
+    'text': {
+        'universo': (10, 41, 1),
+        'termos': {
+            'Fria': ('trapmf', [10, 10, 18, 22]),
+            'Media': ('trimf', [20, 25, 30]),
+            'Quente': ('trapmf', [28, 32, 40, 40]),
+        },
+    },
+    # Carga térmica
+    'cargatermica': {
+        'universo': (0, 101, 1),
+        'termos': {
+            'Baixa': ('trapmf', [0, 0, 25, 40]),
+            'Media': ('trimf', [30, 40, 70]),
+            'Alta': ('trapmf', [60, 80, 100, 100]),
+        },
+    },
+    # Potência base
+    'potencia_base': {
+        'universo': (0, 100.2, 0.2),
+        'termos': {
+            'MB': ('trimf', [0, 0, 25]),
+            'B': ('trimf', [0, 25, 50]),
+            'M': ('trimf', [25, 50, 75]),
+            'A': ('trimf', [50, 75, 100]),
+            'MA': ('trimf', [75, 100, 100]),
+        },
+    },
+    # Ajuste de potência (delta P)
+    'ajuste_potencia': {
+        'universo': (-20, 20.5, 0.5),
+        'termos': {
+            'MN': ('trapmf', [-20, -20, -10, -5]),
+            'N': ('trimf', [-10, -5, 0]),
+            'ZE': ('trimf', [-5, 0, 5]),
+            'P': ('trimf', [0, 5, 10]),
+            'MP': ('trapmf', [5, 10, 20, 20]),
+        },
+    },
+}
+
+# =====================================================================
+# 2. SUBSISTEMAS E REGRAS
+# =====================================================================
+# Cada regra é (termo da 1a entrada, termo da 2a entrada, termo da saída),
+# combinados por AND (mínimo). 'padrao' é o valor usado pelo controlador
+# quando nenhuma regra dispara (ex.: varerrotemp no fim do universo, onde
+# todas as FPs valem zero).
+SUBSISTEMAS = {
+    # === SUBSISTEMA A: NÚCLEO PI-LIKE (25 REGRAS) ===
+    'nucleo': {
+        'entradas': ('errotemp', 'varerrotemp'),
+        'saida': 'potencia_base',
+        'padrao': 100.0,
+        'regras': [
+            ('MN', 'MN', 'MB'), ('PN', 'MN', 'B'), ('ZE', 'MN', 'A'), ('PP', 'MN', 'M'), ('MP', 'MN', 'M'),
+            ('MN', 'PN', 'MB'), ('PN', 'PN', 'M'), ('ZE', 'PN', 'A'), ('PP', 'PN', 'B'), ('MP', 'PN', 'B'),
+            ('MN', 'ZE', 'B'), ('PN', 'ZE', 'A'), ('ZE', 'ZE', 'M'), ('PP', 'ZE', 'B'), ('MP', 'ZE', 'MB'), # ZE/ZE: ponto de equilíbrio
+            ('MN', 'PP', 'M'), ('PN', 'PP', 'A'), ('ZE', 'PP', 'M'), ('PP', 'PP', 'B'), ('MP', 'PP', 'MB'),
+            ('MN', 'MP', 'M'), ('PN', 'MP', 'M'), ('ZE', 'MP', 'B'), ('PP', 'MP', 'MB'), ('MP', 'MP', 'MB'),
+        ],
+    },
+    # === SUBSISTEMA B: COMPENSAÇÃO (9 REGRAS) ===
+    'compensacao': {
+        'entradas': ('text', 'cargatermica'),
+        'saida': 'ajuste_potencia',
+        'padrao': 0.0,
+        'regras': [
+            ('Fria', 'Baixa', 'MN'), ('Media', 'Baixa', 'N'), ('Quente', 'Baixa', 'ZE'),
+            ('Fria', 'Media', 'N'), ('Media', 'Media', 'ZE'), ('Quente', 'Media', 'P'),
+            ('Fria', 'Alta', 'ZE'), ('Media', 'Alta', 'P'), ('Quente', 'Alta', 'MP'),
+        ],
+    },
+}
+
+# A base pode ser trocada com o processo rodando (base_regras.aplicar). A
+# troca e quem lê VARIAVEIS/SUBSISTEMAS de outra thread (compilação dos
+# motores, impressão digital, superfícies) seguram esta trava
+TRAVA_BASE = threading.RLock()
+
+
+# =====================================================================
+# 3. FUNÇÕES DE PERTINÊNCIA AMOSTRADAS (SEM SKFUZZY)
+# =====================================================================
+
+def trimf(x, abc):
+    """Triangular, com o mesmo tratamento de bordas do skfuzzy.trimf."""
+    a, b, c = abc
+    y = np.zeros(len(x))
+    if a != b:
+        sel = (a < x) & (x < b)
+        y[sel] = (x[sel] - a) / float(b - a)
+    if b != c:
+        sel = (b < x) & (x < c)
+        y[sel] = (c - x[sel]) / float(c - b)
+    y[x == b] = 1
+    return y
+
+
+def trapmf(x, abcd):
+    """Trapezoidal, com o mesmo tratamento de bordas do skfuzzy.trapmf."""
+    a, b, c, d = abcd
+    y = np.ones(len(x))
+    sel = x <= b
+    y[sel] = trimf(x[sel], (a, b, b))
+    sel = x >= c
+    y[sel] = trimf(x[sel], (c, c, d))
+    y[x < a] = 0
+    y[x > d] = 0
+    return y
+
+
+FUNCOES = {'trimf': trimf, 'trapmf': trapmf}
+
+
+def universo(nome):
+    return np.arange(*VARIAVEIS[nome]['universo'])
+
+
+def pertinencias(nome):
+    """Retorna {termo: FP amostrada no universo} de uma variável."""
+    u = universo(nome)
+    return {termo: FUNCOES[tipo](u, params) for termo, (tipo, params) in VARIAVEIS[nome]['termos'].items()}
+
+
+def impressao_digital(nome, variaveis=None, subsistemas=None):
+    """
+    Hash (SHA-256) de tudo que define um subsistema: universos e FPs das
+    suas variáveis, regras e valor padrão. Muda sempre que algum parâmetro
+    que altera a saída do subsistema muda. ``variaveis``/``subsistemas``
+    permitem calcular a impressão de uma base ainda não aplicada.
+    """
+    with TRAVA_BASE:
+        variaveis = VARIAVEIS if variaveis is None else variaveis
+        sub = (SUBSISTEMAS if subsistemas is None else subsistemas)[nome]
+        nomes = list(sub['entradas']) + [sub['saida']]
+        dados = {'subsistema': sub, 'variaveis': {v: variaveis[v] for v in nomes}}
+    return hashlib.sha256(json.dumps(dados, sort_keys=True, default=list).encode()).hexdigest()
+
+
+# =====================================================================
+# 4. MONTAGEM NO SCIKIT-FUZZY
+# =====================================================================
+
+def construir_controle():
+    """
+    Monta Antecedents/Consequents e um ControlSystem por subsistema.
+
+    Retorna (variaveis, sistemas), ambos dicionários indexados pelo nome.
+    """
+    import skfuzzy as fuzz
+    from skfuzzy import control as ctrl
+
+    saidas = {sub['saida'] for sub in SUBSISTEMAS.values()}
+    variaveis = {}
+    for nome, var in VARIAVEIS.items():
+        classe = ctrl.Consequent if nome in saidas else ctrl.Antecedent
+        v = classe(universo(nome), nome)
+        for termo, (tipo, params) in var['termos'].items():
+            v[termo] = getattr(fuzz, tipo)(v.universe, params)
+        variaveis[nome] = v
+
+    sistemas = {}
+    for nome, sub in SUBSISTEMAS.items():
+        x, y = (variaveis[e] for e in sub['entradas'])
+        z = variaveis[sub['saida']]
+        sistemas[nome] = ctrl.ControlSystem([ctrl.Rule(x[tx] & y[ty], z[tz]) for tx, ty, tz in sub['regras']])
+    return variaveis, sistemas
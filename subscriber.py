@@ -1,21 +1,27 @@
 import paho.mqtt.client as mqtt
 
+import telemetria
+
 BROKER = "test.mosquitto.org"
 TOPIC = "c213/crac/estado"
+CLIENT_ID = "c213_teste_sub"
 
 def on_connect(client, userdata, flags, rc):
     print("Conectado ao broker, código rc =", rc)
     client.subscribe(TOPIC)
+    telemetria.anunciar(client, CLIENT_ID) # Aceita estado em JSON (também em quadros) ou binário
     print(f"Assinado no tópico: {TOPIC}")
 
 def on_message(client, userdata, msg):
     try:
-        payload = msg.payload.decode("utf-8")
-    except UnicodeDecodeError:
-        payload = msg.payload
-    print(f"[MQTT] {msg.topic} -> {payload}")
+        amostras = telemetria.decodificar_lote(msg.payload)
+    except ValueError:
+        amostras = [msg.payload]
+    for payload in amostras:
+        print(f"[MQTT] {msg.topic} -> {payload}")
 
-client = mqtt.Client(client_id="c213_teste_sub")
+client = mqtt.Client(client_id=CLIENT_ID)
+telemetria.preparar_consumidor(client, CLIENT_ID)
 client.on_connect = on_connect
 client.on_message = on_message
 
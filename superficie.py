@@ -0,0 +1,151 @@
+"""
+Superfícies de controle dos dois subsistemas fuzzy em uma grade regular:
+potencia_base sobre errotemp x varerrotemp (núcleo) e ajuste_potencia
+sobre text x cargatermica (compensação). Servem para inspecionar a base de
+regras como mapa de calor, sem os gráficos do matplotlib.
+
+    python superficie.py nucleo --resolucao 201 --saida nucleo.npz
+    python superficie.py compensacao --resolucao 121 101 --saida compensacao.bin
+
+A grade cobre o universo de cada entrada com nx x ny pontos igualmente
+espaçados e é avaliada de uma vez pelo motor_vetorizado. O resultado fica
+em memória e em disco (cache_compilado), com chave na impressão digital do
+subsistema e na resolução: mudou uma FP ou uma regra, a superfície é
+recalculada; senão, sai na hora.
+
+codificar() gera o formato servido em /superficie/<nome> pelo dashboard:
+cabeçalho _CABECALHO (MAGICO_SUPERFICIE, nx, ny, limites dos dois
+universos e o valor padrão do subsistema) seguido de nx*ny float32
+little-endian, linha i = x_i, NaN onde nenhuma regra dispara. No
+navegador: new Float32Array(buffer, 32).
+"""
+import argparse
+import functools
+import struct
+import time
+
+import numpy as np
+
+import cache_compilado
+import sistema_fuzzy
+from motor_vetorizado import SubsistemaVetorizado
+
+MAGICO_SUPERFICIE = b"C213SUP1"
+# magico, nx, ny, x inicial, x final, y inicial, y final, padrão (32 bytes, múltiplo de 4 para o Float32Array)
+_CABECALHO = struct.Struct("<8sHH5f")
+
+RESOLUCAO_PADRAO = 101
+RESOLUCAO_MIN = 2
+RESOLUCAO_MAX = 1001
+
+
+def subsistema_de(nome):
+    """Nome do subsistema a partir dele mesmo ou da sua saída (ex.: "potencia_base" -> "nucleo")."""
+    if nome in sistema_fuzzy.SUBSISTEMAS:
+        return nome
+    for subsistema, sub in sistema_fuzzy.SUBSISTEMAS.items():
+        if sub['saida'] == nome:
+            return subsistema
+    raise ValueError(f"Subsistema desconhecido: {nome!r}")
+
+
+def calcular(nome, nx=RESOLUCAO_PADRAO, ny=None, cache=True):
+    """
+    Superfície de ``nome`` em nx x ny pontos: {"subsistema", "entradas",
+    "saida", "padrao", "impressao", "x", "y", "z"}, com z float32 (nx, ny)
+    e NaN onde nenhuma regra dispara. Os arrays são compartilhados entre
+    chamadas: não altere.
+    """
+    ny = nx if ny is None else ny
+    for n in (nx, ny):
+        if not RESOLUCAO_MIN <= n <= RESOLUCAO_MAX:
+            raise ValueError(f"Resolução fora de [{RESOLUCAO_MIN}, {RESOLUCAO_MAX}]: {n}")
+    # Impressão e superfície da mesma base, mesmo com base_regras.aplicar() em outra thread
+    with sistema_fuzzy.TRAVA_BASE:
+        nome = subsistema_de(nome)
+        return _calcular(nome, int(nx), int(ny), sistema_fuzzy.impressao_digital(nome), cache)
+
+
+@functools.lru_cache(maxsize=32)
+def _calcular(nome, nx, ny, impressao, cache):
+    sub = sistema_fuzzy.SUBSISTEMAS[nome]
+    nome_x, nome_y = sub['entradas']
+    ux, uy = sistema_fuzzy.universo(nome_x), sistema_fuzzy.universo(nome_y)
+    x = np.linspace(ux[0], ux[-1], nx)
+    y = np.linspace(uy[0], uy[-1], ny)
+
+    tipo = f"superficie-{nome}"
+    chave = cache_compilado.chave(tipo, impressao, nx, ny)
+    encontrado = cache_compilado.carregar(tipo, chave) if cache else None
+    if encontrado is not None:
+        z = encontrado[0]['z']
+    else:
+        gx, gy = np.meshgrid(x, y, indexing='ij')
+        z = SubsistemaVetorizado(nome).avaliar(gx, gy).astype(np.float32)
+        if cache:
+            cache_compilado.gravar(tipo, chave, {'z': z}, impressao=impressao)
+    return {
+        "subsistema": nome, "entradas": (nome_x, nome_y), "saida": sub['saida'], "padrao": sub['padrao'],
+        "impressao": impressao, "x": x, "y": y, "z": z,
+    }
+
+
+def codificar(superficie):
+    """Cabeçalho + z em float32 little-endian (ver docstring do módulo)."""
+    x, y, z = superficie["x"], superficie["y"], superficie["z"]
+    cabecalho = _CABECALHO.pack(MAGICO_SUPERFICIE, len(x), len(y), x[0], x[-1], y[0], y[-1], superficie["padrao"])
+    return cabecalho + np.ascontiguousarray(z, dtype="<f4").tobytes()
+
+
+def decodificar(payload):
+    """Inverso de codificar(): {"x", "y", "z", "padrao"}."""
+    magico, nx, ny, x0, x1, y0, y1, padrao = _CABECALHO.unpack_from(payload)
+    if magico != MAGICO_SUPERFICIE:
+        raise ValueError("Superfície em formato desconhecido")
+    z = np.frombuffer(payload, dtype="<f4", count=nx * ny, offset=_CABECALHO.size).reshape(nx, ny)
+    return {"x": np.linspace(x0, x1, nx), "y": np.linspace(y0, y1, ny), "z": z, "padrao": padrao}
+
+
+def como_json(superficie):
+    """Superfície em listas (NaN -> None), para quem não lê o formato binário."""
+    z = superficie["z"].astype(np.float64)
+    return {
+        "subsistema": superficie["subsistema"], "entradas": list(superficie["entradas"]),
+        "saida": superficie["saida"], "padrao": superficie["padrao"],
+        "x": superficie["x"].tolist(), "y": superficie["y"].tolist(),
+        "z": np.where(np.isnan(z), None, np.round(z, 3)).tolist(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta a superfície de controle de um subsistema fuzzy.")
+    parser.add_argument("subsistema", help="nucleo, compensacao ou o nome da saída (potencia_base, ajuste_potencia)")
+    parser.add_argument("--resolucao", type=int, nargs="+", default=[RESOLUCAO_PADRAO],
+                        help="pontos por entrada (nx [ny])")
+    parser.add_argument("--saida", help="arquivo .npz, .csv ou binário (qualquer outra extensão)")
+    parser.add_argument("--sem-cache", action="store_true", help="recalcula sem ler nem gravar o cache em disco")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    sup = calcular(args.subsistema, *args.resolucao[:2], cache=not args.sem_cache)
+    duracao = time.perf_counter() - inicio
+    z = sup["z"]
+    print(f"{sup['saida']}({', '.join(sup['entradas'])}): {z.shape[0]} x {z.shape[1]} pontos em "
+          f"{duracao * 1e3:.1f} ms | min {np.nanmin(z):.2f} | máx {np.nanmax(z):.2f} | "
+          f"{int(np.isnan(z).sum())} sem regra disparada")
+
+    if args.saida:
+        if args.saida.endswith(".npz"):
+            np.savez(args.saida, x=sup["x"], y=sup["y"], z=z)
+        elif args.saida.endswith(".csv"):
+            gx, gy = np.meshgrid(sup["x"], sup["y"], indexing="ij")
+            np.savetxt(args.saida, np.column_stack([gx.ravel(), gy.ravel(), z.ravel()]), delimiter=",",
+                       header=",".join(list(sup["entradas"]) + [sup["saida"]]), comments="", fmt="%.6g")
+        else:
+            with open(args.saida, "wb") as f:
+                f.write(codificar(sup))
+        print(f"Superfície gravada em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
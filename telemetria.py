@@ -0,0 +1,290 @@
+"""
+Codificação do estado publicado em c213/crac/estado.
+
+Três formatos:
+
+- "json": o dicionário de sempre (json.dumps), ~200 bytes por amostra, uma
+  amostra por mensagem.
+- "json-lote": o mesmo dicionário, mas uma mensagem pode ser um quadro
+  com várias amostras (lista JSON).
+- "bin1": registro binário de layout fixo (struct), 21 bytes por amostra
+  (29 com o instante "t"); um quadro são registros concatenados.
+  Os valores são quantizados na mesma resolução que o JSON já publica
+  (temperatura/erro/potência com 2 casas, carga e Text com 1 casa), então
+  nada se perde em relação ao JSON. Valores fora da faixa de um campo são
+  saturados nela e NaN vira um sentinela (decodificado como NaN), de modo
+  que um valor estranho não derruba a publicação.
+
+O consumidor não precisa saber o formato de antemão: decodificar() reconhece
+o registro binário pelo prefixo MAGICO e cai para JSON caso contrário.
+O publicador carimba cada amostra com "t" (s desde a época), para que as
+amostras de um quadro não fiquem todas com o instante da chegada.
+
+Negociação: cada consumidor anuncia os formatos que entende em
+TOPIC_CAPACIDADES/<client_id> (mensagem retida, apagada pelo testamento
+MQTT quando ele cai). O padrão do produtor é "json". No modo "auto" (opt-in),
+ele só publica "bin1" (ou "json-lote") enquanto houver consumidores
+anunciados e todos o aceitarem; senão, "json". Clientes que não anunciam
+nada (mosquitto_sub, por exemplo) não entram na negociação: com algum
+assim na rede, mantenha "json".
+
+    python telemetria.py     # bytes por amostra e tempo de codificação/decodificação
+"""
+import json
+import math
+import struct
+
+TOPIC_CAPACIDADES = "c213/crac/telemetria/capacidades"
+
+FORMATOS = ("json", "json-lote", "bin1")
+# Formatos em que uma mensagem pode trazer várias amostras
+FORMATOS_LOTE = ("json-lote", "bin1")
+
+MAGICO = b"\xc2\x13"
+VERSAO_BINARIO = 1
+VERSAO_BINARIO_T = 2
+
+# magico, versão, flags, temperatura, erro, varErro, potencia, setpoint, qest, text, tempo_horas
+_REGISTRO = struct.Struct("<2sBBhhhHBHhI")
+# Versão 2: o mesmo registro seguido do instante "t" (s desde a época)
+_REGISTRO_T = struct.Struct(_REGISTRO.format + "d")
+TAMANHO_BINARIO = _REGISTRO.size
+_REGISTROS = {VERSAO_BINARIO: _REGISTRO, VERSAO_BINARIO_T: _REGISTRO_T}
+
+# Bits de flags: estados booleanos e presença das chaves opcionais
+_RODANDO = 0x01
+_INJECAO = 0x02
+_RESET = 0x04
+_TEM_INJECAO = 0x08
+_TEM_PERTURBACOES = 0x10
+_TEM_TEMPO = 0x20
+
+# Faixa (mínimo, máximo) e sentinela de NaN de cada tipo de campo do struct
+_FAIXAS = {
+    "h": (-32767, 32767, -32768),
+    "H": (0, 65534, 65535),
+    "B": (0, 254, 255),
+    "I": (0, 2**32 - 2, 2**32 - 1),
+}
+
+
+def codificar_json(estado):
+    return json.dumps(estado).encode("utf-8")
+
+
+def _quantizar(valor, escala, tipo):
+    """valor * escala arredondado e saturado na faixa do tipo; NaN vira o sentinela."""
+    minimo, maximo, sentinela = _FAIXAS[tipo]
+    valor = float(valor) * escala
+    if math.isnan(valor):
+        return sentinela
+    return round(min(max(valor, minimo), maximo))
+
+
+def _restaurar(inteiro, escala, tipo):
+    return float("nan") if inteiro == _FAIXAS[tipo][2] else inteiro / escala
+
+
+def codificar_binario(estado):
+    flags = 0
+    if estado.get("simulacao_rodando"):
+        flags |= _RODANDO
+    if estado.get("injecao_ativa"):
+        flags |= _INJECAO
+    if estado.get("reset"):
+        flags |= _RESET
+    if "injecao_ativa" in estado:
+        flags |= _TEM_INJECAO
+    if "qest" in estado:
+        flags |= _TEM_PERTURBACOES
+    if "tempo_horas" in estado:
+        flags |= _TEM_TEMPO
+    campos = [
+        _quantizar(estado["temperatura"], 100, "h"),
+        _quantizar(estado["erro"], 100, "h"),
+        _quantizar(estado["varErro"], 100, "h"),
+        _quantizar(estado["potencia"], 100, "H"),
+        _quantizar(int(estado["setpoint"]), 1, "B"),
+        _quantizar(estado.get("qest", 0), 10, "H"),
+        _quantizar(estado.get("text", 0), 10, "h"),
+        _quantizar(estado.get("tempo_horas", 0), 100, "I"),
+    ]
+    if "t" in estado:
+        return _REGISTRO_T.pack(MAGICO, VERSAO_BINARIO_T, flags, *campos, float(estado["t"]))
+    return _REGISTRO.pack(MAGICO, VERSAO_BINARIO, flags, *campos)
+
+
+def _tamanho_registro(payload, inicio=0):
+    """Tamanho do registro binário que começa em ``inicio`` (pela versão)."""
+    if len(payload) < inicio + 3:
+        raise ValueError("registro de telemetria binária truncado")
+    registro = _REGISTROS.get(payload[inicio + 2])
+    if registro is None:
+        raise ValueError(f"versão de telemetria binária desconhecida: {payload[inicio + 2]}")
+    return registro.size
+
+
+def decodificar_binario(payload):
+    registro = _REGISTROS.get(payload[2]) if len(payload) > 2 else _REGISTRO
+    if registro is None:
+        raise ValueError(f"versão de telemetria binária desconhecida: {payload[2]}")
+    try:
+        (_, versao, flags, temperatura, erro, varerro, potencia, setpoint,
+         qest, text, tempo_horas, *t) = registro.unpack(payload)
+    except struct.error as e:
+        raise ValueError(f"registro de telemetria binária inválido: {e}") from e
+    estado = {
+        "temperatura": _restaurar(temperatura, 100, "h"),
+        "erro": _restaurar(erro, 100, "h"),
+        "varErro": _restaurar(varerro, 100, "h"),
+        "potencia": _restaurar(potencia, 100, "H"),
+        "setpoint": setpoint,
+    }
+    if flags & _TEM_PERTURBACOES:
+        estado["qest"] = _restaurar(qest, 10, "H")
+        estado["text"] = _restaurar(text, 10, "h")
+    estado["simulacao_rodando"] = bool(flags & _RODANDO)
+    if flags & _TEM_INJECAO:
+        estado["injecao_ativa"] = bool(flags & _INJECAO)
+    if flags & _TEM_TEMPO:
+        estado["tempo_horas"] = _restaurar(tempo_horas, 100, "I")
+    if flags & _RESET:
+        estado["reset"] = True
+    if t:
+        estado["t"] = t[0]
+    return estado
+
+
+# Codificação de uma amostra por formato
+CODIFICADORES = {"json": codificar_json, "json-lote": codificar_json, "bin1": codificar_binario}
+
+
+def codificar_lote(estados, formato="json-lote"):
+    """
+    Quadro com várias amostras: registros binários concatenados ou lista
+    JSON. Um quadro de uma amostra só é idêntico à amostra codificada. Em
+    "json" (consumidores sem quadros) só cabe uma amostra: ValueError.
+    """
+    if formato == "bin1":
+        return b"".join(codificar_binario(e) for e in estados)
+    if len(estados) == 1:
+        return codificar_json(estados[0])
+    if formato not in FORMATOS_LOTE:
+        raise ValueError(f"formato {formato!r} não admite quadros com várias amostras")
+    return json.dumps(estados).encode("utf-8")
+
+
+def decodificar(payload):
+    """Estado (dict) a partir de um payload em qualquer dos formatos (a última amostra, se for um quadro)."""
+    return decodificar_lote(payload)[-1]
+
+
+def decodificar_lote(payload):
+    """Lista de estados de um quadro (ou de uma amostra avulsa) em qualquer dos formatos."""
+    if payload[:2] == MAGICO:
+        estados, i = [], 0
+        while i < len(payload):
+            tamanho = _tamanho_registro(payload, i)
+            if i + tamanho > len(payload):
+                raise ValueError(f"quadro binário com {len(payload)} bytes: último registro truncado")
+            estados.append(decodificar_binario(payload[i:i + tamanho]))
+            i += tamanho
+        return estados
+    dados = json.loads(payload.decode("utf-8") if isinstance(payload, bytes) else payload)
+    return dados if isinstance(dados, list) else [dados]
+
+
+# =====================================================================
+# NEGOCIAÇÃO
+# =====================================================================
+
+def preparar_consumidor(client, client_id):
+    """Testamento que apaga o anúncio do consumidor quando a conexão cai. Chamar antes de connect()."""
+    client.will_set(f"{TOPIC_CAPACIDADES}/{client_id}", payload=None, retain=True)
+
+
+def anunciar(client, client_id, formatos=FORMATOS):
+    """Anuncia (mensagem retida) os formatos que o consumidor entende. Chamar no on_connect."""
+    client.publish(f"{TOPIC_CAPACIDADES}/{client_id}", json.dumps({"formatos": list(formatos)}), retain=True)
+
+
+class Negociacao:
+    """
+    Lado do produtor: acompanha os anúncios dos consumidores e escolhe o
+    formato. ``preferido`` "json" (padrão), "json-lote" ou "bin1" fixam o
+    formato; "auto" negocia. ``lote`` diz se uma mensagem pode levar várias amostras.
+    """
+
+    def __init__(self, preferido="json"):
+        if preferido not in ("auto",) + FORMATOS:
+            raise ValueError(f"Formato de telemetria desconhecido: {preferido!r}")
+        self.preferido = preferido
+        self.consumidores = {}
+        self.formato = "json" if preferido == "auto" else preferido
+        self._codificar = CODIFICADORES[self.formato]
+
+    def assinar(self, client):
+        client.subscribe(f"{TOPIC_CAPACIDADES}/+")
+
+    def processar(self, msg):
+        """Trata uma mensagem de TOPIC_CAPACIDADES. Retorna False se for de outro tópico."""
+        if not msg.topic.startswith(TOPIC_CAPACIDADES + "/"):
+            return False
+        consumidor = msg.topic[len(TOPIC_CAPACIDADES) + 1:]
+        try:
+            formatos = json.loads(msg.payload.decode("utf-8"))["formatos"] if msg.payload else None
+        except (ValueError, KeyError, TypeError):
+            formatos = None
+        if formatos:
+            self.consumidores[consumidor] = set(formatos)
+        else:
+            self.consumidores.pop(consumidor, None)
+        self._escolher()
+        return True
+
+    def _escolher(self):
+        if self.preferido != "auto":
+            return
+        anterior = self.formato
+        self.formato = "json"
+        for formato in ("bin1", "json-lote"):
+            if self.consumidores and all(formato in f for f in self.consumidores.values()):
+                self.formato = formato
+                break
+        self._codificar = CODIFICADORES[self.formato]
+        if self.formato != anterior:
+            print(f"[Telemetria] Formato de c213/crac/estado: {self.formato} "
+                  f"({len(self.consumidores)} consumidor(es) anunciado(s))")
+
+    @property
+    def lote(self):
+        return self.formato in FORMATOS_LOTE
+
+    def codificar(self, estado):
+        return self._codificar(estado)
+
+    def codificar_lote(self, estados):
+        return codificar_lote(estados, self.formato)
+
+
+def main():
+    import timeit
+
+    estado = {
+        "temperatura": 23.47, "erro": -1.53, "varErro": 0.12, "potencia": 41.86, "setpoint": 25,
+        "qest": 90.0, "text": 31.2, "simulacao_rodando": True, "injecao_ativa": False, "tempo_horas": 13.5,
+        "t": 1700000000.125,
+    }
+    n = 20000
+    print(f"{'formato':<8}{'bytes':>8}{'codificar (µs)':>17}{'decodificar (µs)':>19}")
+    for formato in ("json", "bin1"):
+        codificar = CODIFICADORES[formato]
+        payload = codificar(estado)
+        assert decodificar(payload) == estado
+        t_cod = timeit.timeit(lambda: codificar(estado), number=n) / n * 1e6
+        t_dec = timeit.timeit(lambda: decodificar(payload), number=n) / n * 1e6
+        print(f"{formato:<8}{len(payload):>8}{t_cod:>17.2f}{t_dec:>19.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,191 +1,104 @@
-import numpy as np
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
-import matplotlib.pyplot as plt
 import paho.mqtt.client as mqtt
 import time
 import json
 import threading
 
+from controlador import (
+    TOPIC_ESTADO, TOPIC_SP, TOPIC_COMANDO, TOPIC_INJECAO, TOPIC_CONFIG,
+    ControladorCRAC, carregar_ganhos,
+)
+from base_regras import ARQUIVO_REGRAS, MotorRecarregavel
+from alertas import TOPIC_ALERTA, MotorAlertas
+from perturbacoes import Traco
+from telemetria import Negociacao
+from publicador import PublicadorEstado
+from metricas import TOPIC_METRICAS, Registro
+
 # =====================================================================
 # 0. CONFIGURAÇÃO E VARIÁVEIS GLOBAIS
 # =====================================================================
 mqttBroker = "test.mosquitto.org"
-TOPIC_ESTADO = "c213/crac/estado"
-TOPIC_SP = "c213/crac/setpoint"
-TOPIC_COMANDO = "c213/crac/comando" # Tópico para comandos (iniciar/parar/limpar)
-TOPIC_INJECAO = "c213/crac/injecao" # Novo tópico
-
-# Variáveis para a injeção manual. Se True, a simulação usa 'erro_inj' em vez de 'erroatual'.
-injecao_ativa = False 
-erro_inj = 0.0
-deltaErro_inj = 0.0
-text_inj = 25.0
-carga_inj = 40.0
-
-# Variáveis de Estado (Simulação e Sistema)
-sp = 25 # Setpoint inicial
-tempatual = 25 # Temperatura inicial (movemos para o topo para facilitar o reset)
-qest_atual = 40 # Carga térmica fixa
-text_atual = 25 # Temperatura externa fixa
-erroatual = tempatual - sp # Inicializa o erro
-erroanterior = erroatual
-
-# Variáveis de Controle da Simulação
-simulacao_ativa = False # Estado inicial: Parado
-reiniciar_simulacao = False
-
-# Variável para controlar o ciclo de 24h
-simulacao_24h_ativa = False
 
-# --- ADICIONE ESTAS FUNÇÕES NO TOPO DO CÓDIGO FUZZY (APÓS AS VARIÁVEIS GLOBAIS) ---
-
-def perturba_text_24h(iteracao):
-    # Simula uma onda senoidal (ciclo de 24 horas)
-    tempo_em_horas = iteracao * (24 / 288) 
-    # Modelo T_ext: Média de 25°C, Amplitude de 10°C.
-    return 25 + 10 * np.sin((tempo_em_horas - 8) * np.pi / 12)
-
-def perturba_carga_24h(iteracao):
-    # Simula a Carga Térmica com degraus (Alta durante o dia)
-    tempo_em_horas = iteracao * (24 / 288)
-    
-    if 8 <= tempo_em_horas < 18:
-        # Horário comercial/pico de uso: Carga Alta (90%)
-        return 90
-    else:
-        # Noite/Madrugada: Carga Baixa (30%)
-        return 30
+# O estado da simulação (setpoint, temperatura, erros, injeção manual, flags
+# de iniciar/parar/limpar/24h) fica em controle.estado (EstadoControlador,
+# controlador.py). on_message, na thread do paho, só enfileira comandos; o
+# laço principal os aplica no início de cada passo.
+
+# Motor de inferência: "vetorizado" (avaliador NumPy, ver motor_vetorizado.py),
+# "tabela" (superfícies pré-compiladas na partida, ver motor_tabela.py),
+# "exato" (só as regras ativas e centróide em forma fechada, ver motor_exato.py)
+# ou "skfuzzy" (ControlSystemSimulation a cada passo; importa o scikit-fuzzy)
+MOTOR_INFERENCIA = "vetorizado"
+TOLERANCIA_TABELA = 1.0 # Erro máximo da tabela em relação ao skfuzzy (% de potência)
+
+# Memória da inferência (ver memoria_inferencia.py): entradas repetidas ou
+# quase (a compensação no laço contínuo, o núcleo em regime) não refazem a
+# inferência. Entradas quantizadas em memoria_inferencia.QUANTIZACAO, então a
+# potência é aproximada (centésimos de ponto). None (padrão) desliga; para ligar:
+# {"capacidade": 4096, "validade": 300.0}
+MEMORIA_INFERENCIA = None
+
+# Base de regras e FPs: base_regras.json (gerado por "python base_regras.py
+# exportar"), se existir; senão, a de sistema_fuzzy.py. O arquivo é vigiado:
+# ao ser salvo (ou com o comando MQTT "recarregar_regras"), a base é validada
+# e os subsistemas alterados são recompilados sem parar o laço
+RECARREGAR_REGRAS = True
+
+# Traço de temperatura externa e carga medidas (CSV ou .c213tr, ver
+# perturbacoes.py) para o ciclo de 24h, lido sob demanda; cada "iniciar_24h"
+# continua do ponto em que o anterior parou. None: senoide e degraus sintéticos
+TRACO_PERTURBACOES = None
+
+# Mapas de Kp por setpoint: ganhos_kp.json (gerado por sintonia_kp.py), se existir;
+# senão, os mapas ajustados à mão de controlador.py
+KP_24H, KP_CONTINUO = carregar_ganhos()
+
+# Formato do estado em TOPIC_ESTADO: "json" (padrão, legível por qualquer
+# cliente), "auto" (binário ou quadros JSON se todos os consumidores
+# anunciados o aceitarem, ver telemetria.py), "json-lote" ou "bin1"
+FORMATO_TELEMETRIA = "json"
+telemetria = Negociacao(FORMATO_TELEMETRIA)
+
+# Publicação do estado (ver publicador.py): quadros por segundo, batimento do
+# estado repetido (s), mensagens pendentes no paho antes de degradar e QoS
+TAXA_QUADROS_HZ = 10
+INTERVALO_REPETICAO = 2.0
+FILA_MQTT_MAX = 100
+QOS_ESTADO = 0
+
+# Métricas do laço (ver metricas.py), publicadas em TOPIC_METRICAS a cada
+# INTERVALO_METRICAS s (0 desliga) e expostas em /metrics pelo dashboard
+INTERVALO_METRICAS = 5.0
+metricas = Registro()
 
 # =====================================================================
 # 1. FUNÇÕES FUZZY (FPs, REGRAS E SISTEMAS)
 # =====================================================================
-# --- VARIÁVEIS E FUNÇÕES DE PERTINÊNCIA ---
-errotemp = ctrl.Antecedent(np.arange(-16, 16.5, 0.5), 'errotemp')
-varerrotemp = ctrl.Antecedent(np.arange(-2, 2.05, 0.05), 'varerrotemp')
-text = ctrl.Antecedent(np.arange(10, 41, 1), 'text')
-cargatermica = ctrl.Antecedent(np.arange(0, 101, 1), 'cargatermica')
-potencia_base = ctrl.Consequent(np.arange(0, 100.2, 0.2), 'potencia_base')
-ajuste_potencia = ctrl.Consequent(np.arange(-20, 20.5, 0.5), 'ajuste_potencia')
-
-# Erro (errotemp)
-errotemp['MN'] = fuzz.trapmf(errotemp.universe, [-16, -16, -5, -2])
-errotemp['PN'] = fuzz.trimf(errotemp.universe, [-5, -2, 0])
-errotemp['ZE'] = fuzz.trimf(errotemp.universe, [-1, 0, 1])
-errotemp['PP'] = fuzz.trimf(errotemp.universe, [0, 2, 5])
-errotemp['MP'] = fuzz.trapmf(errotemp.universe, [2, 5, 16, 16])
-
-errotemp.view()
-#plt.show()
-
-# Delta Erro (varerrotemp)
-varerrotemp['MN'] = fuzz.trapmf(varerrotemp.universe, [-2, -2, -1.5, -1])
-varerrotemp['PN'] = fuzz.trimf(varerrotemp.universe, [-1.5, -1, 0])
-varerrotemp['ZE'] = fuzz.trimf(varerrotemp.universe, [-0.5, 0, 0.5])
-varerrotemp['PP'] = fuzz.trimf(varerrotemp.universe, [0, 1, 1.5])
-varerrotemp['MP'] = fuzz.trapmf(varerrotemp.universe, [1, 1.5, 2, 2])
-
-varerrotemp.view()
-plt.show()
-
-# Potência base
-potencia_base['MB'] = fuzz.trimf(potencia_base.universe, [0, 0, 25])
-potencia_base['B']  = fuzz.trimf(potencia_base.universe, [0, 25, 50])
-potencia_base['M']  = fuzz.trimf(potencia_base.universe, [25, 50, 75])
-potencia_base['A']  = fuzz.trimf(potencia_base.universe, [50, 75, 100])
-potencia_base['MA'] = fuzz.trimf(potencia_base.universe, [75, 100, 100])
-
-#potencia_base.view()
-#plt.show()
-
-# Temperatura externa
-text['Fria']   = fuzz.trapmf(text.universe, [10, 10, 18, 22])
-text['Media']  = fuzz.trimf(text.universe, [20, 25, 30])
-text['Quente'] = fuzz.trapmf(text.universe, [28, 32, 40, 40])
-
-# Carga térmica
-cargatermica['Baixa'] = fuzz.trapmf(cargatermica.universe, [0, 0, 25, 40])
-cargatermica['Media'] = fuzz.trimf(cargatermica.universe, [30, 40, 70])
-cargatermica['Alta']  = fuzz.trapmf(cargatermica.universe, [60, 80, 100, 100])
-
-#cargatermica.view()
-#plt.show()
-
-# Ajuste de potência (delta P)
-ajuste_potencia['MN'] = fuzz.trapmf(ajuste_potencia.universe, [-20, -20, -10, -5])
-ajuste_potencia['N']  = fuzz.trimf(ajuste_potencia.universe, [-10, -5, 0])
-ajuste_potencia['ZE'] = fuzz.trimf(ajuste_potencia.universe, [-5, 0, 5])
-ajuste_potencia['P']  = fuzz.trimf(ajuste_potencia.universe, [0, 5, 10])
-ajuste_potencia['MP'] = fuzz.trapmf(ajuste_potencia.universe, [5, 10, 20, 20])
-
-#ajuste_potencia.view()
-#plt.show()
-
-# --- REGRAS E CONTROLADORES ---
-Rule = ctrl.Rule
-# === 2. SUBSISTEMA A: NÚCLEO PI-LIKE (25 REGRAS) ===
-# As regras devem ser adaptadas para usar potencia_base
-regra_a1 = Rule(errotemp['MN'] & varerrotemp['MN'], potencia_base['MB'])
-regra_a2 = Rule(errotemp['PN'] & varerrotemp['MN'], potencia_base['B'])
-regra_a3 = Rule(errotemp['ZE'] & varerrotemp['MN'], potencia_base['A'])
-regra_a4 = Rule(errotemp['PP'] & varerrotemp['MN'], potencia_base['M'])
-regra_a5 = Rule(errotemp['MP'] & varerrotemp['MN'], potencia_base['M'])
-regra_a6 = Rule(errotemp['MN'] & varerrotemp['PN'], potencia_base['MB'])
-regra_a7 = Rule(errotemp['PN'] & varerrotemp['PN'], potencia_base['M'])
-regra_a8 = Rule(errotemp['ZE'] & varerrotemp['PN'], potencia_base['A'])
-regra_a9 = Rule(errotemp['PP'] & varerrotemp['PN'], potencia_base['B'])
-regra_a10 = Rule(errotemp['MP'] & varerrotemp['PN'], potencia_base['B'])
-regra_a11 = Rule(errotemp['MN'] & varerrotemp['ZE'], potencia_base['B'])
-regra_a12 = Rule(errotemp['PN'] & varerrotemp['ZE'], potencia_base['A'])
-regra_a13 = Rule(errotemp['ZE'] & varerrotemp['ZE'], potencia_base['M']) # Ponto de equilíbrio
-regra_a14 = Rule(errotemp['PP'] & varerrotemp['ZE'], potencia_base['B'])
-regra_a15 = Rule(errotemp['MP'] & varerrotemp['ZE'], potencia_base['MB'])
-regra_a16 = Rule(errotemp['MN'] & varerrotemp['PP'], potencia_base['M'])
-regra_a17 = Rule(errotemp['PN'] & varerrotemp['PP'], potencia_base['A'])
-regra_a18 = Rule(errotemp['ZE'] & varerrotemp['PP'], potencia_base['M'])
-regra_a19 = Rule(errotemp['PP'] & varerrotemp['PP'], potencia_base['B'])
-regra_a20 = Rule(errotemp['MP'] & varerrotemp['PP'], potencia_base['MB'])
-regra_a21 = Rule(errotemp['MN'] & varerrotemp['MP'], potencia_base['M'])
-regra_a22 = Rule(errotemp['PN'] & varerrotemp['MP'], potencia_base['M'])
-regra_a23 = Rule(errotemp['ZE'] & varerrotemp['MP'], potencia_base['B'])
-regra_a24 = Rule(errotemp['PP'] & varerrotemp['MP'], potencia_base['MB'])
-regra_a25 = Rule(errotemp['MP'] & varerrotemp['MP'], potencia_base['MB'])
-
-
-# Sistema de Controle A
-nucleo_ctrl = ctrl.ControlSystem([
-    regra_a1, regra_a2, regra_a3, regra_a4, regra_a5,
-    regra_a6, regra_a7, regra_a8, regra_a9, regra_a10,
-    regra_a11, regra_a12, regra_a13, regra_a14, regra_a15,
-    regra_a16, regra_a17, regra_a18, regra_a19, regra_a20,
-    regra_a21, regra_a22, regra_a23, regra_a24, regra_a25
-])
-simulacao_nucleo = ctrl.ControlSystemSimulation(nucleo_ctrl)
-
-
-# === 3. SUBSISTEMA B: COMPENSAÇÃO (9 REGRAS) ===
-# As regras usam text e cargatermica para definir ajuste_potencia
-regra_c1 = Rule(text['Fria'] & cargatermica['Baixa'], ajuste_potencia['MN'])
-regra_c2 = Rule(text['Media'] & cargatermica['Baixa'], ajuste_potencia['N'])
-regra_c3 = Rule(text['Quente'] & cargatermica['Baixa'], ajuste_potencia['ZE'])
-
-regra_c4 = Rule(text['Fria'] & cargatermica['Media'], ajuste_potencia['N'])
-regra_c5 = Rule(text['Media'] & cargatermica['Media'], ajuste_potencia['ZE'])
-regra_c6 = Rule(text['Quente'] & cargatermica['Media'], ajuste_potencia['P'])
-
-regra_c7 = Rule(text['Fria'] & cargatermica['Alta'], ajuste_potencia['ZE'])
-regra_c8 = Rule(text['Media'] & cargatermica['Alta'], ajuste_potencia['P'])
-regra_c9 = Rule(text['Quente'] & cargatermica['Alta'], ajuste_potencia['MP'])
-
-
-# Sistema de Controle B
-compensacao_ctrl = ctrl.ControlSystem([
-    regra_c1, regra_c2, regra_c3, regra_c4, regra_c5, 
-    regra_c6, regra_c7, regra_c8, regra_c9
-])
-simulacao_compensacao = ctrl.ControlSystemSimulation(compensacao_ctrl)
-
-# ... (Seu código inicial, incluindo definições de FPs e Regras A e B) ...
+# Universos, FPs e as 34 regras (25 do núcleo + 9 de compensação) estão
+# descritos em sistema_fuzzy.py ou em ARQUIVO_REGRAS. Os gráficos das FPs não são mais abertos
+# na partida: use "python diagnostico.py graficos".
+
+# --- MOTOR DE INFERÊNCIA ---
+# calcular_fuzzy(erro, varerro, text, carga) -> (P_base, Delta_P)
+if MOTOR_INFERENCIA == "tabela":
+    print("Compilando tabelas de controle (núcleo e compensação)...")
+# Quantas vezes nenhuma regra disparou e valeu o padrão (P_base = 100.0 ou Delta_P = 0.0)
+fallbacks = {sub: metricas.contador("c213_fallback_total", "Inferências sem regra disparada (valor padrão)",
+                                    subsistema=sub)
+             for sub in ("nucleo", "compensacao")}
+calcular_fuzzy = MotorRecarregavel(MOTOR_INFERENCIA, ARQUIVO_REGRAS, TOLERANCIA_TABELA,
+                                   ao_padrao=lambda sub: fallbacks[sub].incrementar(),
+                                   memoria=None if MEMORIA_INFERENCIA is None
+                                   else dict(MEMORIA_INFERENCIA, metricas=metricas))
+if RECARREGAR_REGRAS:
+    calcular_fuzzy.vigiar()
+metricas.medidor("c213_regras_recargas_total", lambda: calcular_fuzzy.recargas,
+                 "Recargas da base de regras por resultado", tipo="counter", resultado="ok")
+metricas.medidor("c213_regras_recargas_total", lambda: calcular_fuzzy.falhas,
+                 "Recargas da base de regras por resultado", tipo="counter", resultado="rejeitada")
+
+controle = ControladorCRAC(calcular_fuzzy, KP_24H, KP_CONTINUO, metricas=metricas,
+                           perturbacoes=Traco(TRACO_PERTURBACOES) if TRACO_PERTURBACOES else None)
 
 # =====================================================================
 # 2. FUNÇÕES MQTT
@@ -200,87 +113,58 @@ def on_connect(client, userdata, flags, rc):
         mqtt_connected = True
         print("MQTT conectado, rc = 0. Assinando tópicos...")
         client.subscribe([(TOPIC_SP, 0), (TOPIC_COMANDO, 0), (TOPIC_INJECAO, 0)]) # Assina SP e COMANDO
+        telemetria.assinar(client) # Anúncios de formato dos consumidores
+        publicar_configuracao(calcular_fuzzy)
         print(f"Assinado nos tópicos: {TOPIC_SP}, {TOPIC_COMANDO} e {TOPIC_INJECAO}")
     else:
         print(f"Falha na conexão MQTT, código {rc}")
 
-def resetar_estado():
-    global tempatual, erroatual, erroanterior, reiniciar_simulacao
-    
-    tempatual = 25.0
-    erroatual = tempatual - sp
-    erroanterior = erroatual
-    reiniciar_simulacao = False
-    
-    # Publicar o payload com a flag de reset para o dashboard limpar o gráfico
-    estado_reset = {
-        "temperatura": tempatual, "erro": 0.0, "varErro": 0.0,
-        "potencia": 0.0, "setpoint": sp, 
-        "simulacao_rodando": False, # Estado final de parada
-        "reset": True # CHAVE CRUCIAL PARA LIMPEZA NO FRONT-END
-    }
-    client.publish(TOPIC_ESTADO, json.dumps(estado_reset))
-    print("\n--- Estado da Simulação RESETADO ---\n")
+def publicar_configuracao(motor):
+    # Retida: o gravador (gravacao.py) recebe ao assinar e a reprodução usa o mesmo motor e base
+    client.publish(TOPIC_CONFIG, json.dumps(motor.configuracao()), qos=1, retain=True)
 
 def on_message(client, userdata, msg):
-    global sp, simulacao_ativa, reiniciar_simulacao, injecao_ativa, erro_inj, deltaErro_inj, text_inj, carga_inj, simulacao_24h_ativa
-    
-    try:
-        payload = msg.payload.decode("utf-8")
-        data = json.loads(payload)
-        
-        if msg.topic == TOPIC_SP:
-            novo_sp = int(data.get("setpoint"))
-            if novo_sp in (16, 22, 25, 32):
-                sp = novo_sp
-                print(f"[MQTT] Setpoint atualizado para {sp}°C")
-            
-        elif msg.topic == TOPIC_COMANDO:
-            comando = data.get("comando")
-            
-            if comando == "iniciar":
-                simulacao_ativa = True
-                if reiniciar_simulacao: resetar_estado() # Começa limpo, se pedido
-                
-            elif comando == "parar":
-                simulacao_ativa = False
-                
-            elif comando == "limpar_grafico":
-                reiniciar_simulacao = True # Sinaliza reset no próximo loop ativo
-
-            elif comando == "iniciar_24h": # <--- NOVO COMANDO AQUI
-                simulacao_24h_ativa = True
-                print("[MQTT] Simulação de 24h solicitada.")
-        
-        if msg.topic == TOPIC_INJECAO:
-            try:
-                data = json.loads(msg.payload.decode("utf-8"))
-            
-                # Atualiza as variáveis de injeção
-                erro_inj = float(data.get("erro"))
-                deltaErro_inj = float(data.get("deltaErro"))
-                text_inj = float(data.get("text"))
-                carga_inj = float(data.get("carga"))
-            
-                # Ativa o modo de injeção
-                injecao_ativa = True
-            
-                # Parar a simulação é recomendado, pois a injeção é um teste estático.
-                simulacao_ativa = False 
-            
-                print("[MQTT] DADOS INJETADOS. Simulação pausada.")
-            except Exception as e:
-                print(f"Erro ao processar injeção MQTT: {e}")
-                
-    except Exception as e:
-        print(f"Erro ao processar mensagem MQTT: {e}")
+    if telemetria.processar(msg):
+        return
+    # Setpoint, comandos (iniciar/parar/limpar_grafico/iniciar_24h) e injeção manual
+    controle.processar_mensagem(msg.topic, msg.payload)
     
 # Inicializa e começa o loop MQTT
 client = mqtt.Client(client_id="c213_fuzzy_pubsub")
 client.on_connect = on_connect
 client.on_message = on_message
+calcular_fuzzy.ao_recarregar = publicar_configuracao
 client.connect(mqttBroker, 1883, 60)
 client.loop_start() 
+publicador = PublicadorEstado(client, TOPIC_ESTADO, telemetria, QOS_ESTADO, TAXA_QUADROS_HZ,
+                              INTERVALO_REPETICAO, FILA_MQTT_MAX)
+controle.publicador = publicador
+
+# Alertas (ver alertas.py): cada estado calculado é conferido contra a faixa segura
+# (TEMP_MIN_SEGURA/TEMP_MAX_SEGURA) e a taxa de variação, com histerese e
+# debounce; só a abertura e o encerramento de cada alerta vão ao broker
+def publicar_alerta(evento):
+    client.publish(TOPIC_ALERTA, json.dumps(evento), qos=1)
+    print(("ALERTA: " if evento["ativo"] else "Alerta encerrado: ") + f"{evento['tipo']} ({evento.get('temperatura')} °C)")
+
+controle.alertas = MotorAlertas(ao_evento=publicar_alerta, metricas=metricas)
+
+# Contadores do publicador e mensagens ainda na fila do paho (atraso da thread MQTT)
+for situacao in ("amostras", "suprimidas", "decimadas", "descartadas", "falhas", "enviadas"):
+    metricas.medidor("c213_publicador_amostras_total", lambda s=situacao: publicador.contadores[s],
+                     "Amostras de estado por situação no publicador", tipo="counter", situacao=situacao)
+metricas.medidor("c213_mqtt_pendentes", lambda: publicador.resumo()["profundidade"],
+                 "Mensagens entregues ao paho e ainda não enviadas")
+metricas.medidor("c213_publicador_fator_decimacao", lambda: publicador.fator_decimacao,
+                 "Publica 1 de cada N amostras (contrapressão)")
+
+def publicar_metricas():
+    while True:
+        time.sleep(INTERVALO_METRICAS)
+        client.publish(TOPIC_METRICAS, json.dumps(metricas.instantaneo()))
+
+if INTERVALO_METRICAS:
+    threading.Thread(target=publicar_metricas, daemon=True).start()
 
 # ⚠️ LOOP DE CHECAGEM: Garante que a thread MQTT se conecte antes de prosseguir
 print("Aguardando conexão MQTT...")
@@ -290,217 +174,10 @@ while not mqtt_connected:
 # =====================================================================
 # 3. LAÇO DE SIMULAÇÃO PRINCIPAL
 # =====================================================================
+# Cada passo() é uma iteração: reset pendente, estado parado (espera 0,5 s),
+# passo dinâmico/injeção (0,05 s) ou um passo do ciclo de 24h, quando pedido.
 
-# Limites para saturação
-ERRO_MAX = 16.5
-VARERRO_MAX = 2.05
-
-print(f"Sistema Fuzzy Iniciado. SP={sp}°C. Aguardando comando INICIAR via MQTT...")
-
-# =====================================================================
-# 4. FUNÇÃO DE SIMULAÇÃO DE 24H (BLOCO ÚNICO)
-# =====================================================================
-
-def executar_simulacao_24h():
-    global tempatual, erroatual, erroanterior, simulacao_24h_ativa
-    
-    MAX_ITERACOES = 288
-    iteracao = 0 
-    
-    print(f"\n--- INICIANDO SIMULAÇÃO DE 24H (Ciclo Fechado) ---")
-    
-    # ⚠️ RESET INICIAL OBRIGATÓRIO PARA 24H
-    resetar_estado() 
-    tempatual = 25.0 
-
-    while iteracao < MAX_ITERACOES:
-        
-        # O ciclo de 24h é sempre um cálculo dinâmico, sem injeção manual.
-        injecao_ativa = False
-        
-        # 1. ATUALIZAÇÃO DAS PERTURBAÇÕES
-        text_calc = perturba_text_24h(iteracao)
-        carga_calc = perturba_carga_24h(iteracao)
-        
-        # 2. CÁLCULO DE ERRO
-        erro_calc = tempatual - sp
-        varerroTemp_calc = erroatual - erroanterior
-        
-        # --- CÁLCULO DE FLUXO (COPIADO DO while True) ---
-        
-        # Atualiza o erroanterior (necessário para a próxima iteração dinâmica)
-        erroanterior = erroatual # Mantemos a variável para o modo dinâmico
-        erroatual = erro_calc # Atualiza o erroatual para o print
-        
-        # Saturação das entradas (APLICADA ÀS VARIÁVEIS DE CÁLCULO)
-        erro_input = np.clip(erro_calc, -ERRO_MAX, ERRO_MAX)
-        varerro_input = np.clip(varerroTemp_calc, -VARERRO_MAX, VARERRO_MAX)
-
-        # --- 3.3. GANHO KP CONDICIONAL (Mapa Otimizado) ---
-        if sp == 16: Kp = 0.75
-        elif sp == 22: Kp = 0.45
-        elif sp == 25: Kp = 0.45
-        elif sp == 32: Kp = 0.3
-        else: Kp = 0.35
-
-        # --- 3.4. CÁLCULO FUZZY ---
-        simulacao_nucleo.input['errotemp'] = erro_input
-        simulacao_nucleo.input['varerrotemp'] = varerro_input
-        simulacao_nucleo.compute()
-
-        if 'potencia_base' in simulacao_nucleo.output:
-            P_base = simulacao_nucleo.output['potencia_base']
-        else:
-            P_base = 100.0
-        simulacao_nucleo.reset()
-
-        simulacao_compensacao.input['text'] = text_calc 
-        simulacao_compensacao.input['cargatermica'] = carga_calc
-        simulacao_compensacao.compute()
-        Delta_P = simulacao_compensacao.output['ajuste_potencia']
-        simulacao_compensacao.reset()
-
-        # --- 3.5. INTEGRAÇÃO E CLIPPING ---
-        P_base_atenuada = P_base * Kp
-        P_final = P_base_atenuada + Delta_P
-        P_crac_final = np.clip(P_final, 0, 100)
-        
-        # --- 3.6. MODELO TÉRMICO ---
-        T_anterior = tempatual
-        tempatual = (0.9 * T_anterior - 0.08 * P_crac_final + 0.05 * carga_calc + 0.02 * text_calc + 0.35)
-
-        # PUBLICAÇÃO DO ESTADO
-        estado = {
-            "temperatura": round(float(tempatual), 2),
-            "erro": round(float(erroatual), 2),
-            "varErro": round(float(varerroTemp_calc), 2),
-            "potencia": round(float(P_crac_final), 2),
-            "setpoint": sp,
-            "qest": round(float(carga_calc), 1), # Publica o valor da perturbação
-            "text": round(float(text_calc), 1),  # Publica o valor da perturbação
-            "simulacao_rodando": True, # A simulação está rodando no modo 24h
-            "injecao_ativa": False,
-             "tempo_horas": round(iteracao * (24 / MAX_ITERACOES), 2)
-        }
-        client.publish(TOPIC_ESTADO, json.dumps(estado))
-        
-        time.sleep(0.05) 
-        iteracao += 1
-    
-    print("\n--- SIMULAÇÃO DE 24H CONCLUÍDA! ---")
-    simulacao_24h_ativa = False # Desliga a flag no final
+print(f"Sistema Fuzzy Iniciado. SP={controle.estado.sp}°C. Aguardando comando INICIAR via MQTT...")
 
 while True:
-
-    if simulacao_24h_ativa:
-        executar_simulacao_24h()
-        # Após a simulação de 24h, ele volta a ser uma simulação parada.
-    
-    # 1. VERIFICAÇÃO DE CONTROLE E RESET (PRIORIDADE MÁXIMA)
-    if reiniciar_simulacao:
-        resetar_estado()
-        injecao_ativa = False # Desativa injeção após reset
-        simulacao_ativa = False # Garante que o estado seja PAUSADO após o reset.
-    
-    # 2. CONTROLE DO ESTADO ATIVO/PARADO
-    if not simulacao_ativa:
-        # Se a simulação está parada, publica o estado de PAUSA (apenas a temperatura atual)
-        # e dorme significativamente para liberar CPU para a thread MQTT (on_message).
-        
-        estado = {
-            "temperatura": round(float(tempatual), 2),
-            "erro": 0.0, "varErro": 0.0,
-            "potencia": 0.0, "setpoint": sp,
-            "qest": qest_atual, "text": text_atual,
-            "simulacao_rodando": simulacao_ativa,
-        }
-        client.publish(TOPIC_ESTADO, json.dumps(estado))
-        
-        time.sleep(0.5) 
-        continue # Retorna ao topo do loop
-
-    # --- 3.2. CÁLCULO DE ERRO E SATURAÇÃO ---
-    # Determinar qual erro, delta erro, temperatura e carga usar (CALC = CÁLCULO/INJEÇÃO)
-    if injecao_ativa:
-        erro_calc = erro_inj
-        varerroTemp_calc = deltaErro_inj
-        text_calc = text_inj
-        carga_calc = carga_inj
-    else:
-        # Usa o cálculo dinâmico da simulação
-        erro_calc = tempatual - sp
-        varerroTemp_calc = erroatual - erroanterior
-        text_calc = text_atual # (valor fixo original)
-        carga_calc = qest_atual # (valor fixo original)
-    
-    # Atualiza o erroanterior (necessário para a próxima iteração dinâmica)
-    erroanterior = erroatual # Mantemos a variável para o modo dinâmico
-    erroatual = erro_calc # Atualiza o erroatual para o print
-    
-    # Saturação das entradas (APLICADA ÀS VARIÁVEIS DE CÁLCULO)
-    erro_input = np.clip(erro_calc, -ERRO_MAX, ERRO_MAX)
-    varerro_input = np.clip(varerroTemp_calc, -VARERRO_MAX, VARERRO_MAX)
-
-    # --- 3.3. GANHO KP CONDICIONAL (Mapa Otimizado) ---
-    if sp == 16:
-        Kp = 0.56
-    elif sp == 22:
-        Kp = 0.28
-    elif sp == 25:
-        Kp = 0.09
-    elif sp == 32:
-        Kp = 0.01
-    else:
-        Kp = 0.35
-
-    # --- 3.4. CÁLCULO FUZZY ---
-    simulacao_nucleo.input['errotemp'] = erro_input
-    simulacao_nucleo.input['varerrotemp'] = varerro_input
-    simulacao_nucleo.compute()
-
-    if 'potencia_base' in simulacao_nucleo.output:
-        P_base = simulacao_nucleo.output['potencia_base']
-    else:
-        P_base = 100.0
-    simulacao_nucleo.reset()
-
-    simulacao_compensacao.input['text'] = text_calc 
-    simulacao_compensacao.input['cargatermica'] = carga_calc
-    simulacao_compensacao.compute()
-    Delta_P = simulacao_compensacao.output['ajuste_potencia']
-    simulacao_compensacao.reset()
-
-    # --- 3.5. INTEGRAÇÃO E CLIPPING ---
-    P_base_atenuada = P_base * Kp
-    P_final = P_base_atenuada + Delta_P
-    P_crac_final = np.clip(P_final, 0, 100)
-
-    # --- 3.6. MODELO TÉRMICO ---
-    # O modelo térmico só é atualizado se a simulação NÃO estiver em modo de injeção estática.
-    if not injecao_ativa:
-        T_anterior = tempatual
-        tempatual = (
-            0.9 * T_anterior
-            - 0.08 * P_crac_final
-            + 0.05 * carga_calc # Usando carga injetada/calculada
-            + 0.02 * text_calc  # Usando temperatura injetada/calculada
-            + 0.35
-        )
-    
-    # --- 3.7. PUBLICAÇÃO ---
-    estado = {
-        "temperatura": round(float(tempatual), 2),
-        "erro": round(float(erroatual), 2),
-        "varErro": round(float(varerroTemp_calc), 2),
-        "potencia": round(float(P_crac_final), 2),
-        "setpoint": sp,
-        "qest": round(float(carga_calc), 1),
-        "text": round(float(text_calc), 1),
-        "simulacao_rodando": simulacao_ativa,
-        "injecao_ativa": injecao_ativa
-    }
-    client.publish(TOPIC_ESTADO, json.dumps(estado))
-
-    # --- 3.8. DEBUG E INTERVALO ---
-    # print(f"SP: {sp:2d} | T: {tempatual:.2f} °C | Erro: {erroatual:.2f} | Potência: {P_crac_final:.2f}")
-    time.sleep(0.05)
\ No newline at end of file
+    time.sleep(controle.passo())